@@ -1,10 +1,73 @@
 
 # __init__.py for Aniversário Colaboradores project
 
-# Importing modules to expose them as part of the package interface
-from helpers.configuration import load_config
-from helpers.utils import get_ad_user, is_valid_email, json_to_html
-from helpers.openflow import connect_to_service, fetch_data, save_data
-from helpers.notification import send_email
-from helpers.sapgui import SapGui
-from helpers.exception_handler import ExceptionHandler
+import importlib
+
+# Public names of the package and the module defining each one. Modules are imported on
+# first access (PEP 562), so a run only loads the subsystems it uses: e.g. pandas with
+# OrderValidator, win32com with SapGui, openiap with the OpenIAP and email helpers.
+_EXPORTS = {
+    "load_config": "helpers.configuration",
+    "get_ad_user": "helpers.utils",
+    "get_ad_users": "helpers.utils",
+    "ADResolver": "helpers.directory",
+    "configure_directory": "helpers.directory",
+    "is_valid_email": "helpers.utils",
+    "json_to_html": "helpers.utils",
+    "HtmlReport": "helpers.report",
+    "render_html": "helpers.report",
+    "connect_to_service": "helpers.openflow",
+    "fetch_data": "helpers.openflow",
+    "save_data": "helpers.openflow",
+    "configure_cache": "helpers.openflow",
+    "get_query_cache": "helpers.openflow",
+    "invalidate_collection": "helpers.openflow",
+    "send_email": "helpers.notification",
+    "SmtpSender": "helpers.notification",
+    "start_default_sender": "helpers.notification",
+    "stop_default_sender": "helpers.notification",
+    "configure_attachments": "helpers.mime",
+    "NotificationDispatcher": "helpers.notification",
+    "SmsSender": "helpers.notification",
+    "configure_timing": "helpers.timing",
+    "get_timer": "helpers.timing",
+    "configure_counters": "helpers.sapcounters",
+    "get_counters": "helpers.sapcounters",
+    "element_cache_stats": "helpers.sapcache",
+    "SapGui": "helpers.sapgui",
+    "get_driver": "helpers.sapdriver",
+    "AsyncSapSession": "helpers.sapasync",
+    "OrderPipeline": "helpers.pipeline",
+    "RetryPolicy": "helpers.retry",
+    "SapSessionPool": "helpers.sappool",
+    "open_order_source": "helpers.orders",
+    "batched": "helpers.orders",
+    "OrderValidator": "helpers.validation",
+    "OrderJournal": "helpers.journal",
+    "PENDING": "helpers.journal",
+    "IN_PROGRESS": "helpers.journal",
+    "DONE": "helpers.journal",
+    "FAILED": "helpers.journal",
+    "ErrorSink": "helpers.error_sink",
+    "ResultsWriter": "helpers.results",
+    "PreflightCheck": "helpers.preflight",
+    "ShardQueue": "helpers.workqueue",
+    "run_worker": "helpers.workqueue",
+    "ExceptionHandler": "helpers.exception_handler",
+}
+
+__all__ = list(_EXPORTS)
+
+
+# Import the module defining a public name on first access, and keep the name for the next ones.
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module 'helpers' has no attribute '{name}'")
+    value = getattr(importlib.import_module(module), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
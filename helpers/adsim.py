@@ -0,0 +1,81 @@
+"""
+Simulated Active Directory lookup process, speaking the protocol of the PowerShell loop
+in helpers/directory.py (one JSON request per stdin line, one JSON array per stdout line).
+
+Usage:
+    python -m helpers.adsim --users 500 --startup-delay 1.5 --query-delay 0.01
+"""
+import argparse
+import json
+import sys
+import time
+
+
+def make_directory(users):
+    """
+    Args:
+        users (int): Number of users.
+
+    Returns:
+        dict: User properties per lowercase sAMAccountName.
+    """
+    directory = {}
+    for index in range(users):
+        name = f"user{index:04d}"
+        directory[name] = {
+            "SamAccountName": name,
+            "Name": f"Utilizador {index:04d}",
+            "EmailAddress": f"{name}@example.com",
+            "Department": f"Departamento {index % 12}",
+            "Enabled": "True",
+            "memberOf": [f"CN=Grupo {index % 5},OU=Grupos,DC=example,DC=com"],
+        }
+    return directory
+
+
+def answer(directory, emails, query):
+    value = query["value"].strip().lower()
+    if value.startswith("invalid"):
+        return {"kind": query["kind"], "value": query["value"], "user": None,
+                "error": f"Cannot find an object with identity: '{query['value']}'."}
+    user = (emails if query["kind"] == "email" else directory).get(value)
+    return {"kind": query["kind"], "value": query["value"], "user": user, "error": None}
+
+
+# Command starting the simulated lookup process, for PowerShellRunner(command=...).
+def sim_command(users=500, startup_delay=1.5, query_delay=0.01):
+    return [sys.executable, "-m", "helpers.adsim", "--users", str(users),
+            "--startup-delay", str(startup_delay), "--query-delay", str(query_delay)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulated Active Directory lookup process.")
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--startup-delay", type=float, default=1.5,
+                        help="Seconds before the first answer (PowerShell and ActiveDirectory module load).")
+    parser.add_argument("--query-delay", type=float, default=0.01, help="Seconds per user lookup.")
+    parser.add_argument("--once", action="store_true",
+                        help="Answer a single query given as arguments and exit, like one powershell call.")
+    parser.add_argument("query", nargs="*", metavar="KIND VALUE")
+    args = parser.parse_args(argv)
+
+    directory = make_directory(args.users)
+    emails = {user["EmailAddress"].lower(): user for user in directory.values()}
+    time.sleep(args.startup_delay)
+
+    if args.once:
+        time.sleep(args.query_delay)
+        print(json.dumps([answer(directory, emails, {"kind": args.query[0], "value": args.query[1]})]))
+        return 0
+
+    for line in sys.stdin:
+        request = json.loads(line)
+        time.sleep(args.query_delay * len(request["queries"]))
+        results = [answer(directory, emails, query) for query in request["queries"]]
+        sys.stdout.write(json.dumps(results, ensure_ascii=False) + "\n")
+        sys.stdout.flush()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,57 @@
+"""
+Active Directory benchmark, against the simulated lookup process (helpers/adsim.py).
+
+Usage:
+    python -m helpers.benchmark ad --users 50
+"""
+import asyncio
+import subprocess
+import time
+
+
+# Compare one lookup process per user with the batched, cached ADResolver, against helpers/adsim.py.
+def bench_ad(args):
+    """
+    Returns:
+        dict: Elapsed time and processes started by each approach.
+    """
+    from helpers.adsim import sim_command
+    from helpers.directory import ADResolver, PowerShellRunner
+
+    identities = [f"user{index:04d}" for index in range(args.users)]
+    command = sim_command(args.users, args.startup_delay, args.query_delay)
+    result = {"users": args.users}
+
+    # Baseline: what get_ad_user did before, one process per user
+    started = time.perf_counter()
+    for identity in identities:
+        subprocess.run(command + ["--once", "identity", identity], capture_output=True, check=True)
+    elapsed = time.perf_counter() - started
+    result["process_per_user"] = {"elapsed_s": round(elapsed, 3), "processes": args.users}
+
+    async def resolve(resolver):
+        started = time.perf_counter()
+        users = await resolver.resolve(identities=identities[:args.users // 2],
+                                       emails=[f"{identity}@example.com" for identity in identities[args.users // 2:]])
+        return time.perf_counter() - started, sum(user is not None for user in users.values())
+
+    resolver = ADResolver(PowerShellRunner(command), batch_size=args.batch_size)
+    try:
+        elapsed, found = asyncio.run(resolve(resolver))
+        result["resolver_cold"] = {"elapsed_s": round(elapsed, 3), "processes": resolver.runner.starts,
+                                   "requests": resolver.stats["requests"], "found": found}
+        elapsed, found = asyncio.run(resolve(resolver))
+        result["resolver_cached"] = {"elapsed_ms": round(elapsed * 1000, 3), "processes": resolver.runner.starts,
+                                     "hits": resolver.stats["hits"], "found": found}
+    finally:
+        resolver.runner.close()
+    return result
+
+
+def add_parsers(subparsers):
+    ad = subparsers.add_parser("ad", help="Batched, cached ADResolver against one lookup process per user.")
+    ad.add_argument("--users", type=int, default=50)
+    ad.add_argument("--batch-size", type=int, default=50, help="Lookups per request to the process.")
+    ad.add_argument("--startup-delay", type=float, default=1.0, help="Seconds to start a lookup process.")
+    ad.add_argument("--query-delay", type=float, default=0.01, help="Seconds per user lookup.")
+    ad.set_defaults(run=bench_ad)
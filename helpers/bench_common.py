@@ -0,0 +1,22 @@
+import statistics
+
+from helpers.timing import percentile
+
+# Credentials used against the simulated system
+SIMULATED_SAP_ARGS = {"platform": "SIMULATED", "username": "benchmark", "password": "benchmark"}
+
+
+def summarize(values):
+    """Count, mean and percentiles (in milliseconds) of a list of durations in seconds."""
+    return {
+        "count": len(values),
+        "mean_ms": round(statistics.fmean(values) * 1000, 3) if values else 0.0,
+        "p50_ms": round(percentile(values, 50) * 1000, 3),
+        "p95_ms": round(percentile(values, 95) * 1000, 3),
+        "p99_ms": round(percentile(values, 99) * 1000, 3),
+    }
+
+
+def make_orders(count, first=5100000000):
+    """Sequential sales order numbers accepted by the simulated backend."""
+    return [first + index for index in range(count)]
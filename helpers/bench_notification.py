@@ -0,0 +1,274 @@
+"""
+Notification benchmarks, against local SMTP and SMS gateway stubs.
+
+Usage:
+    python -m helpers.benchmark smtp --messages 200
+    python -m helpers.benchmark attachment --size-mb 40
+    python -m helpers.benchmark sms --recipients 100
+"""
+import asyncio
+import os
+import smtplib
+import socketserver
+import tempfile
+import threading
+import time
+from email.mime.text import MIMEText
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# Minimal SMTP server accepting every message, to benchmark the senders locally.
+class SmtpStubHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        # Emulate the TCP/TLS handshake and greeting cost of a real server
+        time.sleep(self.server.connect_delay)
+        self.server.connections += 1
+        self.wfile.write(b"220 stub ESMTP\r\n")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line[:4].upper()
+            if command == b"DATA":
+                self.wfile.write(b"354 End data with <CR><LF>.<CR><LF>\r\n")
+                for data_line in self.rfile:
+                    if data_line == b".\r\n":
+                        break
+                self.server.messages += 1
+                self.wfile.write(b"250 OK\r\n")
+            elif command == b"QUIT":
+                self.wfile.write(b"221 Bye\r\n")
+                return
+            else:
+                self.wfile.write(b"250 OK\r\n")
+
+
+class SmtpStubServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, connect_delay=0.0):
+        super().__init__(("127.0.0.1", 0), SmtpStubHandler)
+        self.connect_delay = connect_delay
+        self.connections = 0
+        self.messages = 0
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
+
+
+# Compare one SMTP connection per email with the pooled SmtpSender, against a local stub server.
+def bench_smtp(args):
+    """
+    Returns:
+        dict: Messages per second and connections opened by each approach.
+    """
+    from helpers.notification import SmtpSender
+
+    def make_message(index):
+        msg = MIMEText(f"Mensagem {index}\n" * args.lines, "plain", "utf-8")
+        msg["From"] = "robot@example.com"
+        msg["To"] = "ops@example.com"
+        msg["Subject"] = f"Benchmark {index}"
+        return msg
+
+    result = {"messages": args.messages}
+    with SmtpStubServer(args.connect_delay) as server:
+        host, port = server.server_address
+
+        # Baseline: what send_email did before, one connection per email
+        started = time.perf_counter()
+        for index in range(args.messages):
+            smtp = smtplib.SMTP(host, port)
+            smtp.sendmail("robot@example.com", ["ops@example.com"], make_message(index).as_string())
+            smtp.quit()
+        elapsed = time.perf_counter() - started
+        result["one_connection_per_email"] = {
+            "elapsed_s": round(elapsed, 3),
+            "messages_per_s": round(args.messages / elapsed, 1),
+            "connections": server.connections,
+        }
+
+        server.connections = 0
+
+        async def pooled():
+            sender = SmtpSender(host=host, port=port, username="robot@example.com", batch_size=args.batch_size)
+            await sender.start()
+            results = await asyncio.gather(*(
+                sender.send(make_message(index), ["ops@example.com"]) for index in range(args.messages)))
+            await sender.close()
+            return sender, results
+
+        started = time.perf_counter()
+        sender, results = asyncio.run(pooled())
+        elapsed = time.perf_counter() - started
+        result["pooled_sender"] = {
+            "elapsed_s": round(elapsed, 3),
+            "messages_per_s": round(args.messages / elapsed, 1),
+            "connections": server.connections,
+            "batches": sender.stats["batches"],
+            "failed": results.count(False),
+        }
+
+    return result
+
+
+# Compare the whole-message MIME build with the streamed SpooledMessage, for one large attachment.
+def bench_attachment(args):
+    """
+    Returns:
+        dict: Elapsed time and peak traced memory of each approach, and the messages sent.
+    """
+    import tracemalloc
+    from email.mime.base import MIMEBase
+    from email.mime.multipart import MIMEMultipart
+    from email import encoders
+    from helpers.mime import build_messages, configure_attachments
+    from helpers.notification import deliver
+
+    configure_attachments({"zip_threshold_mb": args.zip_threshold_mb, "max_message_mb": args.max_message_mb})
+    result = {"size_mb": args.size_mb}
+
+    with tempfile.TemporaryDirectory() as workdir, SmtpStubServer() as server:
+        host, port = server.server_address
+        path = os.path.join(workdir, "resultados.csv")
+        with open(path, "w", encoding="utf-8") as file:
+            row = 0
+            while file.tell() < args.size_mb * 1024 * 1024:
+                file.write(f"{5100000000 + row};done;S;Documento de vendas {7160000000 + row} foi gravado;{row % 7}\n")
+                row += 1
+
+        def measure(send):
+            smtp = smtplib.SMTP(host, port)
+            tracemalloc.start()
+            started = time.perf_counter()
+            messages = send(smtp)
+            elapsed = time.perf_counter() - started
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            smtp.quit()
+            return {"elapsed_s": round(elapsed, 3), "peak_mb": round(peak / 1024 / 1024, 1), "messages": messages}
+
+        # Baseline: what build_message did before, the file read whole and the message copied by as_string()
+        def whole(smtp):
+            msg = MIMEMultipart()
+            msg["Subject"] = "Resultados"
+            with open(path, "rb") as attachment:
+                part = MIMEBase("application", "octet-stream")
+                part.set_payload(attachment.read())
+            encoders.encode_base64(part)
+            part.add_header("Content-Disposition", "attachment", filename="resultados.csv")
+            msg.attach(part)
+            smtp.sendmail("robot@example.com", ["ops@example.com"], msg.as_string())
+            return 1
+
+        def streamed(smtp):
+            messages, recipients = build_messages("robot@example.com", "ops@example.com", "Resultados", "<p>ok</p>",
+                                                  True, [path])
+            for msg in messages:
+                deliver(smtp, msg, "robot@example.com", recipients)
+                msg.close()
+            return len(messages)
+
+        result["whole_message"] = measure(whole)
+        result["streamed"] = measure(streamed)
+        result["server_messages"] = server.messages
+    return result
+
+
+# Minimal SMS gateway answering every GET with 200 after a delay, to benchmark the SMS senders locally.
+class SmsStubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        time.sleep(self.server.delay)
+        self.server.requests += 1
+        self.send_response(200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"OK")
+
+    def log_message(self, *args):
+        pass
+
+
+class SmsStubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, delay=0.0):
+        super().__init__(("127.0.0.1", 0), SmsStubHandler)
+        self.delay = delay
+        self.requests = 0
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
+
+
+# Compare serial send_sms calls with the NotificationDispatcher fan-out over a pooled session.
+def bench_sms(args):
+    """
+    Returns:
+        dict: Elapsed time and SMS per second of each approach.
+    """
+    import requests
+    from helpers.notification import NotificationDispatcher, SmsSender
+
+    numbers = [f"+2389{index:06d}" for index in range(args.recipients)]
+    result = {"recipients": args.recipients}
+    with SmsStubServer(args.latency) as server:
+        url = f"http://127.0.0.1:{server.server_address[1]}/sms"
+
+        # Baseline: what send_sms did before, one unpooled blocking request per number
+        started = time.perf_counter()
+        for number in numbers:
+            requests.get(url, params={"UID": "u", "PW": "p", "O": "robot", "M": "Robô finalizado", "N": number})
+        elapsed = time.perf_counter() - started
+        result["serial"] = {"elapsed_s": round(elapsed, 3), "sms_per_s": round(args.recipients / elapsed, 1)}
+
+        async def fan_out():
+            dispatcher = NotificationDispatcher(sms=SmsSender(url, "u", "p", "robot", pool_size=args.concurrency),
+                                                channels={"sms": {"concurrency": args.concurrency}})
+            try:
+                return await dispatcher.send_sms("Robô finalizado", numbers), dispatcher.stats["sms"]
+            finally:
+                await dispatcher.close()
+
+        started = time.perf_counter()
+        sent, stats = asyncio.run(fan_out())
+        elapsed = time.perf_counter() - started
+        result["dispatcher"] = {"elapsed_s": round(elapsed, 3), "sms_per_s": round(args.recipients / elapsed, 1),
+                                "concurrency": args.concurrency, **stats}
+        result["gateway_requests"] = server.requests
+    return result
+
+
+def add_parsers(subparsers):
+    smtp = subparsers.add_parser("smtp", help="Pooled SmtpSender against one connection per email.")
+    smtp.add_argument("--messages", type=int, default=200)
+    smtp.add_argument("--lines", type=int, default=20, help="Lines of text per message.")
+    smtp.add_argument("--batch-size", type=int, default=20)
+    smtp.add_argument("--connect-delay", type=float, default=0.02, help="Seconds per SMTP connection setup.")
+    smtp.set_defaults(run=bench_smtp)
+
+    attachment = subparsers.add_parser("attachment", help="Streamed MIME assembly against the whole message in memory.")
+    attachment.add_argument("--size-mb", type=float, default=40, help="Size of the attached results file.")
+    attachment.add_argument("--zip-threshold-mb", type=float, default=5, help="Attachments above this are zipped.")
+    attachment.add_argument("--max-message-mb", type=float, default=20, help="Largest message before splitting.")
+    attachment.set_defaults(run=bench_attachment)
+
+    sms = subparsers.add_parser("sms", help="Concurrent NotificationDispatcher SMS against serial send_sms calls.")
+    sms.add_argument("--recipients", type=int, default=100)
+    sms.add_argument("--concurrency", type=int, default=10, help="SMS in flight (and pooled connections).")
+    sms.add_argument("--latency", type=float, default=0.05, help="Seconds the gateway takes per SMS.")
+    sms.set_defaults(run=bench_sms)
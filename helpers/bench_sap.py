@@ -0,0 +1,266 @@
+"""
+SAP GUI benchmarks, against the simulated SAP GUI (helpers/sapsim.py).
+
+Usage:
+    python -m helpers.benchmark sap --orders 500 --latency 0.005
+    python -m helpers.benchmark attach --jobs 5
+    python -m helpers.benchmark preflight --orders 500 --billed-rate 0.3
+"""
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from helpers.sapgui import SapGui
+from helpers.sappool import SapSessionPool
+from helpers.sapsim import SimulatedSapDriver, SimBackend
+from helpers.orders import batched
+from helpers.sapasync import AsyncSapSession
+from helpers.pipeline import OrderPipeline
+from helpers.retry import RetryPolicy
+from helpers.timing import configure_timing
+from helpers.sapcounters import configure_counters
+from helpers.sapcache import element_cache_stats
+from helpers.configuration import load_config
+from helpers.bench_common import SIMULATED_SAP_ARGS, summarize, make_orders
+
+
+def make_locks(count, rate, attempts, seed=None):
+    """A share of the orders of make_orders, locked by another user for the given number of attempts."""
+    orders = make_orders(count)
+    return {order: attempts for order in random.Random(seed).sample(orders, round(count * rate))}
+
+
+# Retries of the last pipeline run
+pipeline_stats = {"retried": 0}
+
+
+# Run the items through the async OrderPipeline, over the sessions of the pool.
+async def run_pipeline(pool, items, operation, retry=None):
+    # The primary session was created on this thread; its facade only needs to run pool calls
+    primary = AsyncSapSession(pool.driver, "sap-primary")
+    primary.sap_session = pool.sap_session
+    sessions = await pool.open_async(primary)
+    try:
+        pipeline = OrderPipeline(sessions, operation, retry=retry, recover=SapGui.reset_session)
+        results = await pipeline.run(items)
+        pipeline_stats["retried"] = pipeline.retried
+        return results
+    finally:
+        await pool.close_async(primary, sessions)
+        await primary.close()
+
+
+# Push N orders through SapGui.perform_operation, over a session pool, against the simulated SAP GUI.
+def bench_sap(args):
+    """
+    Returns:
+        dict: Throughput, per-order and per-step latency figures.
+    """
+    driver = SimulatedSapDriver(
+        latency=args.latency,
+        jitter=args.jitter,
+        lookup_latency=args.lookup_latency,
+        failure_rate=args.failure_rate,
+        startup_delay=args.startup_delay,
+        connect_delay=args.connect_delay,
+        backend=SimBackend(locked=make_locks(args.orders, args.locked_rate, args.lock_attempts, args.seed)),
+        seed=args.seed,
+    )
+
+    # Spans of the SapGui steps and calls (--timing), exported like in main.py
+    timer = configure_timing({"enabled": args.timing, "jsonl_path": args.timing_jsonl,
+                              "prometheus_path": args.timing_prometheus})
+
+    # Roundtrips and response time per step, read from session.Info (--counters)
+    counters = configure_counters({"enabled": args.counters})
+
+    started = time.perf_counter()
+    sap_session = SapGui(SIMULATED_SAP_ARGS, driver=driver, element_cache=args.element_cache == "on")
+    if not sap_session.sapLogin():
+        raise RuntimeError("Login to the simulated SAP GUI failed.")
+    startup = time.perf_counter() - started
+
+    # Only the order loop counts for the per-step figures
+    driver.stats.clear()
+
+    order_times = []
+
+    def operation(session, ordem):
+        order_started = time.perf_counter()
+        try:
+            return session.perform_operation(args.transaction, ordem)
+        finally:
+            order_times.append(time.perf_counter() - order_started)
+
+    def collective_operation(session, batch):
+        batch_started = time.perf_counter()
+        try:
+            return session.perform_collective_billing(batch)
+        finally:
+            # Spread the batch time over its orders
+            order_times.extend([(time.perf_counter() - batch_started) / len(batch)] * len(batch))
+
+    if args.mode == "collective":
+        items, item_operation = batched(make_orders(args.orders), args.batch_size), collective_operation
+    else:
+        items, item_operation = make_orders(args.orders), operation
+
+    pool = SapSessionPool(sap_session, size=args.sessions)
+    retry = RetryPolicy(max_retries=args.max_retries, backoff=args.backoff) if args.max_retries else None
+    loop_started = time.perf_counter()
+    item_results = asyncio.run(run_pipeline(pool, items, item_operation, retry))
+    elapsed = time.perf_counter() - loop_started
+
+    if args.mode == "collective":
+        results = [dict(outcome, session=item_result["session"])
+                   for item_result in item_results for outcome in (item_result["status"] or [])]
+    else:
+        results = item_results
+    failed = args.orders - sum(1 for result in results if result["status"])
+    timer.export()
+
+    result = {
+        "mode": args.mode,
+        "orders": args.orders,
+        "sessions": len(set(result["session"] for result in results if result["session"])),
+        "failed": failed,
+        "locked": round(args.orders * args.locked_rate),
+        "retried": pipeline_stats["retried"],
+        "startup_s": round(startup, 3),
+        "elapsed_s": round(elapsed, 3),
+        "orders_per_s": round(args.orders / elapsed, 2) if elapsed else 0.0,
+        "per_order": summarize(order_times),
+        "per_step": {step: summarize(times) for step, times in sorted(driver.stats.items())},
+        "waits": sap_session.waiter.summary(),
+        "element_cache": element_cache_stats(),
+    }
+    if args.timing:
+        result["spans"] = {name: figures for kind in ("order", "step") for name, figures in timer.summary().get(kind, {}).items()}
+    if args.counters:
+        for ranking, rows in counters.summary().items():
+            result[ranking] = {row["step"]: {key: value for key, value in row.items() if key != "step"}
+                               for row in rows}
+        order_roundtrips = [outcome["roundtrips"] for outcome in results if "roundtrips" in outcome]
+        result["roundtrips_per_order"] = round(statistics.fmean(order_roundtrips), 2) if order_roundtrips else None
+    return result
+
+
+# Start N jobs back to back against one simulated SAP Logon, cold or attaching to the session left by the previous job.
+def bench_attach(args):
+    """
+    Returns:
+        dict: Startup path and duration of every job, for --attach on and off.
+    """
+    result = {}
+    for attach in ("off", "on"):
+        driver = SimulatedSapDriver(latency=args.latency, startup_delay=args.startup_delay,
+                                    connect_delay=args.connect_delay, backend=SimBackend())
+        with tempfile.TemporaryDirectory() as directory:
+            settings = {"enabled": attach == "on", "stats_path": os.path.join(directory, "startup.json")}
+            jobs = []
+            for _ in range(args.jobs):
+                started = time.perf_counter()
+                sap_session = SapGui(SIMULATED_SAP_ARGS, driver=driver, attach=settings)
+                if not sap_session.sapLogin():
+                    raise RuntimeError("Login to the simulated SAP GUI failed.")
+                jobs.append({"path": sap_session.startup["path"], "seconds": round(time.perf_counter() - started, 3)})
+        result[f"attach_{attach}"] = {
+            "paths": [job["path"] for job in jobs],
+            "total_s": round(sum(job["seconds"] for job in jobs), 3),
+            "per_job_s": [job["seconds"] for job in jobs],
+        }
+    result["saved_s"] = round(result["attach_off"]["total_s"] - result["attach_on"]["total_s"], 3)
+    return result
+
+
+# Per-order VA02 on every order against a bulk status extract that drops the orders SAP would refuse.
+def bench_preflight(args):
+    """
+    Returns:
+        dict: Elapsed time and server roundtrips with and without the pre-flight extract.
+    """
+    from helpers.preflight import PreflightCheck
+
+    rng = random.Random(args.seed)
+    orders = make_orders(args.orders)
+    billed = rng.sample(orders, round(args.orders * args.billed_rate))
+    blocked = rng.sample([order for order in orders if order not in billed], round(args.orders * args.blocked_rate))
+    settings = dict(load_config().get('preflight', {}), batch_size=args.batch_size,
+                    export_dir=tempfile.mkdtemp(prefix="preflight_"))
+    result = {"orders": args.orders, "billed": len(billed), "blocked": len(blocked)}
+
+    for name in ("per_order", "preflight"):
+        driver = SimulatedSapDriver(latency=args.latency,
+                                    backend=SimBackend(billed=billed, blocked=blocked), seed=args.seed)
+        sap_session = SapGui(SIMULATED_SAP_ARGS, driver=driver)
+        if not sap_session.sapLogin():
+            raise RuntimeError("Login to the simulated SAP GUI failed.")
+        queue = orders
+        preflight = None
+        if name == "preflight":
+            plan = sap_session.plans[sap_session.operation_plan]
+            preflight = PreflightCheck(settings, plan.roundtrips())
+            queue = preflight.filter(orders, lambda batch: preflight.read(sap_session, batch), lambda outcome: None)
+
+        before = sap_session.session.Info.RoundTrips
+        started = time.perf_counter()
+        processed = sum(1 for ordem in queue if sap_session.perform_operation(args.transaction, ordem)["status"])
+        elapsed = time.perf_counter() - started
+        result[name] = {"elapsed_s": round(elapsed, 3), "roundtrips": sap_session.session.Info.RoundTrips - before,
+                        "processed": processed}
+        if preflight is not None:
+            report = preflight.report()
+            result[name].update(extracts=report["extracts"], extract_roundtrips=report["roundtrips"],
+                                skipped=report["skipped_total"], avoided_roundtrips=report["avoided_roundtrips"])
+        sap_session.close_connection()
+    return result
+
+
+def add_parsers(subparsers):
+    sap = subparsers.add_parser("sap", help="Orders through perform_operation on the simulated SAP GUI.")
+    sap.add_argument("--orders", type=int, default=200)
+    sap.add_argument("--transaction", default="VA02")
+    sap.add_argument("--mode", choices=["single", "collective"], default="single",
+                     help="perform_operation per order, or perform_collective_billing per batch.")
+    sap.add_argument("--batch-size", type=int, default=200, help="Orders per collective billing batch.")
+    sap.add_argument("--sessions", type=int, default=1, help="SAP sessions in the pool (max 6).")
+    sap.add_argument("--latency", type=float, default=0.002, help="Seconds per server roundtrip.")
+    sap.add_argument("--jitter", type=float, default=0.0, help="Maximum random seconds added per roundtrip.")
+    sap.add_argument("--lookup-latency", type=float, default=0.0, help="Seconds per findById.")
+    sap.add_argument("--failure-rate", type=float, default=0.0, help="Probability of a failing roundtrip.")
+    sap.add_argument("--locked-rate", type=float, default=0.0, help="Share of the orders locked by another user.")
+    sap.add_argument("--lock-attempts", type=int, default=1, help="Attempts refused before a lock is released.")
+    sap.add_argument("--max-retries", type=int, default=0,
+                     help="Retries of transient failures (0 disables the retry queue).")
+    sap.add_argument("--backoff", type=float, default=0.05, help="Seconds before the first retry.")
+    sap.add_argument("--startup-delay", type=float, default=0.0, help="Seconds until SAPLogon is ready.")
+    sap.add_argument("--connect-delay", type=float, default=0.0, help="Seconds until the logon screen is ready.")
+    sap.add_argument("--seed", type=int, default=None)
+    sap.add_argument("--element-cache", choices=["on", "off"], default="on",
+                     help="Reuse element handles until the screen changes.")
+    sap.add_argument("--timing", action="store_true", help="Record per-order, per-step and per-call spans.")
+    sap.add_argument("--timing-jsonl", help="JSON Lines file receiving the spans (with --timing).")
+    sap.add_argument("--timing-prometheus", help="Prometheus text file receiving the span summaries (with --timing).")
+    sap.add_argument("--counters", action="store_true",
+                     help="Sample the session.Info roundtrip and response time counters per step and order.")
+    sap.set_defaults(run=bench_sap)
+
+    attach = subparsers.add_parser("attach", help="Back-to-back jobs: cold start against attaching to a running session.")
+    attach.add_argument("--jobs", type=int, default=5)
+    attach.add_argument("--latency", type=float, default=0.002, help="Seconds per server roundtrip.")
+    attach.add_argument("--startup-delay", type=float, default=0.5, help="Seconds until SAPLogon is ready.")
+    attach.add_argument("--connect-delay", type=float, default=0.5, help="Seconds until the logon screen is ready.")
+    attach.set_defaults(run=bench_attach)
+
+    preflight = subparsers.add_parser("preflight", help="Bulk status extract before the per-order work against none.")
+    preflight.add_argument("--orders", type=int, default=500)
+    preflight.add_argument("--transaction", default="VA02")
+    preflight.add_argument("--billed-rate", type=float, default=0.3, help="Share of the orders already billed.")
+    preflight.add_argument("--blocked-rate", type=float, default=0.05, help="Share of the orders with a billing block.")
+    preflight.add_argument("--batch-size", type=int, default=5000, help="Orders per status extract.")
+    preflight.add_argument("--latency", type=float, default=0.002, help="Seconds per server roundtrip.")
+    preflight.add_argument("--seed", type=int, default=1)
+    preflight.set_defaults(run=bench_preflight)
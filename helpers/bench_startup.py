@@ -0,0 +1,103 @@
+"""
+Startup benchmark: import time and memory per subsystem, against startup.budgets in configs.json.
+
+Usage:
+    python -m helpers.benchmark startup
+    python -m helpers.benchmark startup main validation --repeat 5
+"""
+import json
+import os
+import subprocess
+import sys
+
+from helpers.configuration import load_config
+
+
+# Imports measured by the startup benchmark, each in a fresh interpreter
+SUBSYSTEMS = {
+    "interpreter": "pass",
+    "package": "import helpers",
+    "config": "from helpers import load_config",
+    "openiap": "from helpers import connect_to_service, fetch_data",
+    "email": "from helpers import send_email, SmtpSender",
+    "validation": "from helpers import OrderValidator",
+    "sap": "from helpers import SapGui, SapSessionPool, AsyncSapSession, OrderPipeline",
+    "main": "import main",
+}
+
+# Run in the child: time the import, then print its duration, peak RSS and loaded modules
+STARTUP_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+exec(sys.argv[1])
+elapsed = time.perf_counter() - started
+try:
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+except ImportError:
+    import ctypes
+    from ctypes import wintypes
+
+    class Counters(ctypes.Structure):
+        _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD)] + \
+                   [(name, ctypes.c_size_t) for name in ("PeakWorkingSetSize", "WorkingSetSize",
+                    "QuotaPeakPagedPoolUsage", "QuotaPagedPoolUsage", "QuotaPeakNonPagedPoolUsage",
+                    "QuotaNonPagedPoolUsage", "PagefileUsage", "PeakPagefileUsage")]
+
+    counters = Counters(cb=ctypes.sizeof(Counters))
+    ctypes.windll.psapi.GetProcessMemoryInfo(ctypes.windll.kernel32.GetCurrentProcess(),
+                                             ctypes.byref(counters), counters.cb)
+    peak = counters.PeakWorkingSetSize
+print(json.dumps({"import_s": elapsed, "rss_bytes": peak, "modules": len(sys.modules)}))
+"""
+
+
+def probe_import(statement, repeat):
+    """Best import time and RSS of a statement over `repeat` fresh interpreters."""
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, "-c", STARTUP_PROBE, statement], capture_output=True,
+                                text=True, check=True, cwd=os.getcwd()).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+    return {"import_ms": round(min(run["import_s"] for run in runs) * 1000, 1),
+            "rss_mb": round(min(run["rss_bytes"] for run in runs) / 2**20, 1),
+            "modules": runs[0]["modules"]}
+
+
+# Import time and memory of each subsystem of the package, checked against the startup budget.
+def bench_startup(args):
+    """
+    Returns:
+        dict: Import time, RSS above the bare interpreter and modules loaded, per subsystem,
+            and the subsystems over their budget (startup.budgets in configs.json).
+    """
+    budgets = load_config(args.config).get('startup', {}).get('budgets', {})
+    names = args.subsystems or list(SUBSYSTEMS)
+    unknown = [name for name in names if name not in SUBSYSTEMS]
+    if unknown:
+        raise ValueError(f"Unknown subsystems {unknown}; expected some of {list(SUBSYSTEMS)}.")
+    baseline = probe_import(SUBSYSTEMS["interpreter"], args.repeat)
+
+    subsystems = {}
+    over_budget = []
+    for name in names:
+        figures = baseline if name == "interpreter" else probe_import(SUBSYSTEMS[name], args.repeat)
+        figures = dict(figures, rss_delta_mb=round(figures["rss_mb"] - baseline["rss_mb"], 1))
+        budget = budgets.get(name)
+        if budget:
+            figures["budget"] = budget
+            if figures["import_ms"] > budget.get("import_ms", float("inf")) \
+                    or figures["rss_delta_mb"] > budget.get("rss_mb", float("inf")):
+                over_budget.append(name)
+        subsystems[name] = figures
+
+    return {"subsystems": subsystems, "over_budget": over_budget}
+
+
+def add_parsers(subparsers):
+    startup = subparsers.add_parser("startup", help="Import time and RSS per subsystem; exits 1 over budget.")
+    startup.add_argument("subsystems", nargs="*", metavar="SUBSYSTEM",
+                         help=f"Subsystems to measure (default: all): {', '.join(SUBSYSTEMS)}.")
+    startup.add_argument("--repeat", type=int, default=3, help="Fresh interpreters per subsystem; the best run counts.")
+    startup.add_argument("--config", default="configs.json", help="Configuration holding startup.budgets.")
+    startup.set_defaults(run=bench_startup)
@@ -0,0 +1,86 @@
+"""
+Order validation benchmark: the vectorized OrderValidator against a check per row.
+
+Usage:
+    python -m helpers.benchmark validation --rows 1000000
+"""
+import random
+import time
+
+from helpers.orders import batched
+
+
+# Messy order column: floats, strings, blanks, fractions, wrong prefixes and duplicates.
+def make_order_column(rows, seed=None):
+    rng = random.Random(seed)
+    values = []
+    for index in range(rows):
+        ordem = 5100000000 + index
+        kind = rng.random()
+        if kind < 0.6:
+            values.append(ordem)
+        elif kind < 0.8:
+            values.append(float(ordem))
+        elif kind < 0.9:
+            values.append(f" {ordem} ")
+        elif kind < 0.93:
+            values.append(None)
+        elif kind < 0.95:
+            values.append(ordem + 0.5)
+        elif kind < 0.97:
+            values.append(9900000000 + index)
+        else:
+            values.append(values[rng.randrange(len(values))] if values else ordem)
+    return values
+
+
+# Compare a Python check per row with the vectorized OrderValidator.
+def bench_validation(args):
+    """
+    Returns:
+        dict: Rows per second of each approach and the rejection counts.
+    """
+    from helpers.validation import OrderValidator
+
+    values = make_order_column(args.rows, args.seed)
+    result = {"rows": args.rows}
+
+    # Baseline: the same checks, one Python conversion per row
+    started = time.perf_counter()
+    seen = set()
+    accepted = 0
+    report = []
+    for row, value in enumerate(values, 1):
+        try:
+            number = float(value)
+        except (TypeError, ValueError):
+            report.append((row, value, None, "reject"))
+            continue
+        ordem = int(number)
+        if number != ordem or not (5100000000 <= ordem < 5200000000 or 7100000000 <= ordem < 7200000000) \
+                or ordem in seen:
+            report.append((row, value, ordem, "reject"))
+            continue
+        seen.add(ordem)
+        report.append((row, value, ordem, "accept"))
+        accepted += 1
+    elapsed = time.perf_counter() - started
+    result["per_row"] = {"elapsed_s": round(elapsed, 3), "rows_per_s": round(args.rows / elapsed), "accepted": accepted}
+
+    validator = OrderValidator(prefixes=["51", "71"])
+    started = time.perf_counter()
+    accepted = 0
+    for batch in batched(values, args.batch_size):
+        accepted += len(validator.validate(batch)[0])
+    elapsed = time.perf_counter() - started
+    result["vectorized"] = {"elapsed_s": round(elapsed, 3), "rows_per_s": round(args.rows / elapsed), "accepted": accepted}
+    result["rejected"] = {reason: count for reason, count in validator.counts.items() if reason != "accepted"}
+    return result
+
+
+def add_parsers(subparsers):
+    validation = subparsers.add_parser("validation", help="Vectorized OrderValidator against a check per row.")
+    validation.add_argument("--rows", type=int, default=100000)
+    validation.add_argument("--batch-size", type=int, default=50000, help="Rows validated per call.")
+    validation.add_argument("--seed", type=int, default=1)
+    validation.set_defaults(run=bench_validation)
@@ -0,0 +1,62 @@
+"""
+Benchmark harness for the robot, runnable off Windows. The benchmarks live in the
+helpers/bench_*.py modules, one per subsystem; this module dispatches to them.
+
+Usage:
+    python -m helpers.benchmark sap --orders 500 --latency 0.005
+    python -m helpers.benchmark sap --orders 200 --counters
+    python -m helpers.benchmark attach --jobs 5
+    python -m helpers.benchmark startup
+    python -m helpers.benchmark smtp --messages 200
+    python -m helpers.benchmark attachment --size-mb 40
+    python -m helpers.benchmark sms --recipients 100
+    python -m helpers.benchmark validation --rows 1000000
+    python -m helpers.benchmark ad --users 50
+    python -m helpers.benchmark preflight --orders 500 --billed-rate 0.3
+"""
+import argparse
+import json
+import logging
+import sys
+
+from helpers import bench_sap, bench_startup, bench_notification, bench_validation, bench_ad
+
+
+def print_report(title, result):
+    print(f"== {title} ==")
+    for key, value in result.items():
+        if isinstance(value, dict) and value and all(isinstance(v, dict) for v in value.values()):
+            print(f"{key}:")
+            for name, figures in value.items():
+                print(f"  {name}: {figures}")
+        else:
+            print(f"{key}: {value}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Robot benchmarks.")
+    parser.add_argument("--json", action="store_true", help="Print the result as JSON.")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    # One module per subsystem registers its subcommands
+    for module in (bench_sap, bench_startup, bench_notification, bench_validation, bench_ad):
+        module.add_parsers(subparsers)
+
+    args = parser.parse_args(argv)
+    logging.getLogger().setLevel(logging.WARNING)
+
+    result = args.run(args)
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print_report(args.benchmark, result)
+
+    # Budgets are enforced through the exit code (startup)
+    if result.get("over_budget"):
+        print(f"Over budget: {', '.join(result['over_budget'])}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
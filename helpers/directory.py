@@ -0,0 +1,269 @@
+import asyncio
+import base64
+import json
+import logging
+import subprocess
+import threading
+import time
+
+# PowerShell loop answering lookup requests: one JSON request per stdin line, one JSON
+# array per stdout line. Each query resolves to {"kind", "value", "user", "error"}; a
+# user that does not exist gives user = null and no error.
+LOOKUP_SCRIPT = r"""
+$ErrorActionPreference = 'Stop'
+$utf8 = New-Object System.Text.UTF8Encoding $false
+[Console]::InputEncoding = $utf8
+[Console]::OutputEncoding = $utf8
+Import-Module ActiveDirectory
+while ($null -ne ($line = [Console]::In.ReadLine())) {
+    $request = $line | ConvertFrom-Json
+    $results = foreach ($query in $request.queries) {
+        $user = $null
+        $message = $null
+        try {
+            if ($query.kind -eq 'email') {
+                $value = $query.value -replace "'", "''"
+                $found = Get-ADUser -Filter "EmailAddress -eq '$value'" -Properties $request.properties | Select-Object -First 1
+            } else {
+                $found = Get-ADUser -Identity $query.value -Properties $request.properties
+            }
+            if ($found) {
+                $user = [ordered]@{}
+                foreach ($property in $found.PSObject.Properties) {
+                    $user[$property.Name] = if ($property.Value -is [datetime]) { $property.Value.ToString('o') }
+                                            elseif ($property.Value -is [System.Collections.ICollection]) { @($property.Value | ForEach-Object { "$_" }) }
+                                            elseif ($null -eq $property.Value) { $null }
+                                            else { "$($property.Value)" }
+                }
+            }
+        } catch [Microsoft.ActiveDirectory.Management.ADIdentityNotFoundException] {
+        } catch {
+            $message = $_.Exception.Message
+        }
+        [pscustomobject]@{ kind = $query.kind; value = $query.value; user = $user; error = $message }
+    }
+    [Console]::Out.WriteLine((ConvertTo-Json -InputObject @($results) -Compress -Depth 4))
+    [Console]::Out.Flush()
+}
+"""
+
+# Query kinds
+IDENTITY = "identity"
+EMAIL = "email"
+
+
+# Command starting the PowerShell lookup loop.
+def powershell_command(script=LOOKUP_SCRIPT):
+    # -EncodedCommand takes base64 UTF-16LE, which avoids any quoting of the script
+    encoded = base64.b64encode(script.encode("utf-16-le")).decode("ascii")
+    return ["powershell", "-NoLogo", "-NoProfile", "-NonInteractive", "-EncodedCommand", encoded]
+
+
+# One long-lived lookup process, fed one JSON request per line.
+class PowerShellRunner():
+    """
+    The process is started on the first request and reused for the next ones, so the
+    PowerShell and ActiveDirectory module startup (1-2 s) is paid once per run instead
+    of once per lookup. A process that exits or stops answering is restarted on the
+    next request.
+
+    Attributes:
+        command (list): Command line of the lookup process; any program speaking the
+            same protocol can replace PowerShell (see helpers/adsim.py).
+        timeout (float): Seconds to wait for the answer to one request.
+        starts (int): Processes started so far.
+    """
+
+    def __init__(self, command=None, timeout=60):
+        self.command = command or powershell_command()
+        self.timeout = timeout
+        self.starts = 0
+        self.process = None
+        self.lock = threading.Lock()
+
+    def _start(self):
+        self.process = subprocess.Popen(
+            self.command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            text=True, encoding="utf-8", bufsize=1)
+        self.starts += 1
+        logging.debug(f"Started directory lookup process {self.process.pid}.")
+
+    def _readline(self):
+        # readline() cannot time out, so a stuck process is killed by a timer instead
+        timer = threading.Timer(self.timeout, self.process.kill)
+        timer.start()
+        try:
+            return self.process.stdout.readline()
+        finally:
+            timer.cancel()
+
+    def request(self, queries, properties=("*",)):
+        """
+        Args:
+            queries (list): [{"kind": "identity" | "email", "value": str}, ...].
+            properties (list): AD properties to read ("*" for all).
+
+        Returns:
+            list: One {"kind", "value", "user", "error"} dict per query, in order.
+
+        Raises:
+            RuntimeError: If the process exits or does not answer in time.
+        """
+        payload = json.dumps({"queries": list(queries), "properties": list(properties)}, ensure_ascii=False)
+        with self.lock:
+            if self.process is None or self.process.poll() is not None:
+                self._start()
+            try:
+                self.process.stdin.write(payload + "\n")
+                self.process.stdin.flush()
+                line = self._readline()
+            except OSError as e:
+                self.close()
+                raise RuntimeError(f"Directory lookup process failed: {e}") from e
+            if not line:
+                self.close()
+                raise RuntimeError("Directory lookup process exited or timed out without answering.")
+        return json.loads(line.lstrip("\ufeff"))
+
+    def close(self):
+        """Ends the lookup process (it exits when its input is closed)."""
+        process, self.process = self.process, None
+        if process is None:
+            return
+        try:
+            process.stdin.close()
+            process.wait(timeout=5)
+        except (OSError, subprocess.TimeoutExpired):
+            process.kill()
+
+
+# Resolves many AD users per call, through one runner and a TTL cache.
+class ADResolver():
+    """
+    Lookups missing from the cache are deduplicated and sent to the runner in batches
+    of batch_size queries. Found and not-found users are cached for ttl seconds; failed
+    lookups are not cached.
+
+    Attributes:
+        runner: Object with request(queries, properties) and close() (PowerShellRunner).
+        ttl (float): Seconds a lookup stays cached.
+        batch_size (int): Queries per runner request.
+        properties (tuple): AD properties to read.
+        stats (dict): Cache hits, misses and runner requests.
+    """
+
+    def __init__(self, runner=None, ttl=3600, batch_size=50, properties=("*",)):
+        self.runner = runner or PowerShellRunner()
+        self.ttl = ttl
+        self.batch_size = batch_size
+        self.properties = tuple(properties)
+        self.cache = {}
+        self.stats = {"hits": 0, "misses": 0, "requests": 0}
+        self.lock = asyncio.Lock()
+
+    @classmethod
+    def from_config(cls, settings, runner=None):
+        """
+        Args:
+            settings (dict): The 'active_directory' section of the configuration.
+            runner (optional): Replaces the PowerShell runner (e.g. for benchmarks).
+        """
+        return cls(
+            runner=runner or PowerShellRunner(timeout=settings.get('timeout', 60)),
+            ttl=settings.get('ttl', 3600),
+            batch_size=settings.get('batch_size', 50),
+            properties=settings.get('properties', ("*",)),
+        )
+
+    def _cached(self, key, now):
+        entry = self.cache.get(key)
+        if entry is None or entry[0] <= now:
+            return False, None
+        return True, entry[1]
+
+    async def resolve(self, identities=(), emails=()):
+        """
+        Args:
+            identities (iterable): sAMAccountNames, distinguished names or GUIDs.
+            emails (iterable): Email addresses.
+
+        Returns:
+            dict: User properties (dict) per given identity or email, None when not found.
+
+        Raises:
+            RuntimeError: If a lookup fails (AD unreachable, invalid identity, ...).
+        """
+        wanted = [(IDENTITY, value) for value in identities] + [(EMAIL, value) for value in emails]
+        found = {}
+        missing = {}
+        now = time.monotonic()
+        for kind, value in wanted:
+            key = (kind, value.strip().lower())
+            hit, user = self._cached(key, now)
+            if hit:
+                self.stats["hits"] += 1
+                found[value] = user
+            else:
+                missing.setdefault(key, []).append(value)
+
+        errors = []
+        if missing:
+            # One lookup at a time: the runner holds a single process
+            async with self.lock:
+                keys = list(missing)
+                for start in range(0, len(keys), self.batch_size):
+                    batch = keys[start:start + self.batch_size]
+                    self.stats["misses"] += len(batch)
+                    self.stats["requests"] += 1
+                    queries = [{"kind": kind, "value": missing[(kind, value)][0].strip()} for kind, value in batch]
+                    answers = await asyncio.to_thread(self.runner.request, queries, self.properties)
+                    expires = time.monotonic() + self.ttl
+                    for key, answer in zip(batch, answers):
+                        if answer.get("error"):
+                            errors.append(f"{answer['value']}: {answer['error']}")
+                            continue
+                        self.cache[key] = (expires, answer.get("user"))
+                        for value in missing[key]:
+                            found[value] = answer.get("user")
+
+        if errors:
+            raise RuntimeError(f"Active Directory lookup failed for {len(errors)} users: {'; '.join(errors)}")
+        return found
+
+    def clear(self):
+        """Empties the cache."""
+        self.cache.clear()
+
+    async def close(self):
+        """Ends the lookup process."""
+        await asyncio.to_thread(self.runner.close)
+
+
+# Shared resolver, used by get_ad_user
+resolver = None
+
+
+def configure_directory(settings, runner=None):
+    """
+    Replace the shared resolver with one built from the 'active_directory' section of the configuration.
+
+    Args:
+        settings (dict): {"ttl": float, "batch_size": int, "timeout": float, "properties": list}.
+        runner (optional): Replaces the PowerShell runner.
+
+    Returns:
+        ADResolver: The new shared resolver.
+    """
+    global resolver
+    if resolver is not None:
+        resolver.runner.close()
+    resolver = ADResolver.from_config(settings, runner)
+    return resolver
+
+
+def get_resolver():
+    """Return the shared ADResolver, creating it with the defaults on first use."""
+    global resolver
+    if resolver is None:
+        resolver = ADResolver()
+    return resolver
@@ -0,0 +1,206 @@
+import asyncio
+import logging
+import re
+import time
+
+from helpers.openflow import save_data
+from helpers.utils import json_to_html
+from helpers.notification import send_email
+
+# Numbers in an error message (order, document and session numbers), masked to group the same error
+_NUMBER = re.compile(r"\d+")
+
+
+# Message of an error without its numbers, e.g. "Order # failed on /app/con[#]/ses[#]: ..."
+def error_pattern(message):
+    return _NUMBER.sub("#", message) if isinstance(message, str) else message
+
+
+# Buffers error documents and reports them in batches instead of one by one.
+class ErrorSink():
+    """
+    Errors are stored in OpenIAP with one InsertOrUpdateMany per batch, when flush_size
+    errors are pending or every flush_interval seconds, whichever comes first.
+
+    Identical errors (same exception type, and same message once its numbers are masked,
+    so the failures of different orders group together) are grouped with an occurrence
+    count and one example message, and one digest email is sent per digest_interval, or
+    once when the sink is closed at the end of the run.
+
+    Attributes:
+        client (openiap.Client): OpenIAP client used to store the errors.
+        config (dict): Configuration; the digest goes to report.to with report.subject.
+        collection (str): Collection receiving the error documents.
+        flush_size (int): Pending errors that trigger a flush.
+        flush_interval (float): Maximum seconds an error stays in the buffer.
+        digest_interval (float, optional): Seconds between digests; None for one digest per run.
+        max_pending (int): Errors kept while OpenIAP is unreachable; the oldest are dropped beyond that.
+    """
+
+    def __init__(self, client, config, collection='process_errors', flush_size=50, flush_interval=30,
+                 digest_interval=None, max_pending=5000):
+        self.client = client
+        self.config = config
+        self.collection = collection
+        self.flush_size = max(1, int(flush_size))
+        self.flush_interval = flush_interval
+        self.digest_interval = digest_interval
+        self.max_pending = max_pending
+        self.pending = []
+        self.groups = {}
+        self.lock = asyncio.Lock()
+        self.task = None
+        self.last_digest = time.monotonic()
+        self.stats = {"errors": 0, "flushes": 0, "stored": 0, "dropped": 0, "digests": 0}
+
+    @classmethod
+    def from_config(cls, client, config):
+        """
+        Args:
+            client (openiap.Client): OpenIAP client.
+            config (dict): Configuration; reads the 'error_sink' section.
+        """
+        settings = config.get('error_sink', {})
+        return cls(
+            client, config,
+            collection=settings.get('collection', 'process_errors'),
+            flush_size=settings.get('flush_size', 50),
+            flush_interval=settings.get('flush_interval', 30),
+            digest_interval=settings.get('digest_interval'),
+            max_pending=settings.get('max_pending', 5000),
+        )
+
+    async def add(self, error_info, report=True):
+        """
+        Buffers one error and groups it with the identical ones.
+
+        Args:
+            error_info (dict): Error document built by ExceptionHandler.
+            report (bool): Include the error in the digest; when False it is only stored.
+        """
+        if self.task is None:
+            self.task = asyncio.create_task(self._run())
+
+        self.stats["errors"] += 1
+        self.pending.append(error_info)
+        if len(self.pending) > self.max_pending:
+            del self.pending[0]
+            self.stats["dropped"] += 1
+
+        # Store-only errors (send_email=False) stay out of the digest
+        if report:
+            self._group(error_info)
+
+        if len(self.pending) >= self.flush_size:
+            await self.flush()
+
+    def _group(self, error_info):
+        key = (error_info.get("exception_type"), error_pattern(error_info.get("error_message")))
+        group = self.groups.get(key)
+        if group is None:
+            self.groups[key] = {
+                "exception_type": key[0],
+                "error_message": key[1],
+                "example": error_info.get("error_message"),
+                "count": 1,
+                "first_seen": error_info.get("timestamp"),
+                "last_seen": error_info.get("timestamp"),
+                "traceback": error_info.get("traceback"),
+            }
+        else:
+            group["count"] += 1
+            group["last_seen"] = error_info.get("timestamp")
+
+    async def flush(self):
+        """
+        Stores the pending errors with a single save_data call. They stay pending if it
+        fails, raises or is cancelled.
+
+        Returns:
+            bool: True if nothing was pending or the batch was stored.
+        """
+        async with self.lock:
+            if not self.pending:
+                return True
+            batch = self.pending
+            self.pending = []
+            self.stats["flushes"] += 1
+            stored = False
+            try:
+                stored = await save_data(self.client, self.collection, batch)
+            finally:
+                # Back in front of the errors added during the save
+                if not stored:
+                    pending = batch + self.pending
+                    self.stats["dropped"] += max(0, len(pending) - self.max_pending)
+                    self.pending = pending[-self.max_pending:]
+            if stored:
+                self.stats["stored"] += len(batch)
+                logging.info(f"Stored {len(batch)} errors in {self.collection}.")
+                return True
+
+            logging.error(f"Failed to store {len(batch)} errors, keeping them for the next flush.")
+            return False
+
+    def digest(self):
+        """
+        Returns:
+            list: One dict per distinct error (exception_type, error_message with its numbers
+                masked, example, count, first_seen, last_seen, traceback), most frequent first.
+        """
+        return sorted(self.groups.values(), key=lambda group: group["count"], reverse=True)
+
+    async def send_digest(self):
+        """
+        Emails the grouped errors since the last digest, if any.
+
+        Returns:
+            bool: True if there was nothing to send or the email was sent.
+        """
+        groups = self.digest()
+        self.groups = {}
+        self.last_digest = time.monotonic()
+        if not groups:
+            return True
+
+        total = sum(group["count"] for group in groups)
+        report = {
+            "total": total,
+            "erros": [{"tipo": group["exception_type"], "mensagem": group["error_message"],
+                       "exemplo": group.get("example"), "ocorrências": group["count"],
+                       "primeiro": group["first_seen"], "último": group["last_seen"], "traceback": group.get("traceback")}
+                      for group in groups],
+        }
+        subject = f"{self.config['report']['subject']} ({total} erros, {len(groups)} distintos)"
+        to = self.config['report']['to']
+
+        self.stats["digests"] += 1
+        try:
+            return await send_email(self.client, to, subject, json_to_html(report), html_body=True)
+        except Exception as e:
+            logging.error(f"Failed to send the error digest: {e}")
+            return False
+
+    async def _run(self):
+        # Time-based flushes (and digests, with digest_interval) between the size-based ones
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+                if self.digest_interval and time.monotonic() - self.last_digest >= self.digest_interval:
+                    await self.send_digest()
+            except Exception as e:
+                logging.error(f"Error flushing the error sink: {e}")
+
+    async def close(self):
+        """Stops the timer, stores the pending errors and sends the final digest."""
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        await self.flush()
+        await self.send_digest()
+        logging.info(f"Error sink: {self.stats}")
@@ -12,29 +12,45 @@ class ExceptionHandler:
         log_file (str): The name of the log file to store the exception information. Default is 'error_log.log'.
         log_level (int): The logging level for the exception. Default is logging.ERROR.
         log_format (str): The format of the log messages. Default is '%(asctime)s:%(levelname)s:%(message)s'.
+        sink (ErrorSink, optional): Buffers the errors and reports them in batches and digests
+            instead of one database call and one email per error.
     """
 
-    def __init__(self, client, config, log_file='error_log.log', log_level=logging.ERROR, log_format='%(asctime)s:%(levelname)s:%(message)s'):
+    def __init__(self, client, config, log_file='error_log.log', log_level=logging.ERROR, log_format='%(asctime)s:%(levelname)s:%(message)s', sink=None):
         """Initialize the ExceptionHandler with custom logging settings."""
         logging.basicConfig(filename=log_file,level=log_level, format=log_format)
 
         self.client = client
         self.config = config
+        self.sink = sink
 
     async def get_exception(self, exception, send_email=True):
-        """Capture, log, and store detailed information about an exception."""
+        """
+        Capture, log, and store detailed information about an exception.
+
+        Args:
+            exception (Exception): The exception to report.
+            send_email (bool): Email the error; with a sink, include it in the digest. When
+                False the error is only stored.
+        """
+        tb = exception.__traceback__
         error_info = {
             "error_message": str(exception),
-            "traceback": traceback.format_exc(),
+            "traceback": ''.join(traceback.format_exception(type(exception), exception, tb)),
             "timestamp": datetime.now().isoformat(),
             "exception_type": type(exception).__name__,
             "exception_args": exception.args,
             "exception_module": type(exception).__module__,
-            "exception_file": exception.__traceback__.tb_frame.f_code.co_filename,
-            "exception_line": exception.__traceback__.tb_lineno,
+            "exception_file": tb.tb_frame.f_code.co_filename if tb else None,
+            "exception_line": tb.tb_lineno if tb else None,
             "status": "pending"
         }
 
+        # Buffered: stored in batches and, unless send_email is False, reported in the digest
+        if self.sink is not None:
+            await self.sink.add(error_info, report=send_email)
+            return error_info
+
         # Store error information in the database and send an email
         if error_info:
             await self.store_error(error_info)
@@ -60,6 +76,10 @@ class ExceptionHandler:
         }
         logging.error(f"Uncaught Exception: {error_info}")
 
+        if self.sink is not None:
+            await self.sink.add(error_info, report=send_email)
+            return error_info
+
         # Store and/or email the error info
         if error_info:
             await self.store_error(error_info)
@@ -68,6 +88,11 @@ class ExceptionHandler:
 
         return error_info
 
+    async def close(self):
+        """Stores the buffered errors and sends the digest, when a sink is used."""
+        if self.sink is not None:
+            await self.sink.close()
+
     async def store_error(self, error_info):
         """
         Store error information in the database using OpenIAP.
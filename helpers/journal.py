@@ -0,0 +1,146 @@
+import sqlite3
+import threading
+import uuid
+import logging
+from datetime import datetime
+
+from helpers.orders import order_key
+
+# Order states recorded in the journal
+PENDING = "pending"
+IN_PROGRESS = "in_progress"
+DONE = "done"
+FAILED = "failed"
+
+
+# Crash-safe, append-friendly journal of the orders processed by each run.
+class OrderJournal():
+    """
+    Stores one row per (run id, order number) in SQLite (WAL mode), so a run that dies
+    can be resumed without processing again the orders already done.
+
+    The journal is shared by the SAP session threads; writes are serialized with a lock.
+
+    Attributes:
+        path (str): Path of the SQLite database.
+        run_id (str): Id of the current run, set by start_run() or resume().
+    """
+
+    def __init__(self, path="journal.db"):
+        self.path = path
+        self.run_id = None
+        self.completed = set()
+        self.lock = threading.Lock()
+
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS runs ("
+            " run_id TEXT PRIMARY KEY, source TEXT, started_at TEXT NOT NULL, finished_at TEXT)"
+        )
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS orders ("
+            " run_id TEXT NOT NULL, order_no TEXT NOT NULL, state TEXT NOT NULL,"
+            " attempts INTEGER NOT NULL DEFAULT 0, created_at TEXT NOT NULL, updated_at TEXT NOT NULL,"
+            " detail TEXT, PRIMARY KEY (run_id, order_no)) WITHOUT ROWID"
+        )
+
+    def start_run(self, source=None, run_id=None):
+        """
+        Starts a new run.
+
+        Returns:
+            str: The id of the new run.
+        """
+        self.run_id = run_id or f"{datetime.now():%Y%m%d%H%M%S}-{uuid.uuid4().hex[:8]}"
+        self.completed = set()
+        with self.lock:
+            self.db.execute("INSERT INTO runs (run_id, source, started_at) VALUES (?, ?, ?)",
+                            (self.run_id, source, datetime.now().isoformat()))
+        logging.info(f"Started run {self.run_id}.")
+        return self.run_id
+
+    def resume(self, run_id=None):
+        """
+        Resumes a run: the given one, or the latest that did not finish.
+
+        Returns:
+            str or None: The id of the resumed run, or None if there is nothing to resume.
+        """
+        if run_id is None:
+            row = self.db.execute(
+                "SELECT run_id FROM runs WHERE finished_at IS NULL ORDER BY started_at DESC LIMIT 1"
+            ).fetchone()
+        else:
+            row = self.db.execute("SELECT run_id FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+
+        if row is None:
+            logging.warning(f"No run to resume{f' with id {run_id}' if run_id else ''}.")
+            return None
+
+        self.run_id = row[0]
+        self.db.execute("UPDATE runs SET finished_at = NULL WHERE run_id = ?", (self.run_id,))
+
+        # Loaded once, so each lookup while streaming the input is a set membership test
+        self.completed = {
+            order_no for (order_no,) in self.db.execute(
+                "SELECT order_no FROM orders WHERE run_id = ? AND state = ?", (self.run_id, DONE))
+        }
+
+        interrupted = self.db.execute(
+            "SELECT COUNT(*) FROM orders WHERE run_id = ? AND state = ?", (self.run_id, IN_PROGRESS)
+        ).fetchone()[0]
+        if interrupted:
+            logging.warning(f"{interrupted} order(s) were in progress when run {self.run_id} stopped; "
+                            "they will be processed again.")
+
+        logging.info(f"Resuming run {self.run_id}: {len(self.completed)} order(s) already done.")
+        return self.run_id
+
+    def is_done(self, ordem):
+        """Whether the order was already completed in the current run."""
+        return order_key(ordem) in self.completed
+
+    def mark(self, ordem, state, detail=None):
+        """
+        Records the state of an order in the current run.
+
+        Args:
+            ordem: The order number.
+            state (str): PENDING, IN_PROGRESS, DONE or FAILED.
+            detail (str, optional): Error message or result detail.
+        """
+        key = order_key(ordem)
+        now = datetime.now().isoformat()
+        attempt = 1 if state == IN_PROGRESS else 0
+        with self.lock:
+            self.db.execute(
+                "INSERT INTO orders (run_id, order_no, state, attempts, created_at, updated_at, detail)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT (run_id, order_no) DO UPDATE SET state = excluded.state,"
+                " attempts = attempts + excluded.attempts, updated_at = excluded.updated_at,"
+                " detail = excluded.detail",
+                (self.run_id, key, state, attempt, now, now, detail),
+            )
+        if state == DONE:
+            self.completed.add(key)
+
+    def counts(self):
+        """
+        Returns:
+            dict: Number of orders per state in the current run.
+        """
+        return dict(self.db.execute(
+            "SELECT state, COUNT(*) FROM orders WHERE run_id = ? GROUP BY state", (self.run_id,)
+        ).fetchall())
+
+    def finish_run(self):
+        """Marks the current run as finished, so it is not picked up by resume()."""
+        with self.lock:
+            self.db.execute("UPDATE runs SET finished_at = ? WHERE run_id = ?",
+                            (datetime.now().isoformat(), self.run_id))
+        logging.info(f"Finished run {self.run_id}: {self.counts()}")
+
+    def close(self):
+        self.db.close()
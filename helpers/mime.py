@@ -0,0 +1,301 @@
+import base64
+import logging
+import mimetypes
+import os
+import smtplib
+import tempfile
+import uuid
+import zipfile
+from email.mime.base import MIMEBase
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from email.policy import compat32
+from email.utils import formatdate, make_msgid
+
+# Serialization of the generated headers: the SMTP line ending
+POLICY = compat32.clone(linesep="\r\n")
+
+# Bytes read per base64 chunk: a multiple of 57, so each chunk encodes to whole 76-char lines
+CHUNK_SIZE = 57 * 1024
+
+# Attachments larger than this are zipped (bytes)
+ZIP_THRESHOLD = 5 * 1024 * 1024
+
+# Largest encoded message; attachments beyond it go in further messages (bytes)
+MAX_MESSAGE_SIZE = 20 * 1024 * 1024
+
+# Encoded message kept in memory before it spills to a temporary file (bytes)
+SPOOL_SIZE = 1024 * 1024
+
+# Formats already compressed: zipping them saves nothing
+COMPRESSED_EXTENSIONS = {".zip", ".gz", ".7z", ".rar", ".xlsx", ".xlsm", ".docx", ".pptx", ".png", ".jpg",
+                         ".jpeg", ".gif", ".webp", ".pdf"}
+
+# Image types attached inline with a Content-ID, so the HTML body can reference them
+INLINE_IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".gif", ".bmp", ".tiff", ".webp"}
+
+# Attachment limits, replaced with configure_attachments()
+settings = {"zip_threshold": ZIP_THRESHOLD, "max_message_size": MAX_MESSAGE_SIZE, "spool_size": SPOOL_SIZE}
+
+
+def configure_attachments(config):
+    """
+    Set the attachment limits from the 'email' section of the configuration.
+
+    Args:
+        config (dict): {"zip_threshold_mb": float, "max_message_mb": float, "spool_mb": float}.
+    """
+    megabyte = 1024 * 1024
+    settings["zip_threshold"] = int(config.get('zip_threshold_mb', ZIP_THRESHOLD / megabyte) * megabyte)
+    settings["max_message_size"] = int(config.get('max_message_mb', MAX_MESSAGE_SIZE / megabyte) * megabyte)
+    settings["spool_size"] = int(config.get('spool_mb', SPOOL_SIZE / megabyte) * megabyte)
+
+
+def encoded_size(size):
+    """Size in bytes of a file of the given size once base64-encoded in 76-character CRLF lines."""
+    return -(-size // 57) * 78
+
+
+# An email ready for the SMTP DATA command, held in a spooled temporary file.
+class SpooledMessage():
+    """
+    The message is written once, already encoded (CRLF lines, base64 attachments), to a
+    SpooledTemporaryFile: small messages stay in memory, large ones spill to disk. It is
+    then copied to the SMTP socket in chunks, so memory stays flat whatever the size of
+    the attachments, and it can be resent as is after a reconnection.
+
+    Attributes:
+        size (int): Encoded size in bytes.
+        subject (str): Subject of the message.
+    """
+
+    def __init__(self, subject, spool_size=None):
+        self.subject = subject
+        self.file = tempfile.SpooledTemporaryFile(max_size=spool_size or settings["spool_size"])
+        self.size = 0
+
+    def write(self, data):
+        self.file.write(data)
+        self.size += len(data)
+
+    def write_file(self, path):
+        """Writes the content of a file, base64-encoded, one chunk at a time."""
+        with open(path, 'rb') as source:
+            while chunk := source.read(CHUNK_SIZE):
+                self.write(base64.encodebytes(chunk).replace(b"\n", b"\r\n"))
+
+    def sendmail(self, server, from_address, recipients):
+        """
+        Sends the message over an open SMTP connection, like smtplib.SMTP.sendmail.
+
+        Returns:
+            dict: The refused recipients, as sendmail returns them.
+
+        Raises:
+            smtplib.SMTPException: If the sender, every recipient or the data is refused.
+        """
+        server.ehlo_or_helo_if_needed()
+        options = [f"SIZE={self.size}"] if server.does_esmtp and server.has_extn("size") else []
+        code, response = server.mail(from_address, options)
+        if code != 250:
+            server.rset()
+            raise smtplib.SMTPSenderRefused(code, response, from_address)
+
+        refused = {}
+        for recipient in recipients:
+            code, response = server.rcpt(recipient)
+            if code not in (250, 251):
+                refused[recipient] = (code, response)
+        if len(refused) == len(recipients):
+            server.rset()
+            raise smtplib.SMTPRecipientsRefused(refused)
+
+        code, response = server.docmd("data")
+        if code != 354:
+            server.rset()
+            raise smtplib.SMTPDataError(code, response)
+
+        # Base64 and generated headers never start a line with ".", so no dot-stuffing is needed
+        self.file.seek(0)
+        while chunk := self.file.read(CHUNK_SIZE):
+            server.send(chunk)
+        server.send(b".\r\n")
+        code, response = server.getreply()
+        if code != 250:
+            raise smtplib.SMTPDataError(code, response)
+        return refused
+
+    def as_bytes(self):
+        """The whole message (for small messages and debugging)."""
+        self.file.seek(0)
+        return self.file.read()
+
+    def close(self):
+        self.file.close()
+
+
+def prepare_attachments(paths, workdir, zip_threshold=None):
+    """
+    Zips the large attachments that are not compressed already.
+
+    Args:
+        paths (list): Files to attach.
+        workdir (str): Directory receiving the zip files.
+        zip_threshold (int, optional): Size in bytes above which a file is zipped.
+
+    Returns:
+        list: (path, attachment name, size) per attachment, in order.
+    """
+    zip_threshold = settings["zip_threshold"] if zip_threshold is None else zip_threshold
+    attachments = []
+    for path in paths:
+        name = os.path.basename(path)
+        size = os.path.getsize(path)
+        extension = os.path.splitext(name)[1].lower()
+        if size > zip_threshold and extension not in COMPRESSED_EXTENSIONS:
+            zipped = os.path.join(workdir, f"{name}.zip")
+            # ZipFile.write compresses the file in chunks, without reading it whole
+            with zipfile.ZipFile(zipped, 'w', zipfile.ZIP_DEFLATED) as archive:
+                archive.write(path, name)
+            logging.info(f"Zipped attachment {name}: {size} -> {os.path.getsize(zipped)} bytes.")
+            path, name, size = zipped, f"{name}.zip", os.path.getsize(zipped)
+        attachments.append((path, name, size))
+    return attachments
+
+
+def split_attachments(attachments, max_message_size=None, reserved=0):
+    """
+    Groups the attachments into messages whose encoded size stays under the limit.
+
+    Args:
+        attachments (list): (path, name, size) tuples.
+        max_message_size (int, optional): Largest encoded message, in bytes.
+        reserved (int): Bytes taken by the headers and body of the first message.
+
+    Returns:
+        list: One list of attachments per message (at least one, possibly empty). An
+            attachment larger than the limit on its own gets a message to itself.
+    """
+    limit = settings["max_message_size"] if max_message_size is None else max_message_size
+    groups = [[]]
+    used = reserved
+    for attachment in attachments:
+        size = encoded_size(attachment[2]) + 512
+        if groups[-1] and used + size > limit:
+            groups.append([])
+            used = reserved
+        if size > limit:
+            logging.warning(f"Attachment {attachment[1]} exceeds the message size limit on its own "
+                            f"({size} > {limit} bytes).")
+        groups[-1].append(attachment)
+        used += size
+    return groups
+
+
+def _attachment_part(name):
+    extension = os.path.splitext(name)[1].lower()
+    maintype, subtype = (mimetypes.guess_type(name)[0] or "application/octet-stream").split("/", 1)
+    if extension in INLINE_IMAGE_EXTENSIONS and maintype == "image":
+        part = MIMEBase(maintype, subtype)
+        part.add_header('Content-ID', f"<{name}>")
+        part.add_header('Content-Disposition', 'inline', filename=('utf-8', '', name))
+    else:
+        part = MIMEBase('application', 'octet-stream')
+        part.add_header('Content-Disposition', 'attachment', filename=('utf-8', '', name))
+    part['Content-Transfer-Encoding'] = 'base64'
+    part.set_payload('')
+    return part.as_bytes(policy=POLICY)
+
+
+# Split a recipient list ("a@x; b@x", "a@x, b@x" or a list of them) into addresses.
+def split_addresses(value):
+    """
+    Args:
+        value (str or list, optional): Addresses separated by ';' or ',', or a list of such strings.
+
+    Returns:
+        list: The addresses, stripped, without empty entries, in their original order.
+    """
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = [value]
+    return [address.strip() for item in value for address in item.replace(';', ',').split(',') if address.strip()]
+
+
+def write_message(from_address, to, subject, message_body, html_body, attachments, cc=None, spool_size=None):
+    """
+    Args:
+        attachments (list): (path, name, size) tuples, streamed into the message.
+
+    Returns:
+        SpooledMessage: The encoded message.
+    """
+    msg = MIMEMultipart()
+    msg['From'] = from_address
+    msg['To'] = ', '.join(split_addresses(to))
+    msg['Subject'] = subject
+    msg['Date'] = formatdate(localtime=True)
+    msg['Message-ID'] = make_msgid()
+    if cc:
+        msg['Cc'] = ', '.join(split_addresses(cc))
+    msg.attach(MIMEText(message_body, 'html' if html_body else 'plain', 'utf-8'))
+
+    # The headers and body come from the email package; the attachments are streamed after them
+    boundary = f"==============={uuid.uuid4().hex}=="
+    msg.set_boundary(boundary)
+    head = msg.as_bytes(policy=POLICY)
+    closing = f"--{boundary}--\r\n".encode("ascii")
+    head = head[:head.rindex(closing)]
+
+    message = SpooledMessage(subject, spool_size)
+    message.write(head)
+    for path, name, _ in attachments:
+        message.write(f"--{boundary}\r\n".encode("ascii"))
+        message.write(_attachment_part(name))
+        message.write_file(path)
+        message.write(b"\r\n")
+    message.write(closing)
+    return message
+
+
+def build_messages(from_address, to, subject, message_body, html_body=False, attachment_paths=None, cc=None,
+                   bcc=None):
+    """
+    Build the email, split into several messages when the attachments exceed the size limit.
+
+    Large attachments are zipped first (settings["zip_threshold"]). The first message
+    carries the body; the next ones carry the remaining attachments, with the part
+    number in the subject. Bcc recipients are only used in the envelope. To, cc and bcc
+    may each hold several addresses separated by ';' or ','.
+
+    Returns:
+        tuple: (list of SpooledMessage, list of every recipient address (To, Cc and Bcc)).
+    """
+    cc = split_addresses(cc)
+    all_recipients = split_addresses(to) + cc + split_addresses(bcc)
+
+    messages = []
+    with tempfile.TemporaryDirectory(prefix="mail_") as workdir:
+        attachments = prepare_attachments(attachment_paths or [], workdir)
+        body_size = len(message_body.encode("utf-8")) * 4 // 3 + 2048
+        groups = split_attachments(attachments, reserved=body_size)
+        try:
+            for number, group in enumerate(groups, 1):
+                if len(groups) == 1:
+                    messages.append(write_message(from_address, to, subject, message_body, html_body, group, cc))
+                elif number == 1:
+                    messages.append(write_message(from_address, to, f"{subject} (1/{len(groups)})", message_body,
+                                                  html_body, group, cc))
+                else:
+                    messages.append(write_message(from_address, to, f"{subject} ({number}/{len(groups)})",
+                                                  f"Anexos da mensagem \"{subject}\" (parte {number} de {len(groups)}).",
+                                                  False, group, cc))
+        except Exception:
+            for message in messages:
+                message.close()
+            raise
+
+    if len(messages) > 1:
+        logging.info(f"Email '{subject}' split into {len(messages)} messages by attachment size.")
+    return messages, all_recipients
@@ -1,20 +1,17 @@
 import openiap
+import asyncio
 import smtplib
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
-from email.mime.image import MIMEImage
-from email.mime.base import MIMEBase
-from email import encoders
-from plyer import notification
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 from typing import Tuple, Any, List
 
 import logging
-import requests
 
 from helpers.openflow import *
 from helpers.configuration import *
 from helpers.utils import *
+from helpers.mime import build_messages
 
 # Set logging for debug.
 logging.basicConfig(level=logging.INFO)
@@ -107,40 +104,316 @@ async def connect_smtp(client: openiap.Client, collection: Any, mail_query: Any)
     return smtp_server, username
 
 
-def attach_image(msg, image_path):
+# Close a message handed to the SmtpSender (a SpooledMessage owns a spool file)
+def _release(msg):
+    close = getattr(msg, "close", None)
+    if close is not None:
+        close()
+
+
+# Long-lived SMTP sender: one pooled connection fed from an asyncio queue of messages.
+class SmtpSender():
+    """
+    Messages are queued with send() and delivered by a background task in batches
+    over a single SMTP connection, which is kept alive with NOOP and reopened when
+    it drops. The blocking smtplib calls run in a worker thread, so the event loop
+    is never blocked.
+
+    Credentials come from OpenIAP (database.webmail) unless host/port are given.
+
+    A queued message belongs to the sender: it is closed (SpooledMessage) once it has
+    been sent, has failed or has been dropped. A caller cancelled while waiting drops
+    its message if it is still queued; one the SMTP thread already took is sent anyway.
+
+    Attributes:
+        batch_size (int): Maximum messages sent per batch.
+        keepalive (float): Seconds of inactivity after which the connection is checked with NOOP.
+        max_retries (int): Reconnections attempted for a message before it is reported as failed.
+        stats (dict): Counters of messages sent, failed, connections opened and batches.
+    """
+
+    def __init__(self, client: openiap.Client = None, host: str = None, port: int = None, username: str = None,
+                 batch_size: int = 20, keepalive: float = 60, max_retries: int = 2, queue_size: int = 1000,
+                 timeout: float = 30):
+        self.client = client
+        self.host = host
+        self.port = port
+        self.username = username
+        self.batch_size = batch_size
+        self.keepalive = keepalive
+        self.max_retries = max_retries
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.server = None
+        self.last_used = 0.0
+        self.queue = None
+        self.task = None
+        self.sending = set()
+        self.stats = {"sent": 0, "failed": 0, "connections": 0, "batches": 0}
+
+    async def start(self):
+        """Resolves the credentials and starts the background sending task."""
+        if self.host is None:
+            config = load_config()
+            webmail = config['database']['webmail']
+            self.username, _, self.host, self.port = await get_smtp_credentials(
+                self.client, webmail['collection'], webmail['query'])
+
+        self.queue = asyncio.Queue(maxsize=self.queue_size)
+        self.task = asyncio.create_task(self._run())
+        return self
+
+    async def send(self, msg, recipients: List[str], from_address: str = None) -> bool:
+        """
+        Queues a message and waits until it has been handed to the SMTP server.
+
+        Args:
+            msg: The email.message.Message to send.
+            recipients (list): Every recipient address (To, Cc and Bcc).
+            from_address (str, optional): Envelope sender. Defaults to the SMTP username.
+
+        Returns:
+            bool: True if every recipient was accepted, False otherwise.
+
+        Raises:
+            RuntimeError: If the background task has stopped.
+            Exception: The unexpected error raised while sending this message.
+        """
+        try:
+            if self.task is None:
+                await self.start()
+            if self.task.done():
+                raise RuntimeError("The SMTP sender is not running.")
+            future = asyncio.get_running_loop().create_future()
+            await self.queue.put((msg, recipients, from_address or self.username, future))
+        except BaseException:
+            _release(msg)
+            raise
+
+        try:
+            # Cancelling the caller must not cancel a message the SMTP thread is sending
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            if future not in self.sending:
+                # Still queued: _serve drops it instead of sending it late
+                future.cancel()
+            raise
+
+    async def close(self):
+        """Sends what is still queued, stops the background task and closes the connection."""
+        if self.task is not None:
+            if not self.task.done():
+                await self.queue.put(None)
+                await self.task
+            elif not self.task.cancelled() and self.task.exception() is not None:
+                logging.error(f"SMTP sender stopped with an error: {self.task.exception()}")
+            self.task = None
+        await asyncio.to_thread(self._disconnect)
+        logging.info(f"SMTP sender closed: {self.stats}")
+
+    async def _run(self):
+        try:
+            await self._serve()
+        finally:
+            # Whatever stopped the task, nobody is left to send what is still queued
+            while not self.queue.empty():
+                item = self.queue.get_nowait()
+                if item is not None:
+                    if not item[3].done():
+                        item[3].set_exception(RuntimeError("The SMTP sender stopped."))
+                    _release(item[0])
+
+    async def _serve(self):
+        while True:
+            item = await self.queue.get()
+            stop = item is None
+            batch = [] if stop else [item]
+
+            # Take whatever else is already waiting, up to batch_size
+            while not stop and len(batch) < self.batch_size:
+                try:
+                    item = self.queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    break
+                if item is None:
+                    stop = True
+                else:
+                    batch.append(item)
+
+            # Messages whose caller gave up while they were queued are not sent
+            for item in [item for item in batch if item[3].done()]:
+                batch.remove(item)
+                _release(item[0])
+
+            if batch:
+                self.sending.update(item[3] for item in batch)
+                try:
+                    results = await asyncio.to_thread(self._send_batch, [item[:3] for item in batch])
+                except Exception as e:
+                    results = [e] * len(batch)
+                except BaseException:
+                    # Cancelled: the futures of the batch must not wait forever
+                    for msg, _, _, future in batch:
+                        if not future.done():
+                            future.set_exception(RuntimeError("The SMTP sender stopped."))
+                        _release(msg)
+                    raise
+                finally:
+                    self.sending.difference_update(item[3] for item in batch)
+                for (msg, _, _, future), result in zip(batch, results):
+                    _release(msg)
+                    if future.done():
+                        continue
+                    if isinstance(result, Exception):
+                        future.set_exception(result)
+                    else:
+                        future.set_result(result)
+
+            if stop:
+                return
+
+    def _connect(self):
+        self._disconnect()
+        self.server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        self.stats["connections"] += 1
+        self.last_used = time.monotonic()
+
+    def _disconnect(self):
+        if self.server is not None:
+            try:
+                self.server.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self.server = None
+
+    def _ensure_connection(self):
+        if self.server is None:
+            return self._connect()
+
+        # An idle connection may have been dropped by the server: check it before reuse
+        if time.monotonic() - self.last_used > self.keepalive:
+            try:
+                if self.server.noop()[0] != 250:
+                    raise smtplib.SMTPServerDisconnected("NOOP failed")
+            except (smtplib.SMTPException, OSError):
+                self._connect()
+
+    def _send_batch(self, batch):
+        """Sends the messages of a batch over the pooled connection (runs in a worker thread)."""
+        self.stats["batches"] += 1
+        results = []
+        for msg, recipients, from_address in batch:
+            try:
+                results.append(self._send_one(msg, recipients, from_address))
+            except Exception as e:
+                # An unexpected error fails this message only; the connection may be in any state
+                logging.error(f"Error sending email: {str(e)}")
+                self.stats["failed"] += 1
+                self._disconnect()
+                results.append(e)
+        self.last_used = time.monotonic()
+        return results
+
+    def _send_one(self, msg, recipients, from_address):
+        for attempt in range(self.max_retries + 1):
+            try:
+                self._ensure_connection()
+                refused = deliver(self.server, msg, from_address, recipients)
+                if refused:
+                    logging.error(f"Failed to send email to some or all recipients: {refused}")
+                    self.stats["failed"] += 1
+                    return False
+                self.stats["sent"] += 1
+                return True
+            except (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, OSError) as e:
+                # Connection problem: reconnect and try again
+                logging.warning(f"SMTP connection lost ({e}); reconnecting (attempt {attempt + 1}).")
+                self.server = None
+            except smtplib.SMTPException as e:
+                logging.error(f"Error sending email: {str(e)}")
+                break
+        self.stats["failed"] += 1
+        return False
+
+
+# Sender used by send_email when started with start_default_sender().
+_default_sender: SmtpSender = None
+
+
+# Start the long-lived SMTP sender shared by every send_email call.
+async def start_default_sender(client: openiap.Client, **kwargs) -> SmtpSender:
+    """
+    Args:
+        client: An authenticated OpenIAP client, used to fetch the SMTP credentials.
+        **kwargs: Options passed to SmtpSender.
+
+    Returns:
+        SmtpSender: The started sender.
     """
-    Attach an image to the email message with a specific Content-ID.
+    global _default_sender
+    _default_sender = await SmtpSender(client, **kwargs).start()
+    return _default_sender
+
+
+# Flush and close the shared SMTP sender.
+async def stop_default_sender() -> None:
+    global _default_sender
+    if _default_sender is not None:
+        await _default_sender.close()
+        _default_sender = None
+
+
+# Send a built message over an open SMTP connection.
+def deliver(server: smtplib.SMTP, msg, from_address: str, recipients: List[str]) -> dict:
+    """
+    Returns:
+    - The refused recipients, as smtplib.SMTP.sendmail returns them.
     """
-    with open(image_path, 'rb') as img:
-        part = MIMEImage(img.read())
-        part.add_header('Content-ID', f"<{os.path.basename(image_path)}>")
-        part.add_header('Content-Disposition', 'inline',
-                        filename=os.path.basename(image_path))
-        msg.attach(part)
+    # Spooled messages are streamed to the socket; email.message objects are sent whole
+    if hasattr(msg, "sendmail"):
+        return msg.sendmail(server, from_address, recipients)
+    return server.sendmail(from_address, recipients, msg.as_string())
 
 # Sends an email with optional attachments.
 
 
-async def send_email(client: openiap.Client, to: str, subject: str, message_body: str, html_body=False, attachment_paths: List[str] = None, cc: List[str] = None, bcc: List[str] = None, from_address: str = None) -> None:
-    # Your function implementation here
+async def send_email(client: openiap.Client, to: str, subject: str, message_body: str, html_body=False, attachment_paths: List[str] = None, cc: List[str] = None, bcc: List[str] = None, from_address: str = None, sender: SmtpSender = None) -> bool:
 
     """
     Parameters:
-    - to: The email address of the recipient.
+    - to: The recipient email addresses, separated by ';' or ','.
     - subject: The subject of the email.
     - message_body: The body of the email.
     - attachment_paths: A list of file paths to attach to the email.
     - cc: A list of email addresses to send a carbon copy to.
     - bcc: A list of email addresses to send a blind carbon copy to.
     - from_address: The email address to send the email from.
+    - sender: The SmtpSender to queue the email on. Defaults to the one started with
+      start_default_sender(); without one, a connection is opened for this email only.
     """
 
-    if attachment_paths is None:
-        attachment_paths = []
-    if cc is None:
-        cc = []
-    if bcc is None:
-        bcc = []
+    # Queue the email on the long-lived sender, if there is one
+    sender = sender or _default_sender
+    if sender is not None:
+        username = from_address if from_address and is_valid_email(from_address) else sender.username
+        try:
+            messages, all_recipients = await asyncio.to_thread(
+                build_messages, username, to, subject, message_body, html_body, attachment_paths, cc, bcc)
+        except Exception as e:
+            logging.error(f"An error occurred: {str(e)}")
+            return False
+        results = []
+        try:
+            for msg in messages:
+                results.append(await sender.send(msg, all_recipients, username))
+        except Exception as e:
+            logging.error(f"An error occurred: {str(e)}")
+            return False
+        finally:
+            # The sender closes the messages it was given; close the ones never handed to it
+            for msg in messages[len(results) + 1:]:
+                msg.close()
+        return all(results)
 
     # Load configuration settings
     config = load_config()
@@ -160,47 +433,17 @@ async def send_email(client: openiap.Client, to: str, subject: str, message_body
         # Set the username to the provided from_address
         username = from_address
 
+    messages = []
     try:
 
-        # Create a message object
-        msg = MIMEMultipart()
-        msg['From'] = username
-        msg['To'] = to
-        msg['Subject'] = subject
-
-        # Add CC and BCC recipients if provided
-        if cc:
-            msg['Cc'] = ', '.join(cc)
-        if bcc:
-            msg['Bcc'] = ', '.join(bcc)
+        # Attachments are zipped, encoded and split off the event loop
+        messages, all_recipients = await asyncio.to_thread(
+            build_messages, username, to, subject, message_body, html_body, attachment_paths, cc, bcc)
 
-        # Compile all recipient addresses (including CC and BCC)
-        all_recipients = [to] + cc + bcc
-
-        if html_body:
-            # Attach the HTML message to the email
-            msg.attach(MIMEText(message_body, 'html', 'utf-8'))
-        else:
-            # Attach the plain text message to the email
-            msg.attach(MIMEText(message_body, 'plain', 'utf-8'))
-
-        # Attach files if provided
-        for attachment_path in attachment_paths:
-            if is_image_file(attachment_path):
-                # Function to attach the image with a Content-ID
-                attach_image(msg, attachment_path)
-            else:
-                with open(attachment_path, 'rb') as attachment:
-                    part = MIMEBase('application', 'octet-stream')
-                    part.set_payload(attachment.read())
-                encoders.encode_base64(part)
-                part.add_header('Content-Disposition',
-                                f"attachment; filename= {attachment_path}")
-                msg.attach(part)
-
-        # send result
-        send_result = server.sendmail(
-            username, all_recipients, msg.as_string())
+        # send result, without blocking the event loop
+        send_result = {}
+        for msg in messages:
+            send_result.update(await asyncio.to_thread(deliver, server, msg, username, all_recipients))
 
         # Check if the email was successfully sent
         if send_result == {}:
@@ -216,6 +459,8 @@ async def send_email(client: openiap.Client, to: str, subject: str, message_body
     except Exception as e:
         logging.error(f"An error occurred: {str(e)}")
     finally:
+        for msg in messages:
+            msg.close()
         await cleanup_connection(server)
 
 # Ensure to cleanup connection
@@ -233,6 +478,74 @@ async def cleanup_connection(smtp_server: smtplib.SMTP) -> None:
         smtp_server.quit()
 
 
+# SMS gateway client: one pooled HTTP session shared by every SMS.
+class SmsSender():
+    """
+    The gateway takes one GET request per SMS (UID, PW, O = sender, M = message,
+    N = number). Requests share a requests.Session whose connection pool holds
+    pool_size connections, so a burst of SMS reuses warm connections instead of opening
+    one each. The blocking calls run in a thread pool of the same size (the default
+    executor may have fewer threads), and every request has a timeout.
+
+    Attributes:
+        url (str): Gateway URL.
+        sender (str): Sender name or number shown to the recipients.
+        timeout (float): Seconds to connect and to read the response.
+        pool_size (int): Pooled connections to the gateway.
+    """
+
+    def __init__(self, url: str, uid: str, pw: str, sender: str, timeout: float = 10, pool_size: int = 10):
+        self.url = url
+        self.uid = uid
+        self.pw = pw
+        self.sender = sender
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.session = None
+        self.executor = None
+
+    def _session(self):
+        if self.session is None:
+            # Imported on first use: only SMS runs pay for requests
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            self.session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+            self.session.mount("http://", adapter)
+            self.session.mount("https://", adapter)
+        return self.session
+
+    def _get(self, message, number):
+        params = {'UID': self.uid, 'PW': self.pw, 'O': self.sender, 'M': message, 'N': number}
+        response = self._session().get(self.url, params=params, timeout=self.timeout)
+        if response.status_code != 200:
+            raise ConnectionError(f"SMS gateway answered {response.status_code} for {number}.")
+        return True
+
+    async def send(self, message: str, number: str) -> bool:
+        """
+        Sends one SMS.
+
+        Returns:
+            bool: True if the gateway accepted it.
+
+        Raises:
+            ConnectionError: If the gateway refuses the SMS or cannot be reached.
+        """
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix="sms")
+        return await asyncio.get_running_loop().run_in_executor(self.executor, self._get, message, number)
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+            self.executor = None
+        if self.session is not None:
+            self.session.close()
+            self.session = None
+
+
 # Sends an SMS notification
 async def send_sms(url, uid, pw, o, m, n):
 
@@ -241,20 +554,14 @@ async def send_sms(url, uid, pw, o, m, n):
         logging.error("One or more required parameters are missing.")
         return
 
-    # Define the parameters as a dictionary
-    params = {
-        'UID': uid,
-        'PW': pw,
-        'O': o,
-        'M': m,
-        'N': n
-    }
-
-    # Make the GET request with the parameters
-    response = requests.get(url, params=params)
-
-    # Check the response
-    return response.status_code == 200
+    sender = SmsSender(url, uid, pw, o)
+    try:
+        return await sender.send(m, n)
+    except Exception as e:
+        logging.error(f"Error sending SMS to {n}: {str(e)}")
+        return False
+    finally:
+        sender.close()
 
 
 # Send a Windows notification asynchronously and log the action.
@@ -270,6 +577,9 @@ async def send_windows_notification(title: str, message: str, timeout: int = 10,
         bool: True if the notification was sent successfully, False otherwise.
     """
     try:
+        # Imported on first use: only desktop notifications pay for plyer
+        from plyer import notification
+
         notification.notify(
             title=title,
             message=message,
@@ -282,3 +592,163 @@ async def send_windows_notification(title: str, message: str, timeout: int = 10,
     except Exception as e:
         logging.error(f"Error sending Windows notification: {str(e)}")
         return False
+
+
+# Sends email, SMS and desktop notifications concurrently.
+class NotificationDispatcher():
+    """
+    Each channel ("email", "sms", "desktop") has its own timeout per attempt, limit of
+    sends in flight (an asyncio.Semaphore) and RetryPolicy. notify() runs the channels
+    concurrently, and SMS to many numbers run concurrently up to the SMS limit, so
+    100 SMS with a limit of 10 take about 10 gateway round trips instead of 100.
+
+    A failure in one channel is logged and reported in the result; it never stops
+    the other channels.
+
+    Emails are not retried by default: the SmtpSender already reconnects and resends,
+    and an email whose attempt timed out may still be sent from its queue, so it is
+    never retried after a timeout (retry_timeout).
+
+    Attributes:
+        client (openiap.Client): OpenIAP client, used by send_email.
+        sms (SmsSender, optional): SMS gateway client; without one, SMS are skipped.
+        channels (dict): Settings per channel: timeout, concurrency, max_retries, backoff, retry_timeout.
+        stats (dict): Sent, failed and retried sends per channel.
+    """
+
+    CHANNEL_DEFAULTS = {
+        "email": {"timeout": 120, "concurrency": 2, "max_retries": 0, "backoff": 5.0, "retry_timeout": False},
+        "sms": {"timeout": 15, "concurrency": 10, "max_retries": 2, "backoff": 1.0, "retry_timeout": True},
+        "desktop": {"timeout": 10, "concurrency": 1, "max_retries": 0, "backoff": 0.0, "retry_timeout": True},
+    }
+
+    def __init__(self, client: openiap.Client = None, sms: SmsSender = None, channels: dict = None,
+                 app_name: str = 'YourApp'):
+        from helpers.retry import RetryPolicy, TRANSIENT
+
+        self.client = client
+        self.sms = sms
+        self.app_name = app_name
+        self.channels = {}
+        self.limits = {}
+        self.retry = {}
+        self.stats = {}
+        for name, defaults in self.CHANNEL_DEFAULTS.items():
+            settings = dict(defaults, **(channels or {}).get(name, {}))
+            self.channels[name] = settings
+            self.limits[name] = asyncio.Semaphore(settings["concurrency"])
+            # A notification that failed was not delivered: any failure may be retried
+            self.retry[name] = RetryPolicy(max_retries=settings["max_retries"], backoff=settings["backoff"],
+                                           max_backoff=settings.get("max_backoff", 60.0), default=TRANSIENT)
+            self.stats[name] = {"sent": 0, "failed": 0, "retried": 0}
+
+    @classmethod
+    def from_config(cls, client: openiap.Client, settings: dict, app_name: str = 'YourApp'):
+        """
+        Args:
+            client: OpenIAP client.
+            settings (dict): The 'notifications' section of the configuration. SMS are
+                enabled when sms.url is set; the gateway credentials are read from the
+                environment variables named by sms.uid_env and sms.password_env.
+        """
+        sms_settings = settings.get('sms', {})
+        sms = None
+        if sms_settings.get('url'):
+            sms = SmsSender(sms_settings['url'], os.environ.get(sms_settings.get('uid_env', 'SMS_UID'), ''),
+                            os.environ.get(sms_settings.get('password_env', 'SMS_PASSWORD'), ''),
+                            sms_settings.get('sender', ''), timeout=sms_settings.get('timeout', 10),
+                            pool_size=settings.get('channels', {}).get('sms', {}).get('concurrency', 10))
+        return cls(client, sms, settings.get('channels'), app_name)
+
+    async def _send(self, channel, description, send):
+        """
+        Runs one send under the channel's limit, timeout and retry policy.
+
+        Args:
+            send (callable): Returns the coroutine of one attempt; it returns True on success.
+
+        Returns:
+            bool: True if an attempt succeeded.
+        """
+        settings = self.channels[channel]
+        attempt = 1
+        while True:
+            timed_out = False
+            async with self.limits[channel]:
+                try:
+                    if await asyncio.wait_for(send(), settings["timeout"]):
+                        self.stats[channel]["sent"] += 1
+                        return True
+                    error = RuntimeError(f"{channel} send returned a failure")
+                except Exception as e:
+                    timed_out = isinstance(e, asyncio.TimeoutError)
+                    error = TimeoutError(f"{channel} send timed out") if timed_out else e
+
+            # A timed out attempt may still complete: retrying it could send twice
+            if timed_out and not settings["retry_timeout"]:
+                delay = None
+            else:
+                _, delay = self.retry[channel].should_retry(error, attempt)
+            if delay is None:
+                logging.error(f"Failed to send {description} after {attempt} attempts: {error}")
+                self.stats[channel]["failed"] += 1
+                return False
+            self.stats[channel]["retried"] += 1
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    async def send_email(self, to: str, subject: str, message_body: str, html_body=False,
+                         attachment_paths: List[str] = None) -> bool:
+        return await self._send("email", f"email '{subject}'", lambda: send_email(
+            self.client, to, subject, message_body, html_body=html_body, attachment_paths=attachment_paths))
+
+    async def send_sms(self, message: str, numbers: List[str]) -> dict:
+        """
+        Returns:
+            dict: True/False per number.
+        """
+        if self.sms is None:
+            logging.warning("SMS notifications are not configured (notifications.sms.url).")
+            return {number: False for number in numbers}
+        results = await asyncio.gather(*(
+            self._send("sms", f"SMS to {number}", lambda number=number: self.sms.send(message, number))
+            for number in numbers))
+        return dict(zip(numbers, results))
+
+    async def send_desktop(self, title: str, message: str) -> bool:
+        return await self._send("desktop", "desktop notification", lambda: send_windows_notification(
+            title, message, app_name=self.app_name))
+
+    async def notify(self, subject: str, message_body: str, email_to: str = None, sms_to: List[str] = None,
+                     sms_text: str = None, desktop: bool = False, attachment_paths: List[str] = None) -> dict:
+        """
+        Sends the same notification on every requested channel, concurrently.
+
+        Args:
+            subject (str): Email subject and desktop notification title.
+            message_body (str): HTML body of the email.
+            email_to (str, optional): Email recipients, separated by ';' or ','.
+            sms_to (list, optional): Phone numbers receiving sms_text.
+            sms_text (str, optional): Text of the SMS and of the desktop notification.
+            desktop (bool): Show a desktop notification.
+            attachment_paths (list, optional): Files attached to the email.
+
+        Returns:
+            dict: Result per channel used (bool, or a dict per number for SMS).
+        """
+        sends = {}
+        if email_to:
+            sends["email"] = self.send_email(email_to, subject, message_body, html_body=True,
+                                             attachment_paths=attachment_paths)
+        if sms_to and sms_text:
+            sends["sms"] = self.send_sms(sms_text, sms_to)
+        if desktop:
+            sends["desktop"] = self.send_desktop(subject, sms_text or subject)
+
+        results = dict(zip(sends, await asyncio.gather(*sends.values())))
+        logging.info(f"Notifications sent: {self.stats}")
+        return results
+
+    async def close(self):
+        if self.sms is not None:
+            await asyncio.to_thread(self.sms.close)
@@ -1,11 +1,205 @@
 import openiap
+import asyncio
 import logging
+import copy
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
 from typing import Optional, Dict, Any
 
 # Set logging for debug.
 logging.basicConfig(level=logging.INFO)
 
 
+# TTL + LRU cache of query results, keyed by collection and normalized query.
+class QueryCache():
+    """
+    Attributes:
+        ttl (float): Seconds an entry stays valid.
+        max_entries (int): Entries kept before the least recently used is evicted.
+        path (str): File where the cache is persisted, encrypted; None keeps it in memory only.
+        hits (int), misses (int), evictions (int): Counters for tuning.
+
+    set() and invalidate() only change the entries in memory; save() writes them to the
+    file and is blocking (encryption and file I/O), so async callers run it in a thread.
+    """
+
+    def __init__(self, ttl=300, max_entries=128, path=None, key=None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.save_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.path = None
+        self.fernet = None
+
+        # Results include credentials: persist only when they can be encrypted
+        if path and key:
+            try:
+                from cryptography.fernet import Fernet
+                self.fernet = Fernet(key)
+                self.path = path
+                self.load()
+            except ImportError:
+                logging.warning("cryptography is not installed; the query cache will not be persisted.")
+            except ValueError as e:
+                logging.warning(f"Invalid query cache key; the query cache will not be persisted: {e}")
+
+    @classmethod
+    def from_config(cls, settings):
+        """
+        Args:
+            settings (dict): The 'cache' section of the configuration. The encryption key
+                is read from the environment variable named by 'key_env'.
+
+        Returns:
+            QueryCache: The configured cache.
+        """
+        return cls(
+            ttl=settings.get('ttl', 300),
+            max_entries=settings.get('max_entries', 128),
+            path=settings.get('path'),
+            key=os.environ.get(settings.get('key_env', 'OPENFLOW_CACHE_KEY')),
+        )
+
+    @staticmethod
+    def make_key(collection, query):
+        """Equal queries give the same key whatever the order of their fields."""
+        return f"{collection}:{json.dumps(query, sort_keys=True, separators=(',', ':'), default=str)}"
+
+    def get(self, collection, query):
+        """
+        Returns:
+            The cached result (a copy), or None on a miss or expired entry.
+        """
+        key = self.make_key(collection, query)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] < time.time():
+                if entry is not None:
+                    del self.entries[key]
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return copy.deepcopy(entry[1])
+
+    def set(self, collection, query, value):
+        key = self.make_key(collection, query)
+        with self.lock:
+            self.entries[key] = (time.time() + self.ttl, copy.deepcopy(value))
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, collection=None, query=None):
+        """
+        Drops entries: one query, a whole collection, or everything when called without arguments.
+
+        Returns:
+            int: The number of entries dropped.
+        """
+        with self.lock:
+            if collection is None:
+                keys = list(self.entries)
+            elif query is not None:
+                keys = [key for key in [self.make_key(collection, query)] if key in self.entries]
+            else:
+                keys = [key for key in self.entries if key.startswith(f"{collection}:")]
+            for key in keys:
+                del self.entries[key]
+        return len(keys)
+
+    def stats(self):
+        """
+        Returns:
+            dict: Hit, miss and eviction counters, hit rate and current size.
+        """
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "size": len(self.entries),
+        }
+
+    def load(self):
+        """Loads the unexpired entries persisted by a previous run."""
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'rb') as file:
+                entries = json.loads(self.fernet.decrypt(file.read()))
+        except Exception as e:
+            logging.warning(f"Could not load the query cache from {self.path}: {e}")
+            return
+
+        now = time.time()
+        with self.lock:
+            for key, (expires_at, value) in entries:
+                if expires_at > now:
+                    self.entries[key] = (expires_at, value)
+
+    def save(self):
+        """Writes the cache, encrypted, to its file (atomically)."""
+        if not self.path:
+            return
+        with self.lock:
+            entries = list(self.entries.items())
+        # Lookups are not blocked while the snapshot is encrypted and written
+        data = json.dumps(entries, default=str).encode('utf-8')
+        with self.save_lock:
+            try:
+                temporary = f"{self.path}.tmp"
+                with open(temporary, 'wb') as file:
+                    file.write(self.fernet.encrypt(data))
+                os.replace(temporary, self.path)
+            except OSError as e:
+                logging.warning(f"Could not save the query cache to {self.path}: {e}")
+
+
+# Cache used by fetch_data; replace it with configure_cache() to apply the configuration.
+query_cache = QueryCache()
+
+
+# Replace the query cache used by fetch_data with one built from the configuration.
+def configure_cache(settings) -> QueryCache:
+    """
+    Args:
+        settings (dict): The 'cache' section of the configuration.
+
+    Returns:
+        QueryCache: The new cache.
+    """
+    global query_cache
+    query_cache = QueryCache.from_config(settings)
+    return query_cache
+
+
+def get_query_cache() -> QueryCache:
+    """The query cache currently used by fetch_data."""
+    return query_cache
+
+
+# Drop the cached queries of a collection after a write to it, so fetch_data does not serve stale rows.
+async def invalidate_collection(collection: str) -> int:
+    """
+    Returns:
+        int: The number of cached queries dropped.
+    """
+    dropped = query_cache.invalidate(collection)
+    if dropped:
+        await asyncio.to_thread(query_cache.save)
+    return dropped
+
+
 # Connect and authenticate to the OpenIAP service.
 async def connect_to_service() -> Optional[openiap.Client]:
     """
@@ -27,18 +221,19 @@ async def connect_to_service() -> Optional[openiap.Client]:
 
 
 # Retrieve data from a specified OpenIAP collection based on the provided query.
-async def get_data(client: openiap.Client, collection: str, query: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+async def get_data(client: openiap.Client, collection: str, query: Dict[str, Any], **options) -> Optional[Dict[str, Any]]:
     """
     Args:
         client (openiap.Client): An authenticated OpenIAP client.
         collection (str): Name of the collection to query from.
         query (dict): The query parameters.
+        **options: Extra Query arguments (top, skip, projection, orderby).
 
     Returns:
         dict or None: The result of the query or None if an error occurs.
     """
     try:
-        result = await client.Query(collectionname=collection, query=query)
+        result = await client.Query(collectionname=collection, query=query, **options)
         logging.info("Successfully retrieved data.")
         return result
     except Exception as e:
@@ -47,23 +242,40 @@ async def get_data(client: openiap.Client, collection: str, query: Dict[str, Any
         return None
 
 
-# Connect to the OpenIAP service and fetch data.
-async def fetch_data(client: openiap.Client, collection, query):
+# Connect to the OpenIAP service and fetch data, going through the query cache.
+async def fetch_data(client: openiap.Client, collection, query, use_cache=True, **options):
     """
+    Args:
+        use_cache (bool): Serve the result from the query cache when possible. Use False
+            for data that changes during the run.
+        **options: Extra Query arguments (top, skip, projection, orderby).
+
     Returns:
-        tuple: A tuple containing the fetched data and the client object.
-              If there's an error, the respective element in the tuple will be None.
+        The fetched data, or None if there's an error or nothing was found.
     """
+    data = None
+    # The options change the result, so they are part of the cache key
+    cache_query = {"query": query, "options": options} if options else query
     try:
+        if use_cache:
+            data = query_cache.get(collection, cache_query)
+            if data is not None:
+                return data
+
         if not client:
             logging.error("Unable to connect to OpenIAP service.")
-            return data, client
+            return None
 
-        data = await get_data(client, collection, query)
+        data = await get_data(client, collection, query, **options)
         if not data:
             logging.warning("No data retrieved.")
             return None
 
+        if use_cache:
+            query_cache.set(collection, cache_query, data)
+            # Encryption and file I/O: keep them off the event loop
+            await asyncio.to_thread(query_cache.save)
+
     except Exception as e:
         logging.error(
             f"An error occurred while connecting or fetching data: {e}")
@@ -91,7 +303,11 @@ async def save_data(client: openiap.Client, collection: str, data: list, field="
         if not client:
             raise ConnectionError("Failed to connect to OpenIAP service.")
 
-        response = await client.InsertOrUpdateMany(items=data, collectionname=collection, uniqeness=field)
+        try:
+            response = await client.InsertOrUpdateMany(items=data, collectionname=collection, uniqeness=field)
+        finally:
+            # Even a failed call may have written some documents
+            await invalidate_collection(collection)
         if response:
             logging.info("Data saved successfully.")
             return True
@@ -105,6 +321,36 @@ async def save_data(client: openiap.Client, collection: str, data: list, field="
         return False
 
 
+# Connect to the OpenIAP service and insert one document, failing if its _id is taken.
+async def insert_data(client: openiap.Client, collection: str, item: dict) -> bool:
+    """
+    Unlike save_data, never overwrites: the unique _id makes it usable as an atomic claim.
+
+    Args:
+        collection (str): The collection to insert into.
+        item (dict): The document to insert.
+
+    Returns:
+        bool: True if the document was inserted, False if it already existed or there was an error.
+    """
+    if not collection or not isinstance(item, dict) or not item:
+        logging.error("Invalid data.")
+        return False
+
+    try:
+        if not client:
+            raise ConnectionError("Failed to connect to OpenIAP service.")
+
+        try:
+            return bool(await client.InsertOne(item=item, collectionname=collection))
+        finally:
+            await invalidate_collection(collection)
+
+    except Exception as e:
+        logging.debug(f"Document not inserted into {collection}: {e}")
+        return False
+
+
 # Connect to the OpenIAP service and delete data.
 async def delete_data(client: openiap.Client, query: dict, collection: str, recursive: bool = False) -> bool:
 
@@ -116,7 +362,10 @@ async def delete_data(client: openiap.Client, query: dict, collection: str, recu
         if not client:
             raise ConnectionError("Failed to connect to OpenIAP service.")
 
-        response = await client.DeleteMany(query=query, collectionname=collection, recursive=recursive)
+        try:
+            response = await client.DeleteMany(query=query, collectionname=collection, recursive=recursive)
+        finally:
+            await invalidate_collection(collection)
         if response:
             logging.info("Data deleted successfully.")
             return True
@@ -0,0 +1,152 @@
+import asyncio
+import copy
+import json
+import threading
+from collections import defaultdict
+
+
+# Raised like the OpenIAP client does when a request fails (e.g. duplicate _id).
+class SimOpenIAPError(Exception):
+    pass
+
+
+def _compare(value, condition):
+    # Minimal MongoDB query semantics for one field
+    if isinstance(condition, dict) and any(key.startswith("$") for key in condition):
+        for operator, operand in condition.items():
+            if operator == "$in" and value not in operand:
+                return False
+            if operator == "$nin" and value in operand:
+                return False
+            if operator == "$ne" and value == operand:
+                return False
+            if operator == "$exists" and (value is not None) != bool(operand):
+                return False
+            if operator in ("$lt", "$lte", "$gt", "$gte"):
+                if value is None:
+                    return False
+                if operator == "$lt" and not value < operand:
+                    return False
+                if operator == "$lte" and not value <= operand:
+                    return False
+                if operator == "$gt" and not value > operand:
+                    return False
+                if operator == "$gte" and not value >= operand:
+                    return False
+        return True
+    if isinstance(value, list) and not isinstance(condition, list):
+        return condition in value
+    return value == condition
+
+
+def matches(document, query):
+    """
+    Args:
+        document (dict): A stored document.
+        query (dict): MongoDB-style query ($or, $and, $in, $nin, $ne, $exists, $lt, $lte, $gt, $gte).
+
+    Returns:
+        bool: Whether the document matches.
+    """
+    for key, condition in query.items():
+        if key == "$or":
+            if not any(matches(document, sub) for sub in condition):
+                return False
+        elif key == "$and":
+            if not all(matches(document, sub) for sub in condition):
+                return False
+        elif not _compare(document.get(key), condition):
+            return False
+    return True
+
+
+# In-memory stand-in for openiap.Client, to run and benchmark the OpenIAP code paths locally.
+class SimOpenIAPClient():
+    """
+    Implements the calls used by helpers/openflow.py (Query, InsertOne, InsertOrUpdateMany,
+    DeleteMany, Close) over dicts. Several instances can share one store, like several
+    robots sharing one OpenIAP server.
+
+    Attributes:
+        store (defaultdict): Documents by collection, then by _id.
+        latency (float): Seconds awaited per call, to emulate the network.
+        calls (defaultdict): Number of calls per method.
+    """
+
+    def __init__(self, store=None, latency=0.0):
+        self.store = store if store is not None else defaultdict(dict)
+        self.latency = latency
+        self.calls = defaultdict(int)
+        self.lock = threading.Lock()
+        self.next_id = 0
+
+    async def _call(self, name):
+        self.calls[name] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    def _new_id(self):
+        self.next_id += 1
+        return f"sim{id(self):x}{self.next_id:08d}"
+
+    async def Query(self, collectionname="entities", query={}, projection={}, top=100, skip=0, orderby=None, queryas=None):
+        await self._call("Query")
+        with self.lock:
+            documents = [copy.deepcopy(document) for document in self.store[collectionname].values()
+                         if matches(document, query)]
+
+        if orderby:
+            order = json.loads(orderby) if isinstance(orderby, str) else orderby
+            if isinstance(order, dict):
+                for key, direction in reversed(list(order.items())):
+                    documents.sort(key=lambda document: (document.get(key) is None, document.get(key)),
+                                   reverse=direction == -1)
+        if projection:
+            keep = {key for key, value in projection.items() if value} | {"_id"}
+            documents = [{key: value for key, value in document.items() if key in keep} for document in documents]
+        return documents[skip:skip + top]
+
+    async def InsertOne(self, item, collectionname="entities"):
+        await self._call("InsertOne")
+        with self.lock:
+            item = copy.deepcopy(item)
+            item.setdefault("_id", self._new_id())
+            if item["_id"] in self.store[collectionname]:
+                raise SimOpenIAPError(f"E11000 duplicate key error collection: {collectionname} _id: {item['_id']}")
+            self.store[collectionname][item["_id"]] = item
+            return copy.deepcopy(item)
+
+    async def InsertOrUpdateMany(self, items, collectionname="entities", uniqeness="_id", skipresults=False):
+        await self._call("InsertOrUpdateMany")
+        results = []
+        with self.lock:
+            collection = self.store[collectionname]
+            for item in items:
+                item = copy.deepcopy(item)
+                existing = None
+                if uniqeness == "_id":
+                    existing = collection.get(item.get("_id"))
+                else:
+                    keys = uniqeness.split(",")
+                    existing = next((document for document in collection.values()
+                                     if all(document.get(key) == item.get(key) for key in keys)), None)
+                if existing is not None:
+                    existing.update(item)
+                    item = existing
+                else:
+                    item.setdefault("_id", self._new_id())
+                    collection[item["_id"]] = item
+                results.append(copy.deepcopy(item))
+        return [] if skipresults else results
+
+    async def DeleteMany(self, query, collectionname="entities", recursive=False):
+        await self._call("DeleteMany")
+        with self.lock:
+            collection = self.store[collectionname]
+            doomed = [key for key, document in collection.items() if matches(document, query)]
+            for key in doomed:
+                del collection[key]
+        return len(doomed)
+
+    def Close(self):
+        pass
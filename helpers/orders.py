@@ -0,0 +1,191 @@
+import asyncio
+import csv
+import os
+import logging
+from itertools import islice
+
+# Rows read per batch when the configuration does not say otherwise
+DEFAULT_BATCH_SIZE = 500
+
+
+def order_key(ordem):
+    """
+    Normalize an order number read from Excel, CSV or OpenIAP (5100234350, 5100234350.0, "5100234350").
+
+    Returns:
+        str: The order number as a string of digits.
+    """
+    if isinstance(ordem, float) and ordem.is_integer():
+        return str(int(ordem))
+    return str(ordem).strip()
+
+
+def batched(iterable, size):
+    """
+    Group an iterable into lists of at most size items, lazily.
+
+    Args:
+        iterable: Items to group.
+        size (int): Maximum items per list.
+    """
+    # islice fills each list in C rather than one append per item
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+# Base class for the sources of orders to process.
+class OrderSource():
+    """
+    An OrderSource yields the rows of its input as dictionaries, in batches of at
+    most batch_size rows, without holding more than one batch in memory.
+
+    Subclasses implement batches().
+    """
+
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE):
+        self.batch_size = max(1, int(batch_size))
+
+    def batches(self):
+        raise NotImplementedError
+
+    def rows(self):
+        """Iterate over every row of the source, one at a time."""
+        for batch in self.batches():
+            yield from batch
+
+    def _chunk(self, rows):
+        return batched(rows, self.batch_size)
+
+
+# Orders from an Excel workbook, read with openpyxl in read-only (streaming) mode.
+class ExcelOrderSource(OrderSource):
+    """
+    Args:
+        path (str): Path to the .xlsx/.xlsm workbook.
+        sheet (str, optional): Worksheet name. Defaults to the active sheet.
+        batch_size (int): Rows per batch.
+    """
+
+    def __init__(self, path, sheet=None, batch_size=DEFAULT_BATCH_SIZE):
+        super().__init__(batch_size)
+        self.path = path
+        self.sheet = sheet
+
+    def batches(self):
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(self.path, read_only=True, data_only=True)
+        try:
+            worksheet = workbook[self.sheet] if self.sheet else workbook.active
+            values = worksheet.iter_rows(values_only=True)
+
+            # The first row holds the column names
+            header = next(values, None)
+            if header is None:
+                return
+            header = [str(name).strip() if name is not None else "" for name in header]
+
+            rows = (dict(zip(header, row)) for row in values if any(cell is not None for cell in row))
+            yield from self._chunk(rows)
+        finally:
+            workbook.close()
+
+
+# Orders from a CSV file.
+class CsvOrderSource(OrderSource):
+    """
+    Args:
+        path (str): Path to the CSV file; the first line holds the column names.
+        delimiter (str, optional): Field delimiter. Detected from the header if None.
+        encoding (str): File encoding.
+        batch_size (int): Rows per batch.
+    """
+
+    def __init__(self, path, delimiter=None, encoding="utf-8-sig", batch_size=DEFAULT_BATCH_SIZE):
+        super().__init__(batch_size)
+        self.path = path
+        self.delimiter = delimiter
+        self.encoding = encoding
+
+    def batches(self):
+        with open(self.path, newline="", encoding=self.encoding) as file:
+            delimiter = self.delimiter
+            if delimiter is None:
+                header = file.readline()
+                delimiter = ";" if header.count(";") > header.count(",") else ","
+                file.seek(0)
+
+            reader = csv.DictReader(file, delimiter=delimiter)
+            rows = ({key.strip(): value for key, value in row.items() if key is not None} for row in reader)
+            yield from self._chunk(rows)
+
+
+# Orders from an OpenIAP collection, read page by page.
+class OpenIAPOrderSource(OrderSource):
+    """
+    The OpenIAP client is asynchronous; batches() may be consumed from a worker
+    thread while the event loop given as 'loop' keeps running in the main thread.
+
+    Args:
+        client (openiap.Client): An authenticated OpenIAP client.
+        collection (str): Collection holding one document per order.
+        query (dict, optional): Query selecting the documents.
+        loop (asyncio.AbstractEventLoop, optional): Loop running the client, needed by batches().
+        batch_size (int): Documents per page.
+    """
+
+    def __init__(self, client, collection, query=None, loop=None, batch_size=DEFAULT_BATCH_SIZE):
+        super().__init__(batch_size)
+        self.client = client
+        self.collection = collection
+        self.query = query or {}
+        self.loop = loop
+
+    async def fetch_page(self, skip):
+        """Fetch one page of documents, ordered by _id so pages do not overlap."""
+        return await self.client.Query(collectionname=self.collection, query=self.query,
+                                       top=self.batch_size, skip=skip, orderby={"_id": 1})
+
+    def batches(self):
+        if self.loop is None:
+            raise RuntimeError("OpenIAPOrderSource.batches() needs the event loop running the client.")
+
+        skip = 0
+        while True:
+            page = asyncio.run_coroutine_threadsafe(self.fetch_page(skip), self.loop).result()
+            if not page:
+                return
+            yield page
+            if len(page) < self.batch_size:
+                return
+            skip += len(page)
+
+
+# Build the order source described by the 'orders' section of the configuration.
+def open_order_source(orders_config, client=None, loop=None, source=None):
+    """
+    Args:
+        orders_config (dict): The 'orders' section of the configuration.
+        client (openiap.Client, optional): Needed when the source is 'openiap'.
+        loop (asyncio.AbstractEventLoop, optional): Loop running the OpenIAP client.
+        source (str, optional): Overrides orders_config['source'] (a file path or 'openiap').
+
+    Returns:
+        OrderSource: The order source.
+    """
+    source = source or orders_config['source']
+    batch_size = orders_config.get('batch_size', DEFAULT_BATCH_SIZE)
+
+    if source == "openiap":
+        return OpenIAPOrderSource(client, orders_config['collection'], orders_config.get('query'),
+                                  loop=loop, batch_size=batch_size)
+
+    extension = os.path.splitext(source)[1].lower()
+    if extension in (".xlsx", ".xlsm"):
+        return ExcelOrderSource(source, orders_config.get('sheet'), batch_size=batch_size)
+    if extension in (".csv", ".txt"):
+        return CsvOrderSource(source, orders_config.get('csv_delimiter'), batch_size=batch_size)
+
+    logging.error(f"Unsupported order source: {source}")
+    raise ValueError(f"Unsupported order source '{source}'.")
@@ -0,0 +1,202 @@
+import asyncio
+import itertools
+import logging
+
+from helpers.retry import PERMANENT
+
+# Marks the end of a stage queue
+_STOP = object()
+
+
+# Producer/consumer pipeline: input parsing -> SAP execution -> persistence/notification.
+class OrderPipeline():
+    """
+    The three stages run concurrently, connected by bounded queues:
+
+    - the producer reads work items from the input in chunks, on a worker thread;
+    - one SAP consumer per AsyncSapSession runs the operation on the session thread;
+    - the sink awaits on_result for each result (journal, notifications, ...).
+
+    So SAP is never idle while the input is read or while results are stored, and a
+    slow stage applies back-pressure through its queue instead of buffering everything.
+
+    A failed item is isolated: the session is recovered (e.g. /n), and with a retry
+    policy a transient failure goes back to the end of the queue after its backoff,
+    while the sessions carry on with the next items. The run ends once every item has
+    succeeded or used up its retries.
+
+    A session that cannot be recovered leaves the pipeline after its item has been
+    requeued or reported; the other sessions take over its share of the queue. The
+    run fails once no session is left.
+
+    Attributes:
+        sessions (list): AsyncSapSession objects, one SAP consumer each.
+        operation (callable): Called as operation(sap_session, item) on the session thread; returns
+            the status, or a dict merged into the result of the item.
+        on_result (coroutine function, optional): Awaited with each result dict.
+        on_error (coroutine function, optional): Awaited with the exception of each item that finally failed.
+        retry (RetryPolicy, optional): Retries transient failures; without it every failure is final.
+        recover (callable, optional): Called as recover(sap_session) on the session thread after a failure;
+            returns False (or raises) if the session could not be brought back to a known screen.
+        queue_size (int): Capacity of each queue.
+        read_chunk (int): Items read from the input per worker thread call.
+    """
+
+    def __init__(self, sessions, operation, on_result=None, queue_size=100, read_chunk=100, on_error=None,
+                 retry=None, recover=None):
+        self.sessions = sessions
+        self.operation = operation
+        self.on_result = on_result
+        self.on_error = on_error
+        self.retry = retry
+        self.recover = recover
+        self.queue_size = queue_size
+        self.read_chunk = read_chunk
+        self.retried = 0
+
+    async def _produce(self, items, work):
+        iterator = iter(items)
+        index = 0
+        try:
+            while True:
+                # Reading the input (openpyxl, csv, OpenIAP pages) may block: keep it off the loop
+                chunk = await asyncio.to_thread(lambda: list(itertools.islice(iterator, self.read_chunk)))
+                if not chunk:
+                    break
+                for item in chunk:
+                    self._in_flight += 1
+                    await work.put((index, item, 1))
+                    index += 1
+
+            # Items waiting for a retry may still come back to the queue
+            self._input_done = True
+            if self._in_flight:
+                await self._drained.wait()
+        finally:
+            for retry in self._deferred:
+                retry.cancel()
+        for _ in self.sessions:
+            await work.put(_STOP)
+        return index
+
+    async def _requeue(self, work, entry, delay):
+        await asyncio.sleep(delay)
+        await work.put(entry)
+
+    def _settle(self):
+        # One item less to wait for: its final result is known
+        self._in_flight -= 1
+        if self._input_done and not self._in_flight:
+            self._drained.set()
+
+    async def _consume(self, session, work, done):
+        while True:
+            entry = await work.get()
+            if entry is _STOP:
+                break
+            index, item, attempt = entry
+            result = {"index": index, "ordem": item, "session": session.name, "attempts": attempt}
+            recovered = True
+            try:
+                outcome = await session.run(self.operation, session.sap_session, item)
+                # An operation may return its outcome as a dict ({"status", "message", "document", ...})
+                if isinstance(outcome, dict):
+                    result.update(outcome)
+                else:
+                    result["status"] = outcome
+            except Exception as e:
+                recovered = await self._recover(session)
+                kind, delay = self.retry.should_retry(e, attempt) if self.retry is not None else (PERMANENT, None)
+                if delay is not None:
+                    logging.warning(f"Item {item} failed on {session.name} (attempt {attempt}, {kind}), "
+                                    f"retrying in {delay:.1f}s: {e}")
+                    self.retried += 1
+                    retry = asyncio.create_task(self._requeue(work, (index, item, attempt + 1), delay))
+                    self._deferred.add(retry)
+                    retry.add_done_callback(self._deferred.discard)
+                    if not recovered:
+                        return self._leave(session)
+                    continue
+
+                logging.error(f"Item {item} failed on {session.name} after {attempt} attempt(s) ({kind}): {e}")
+                result.update(status=False, failure=kind, message=str(e),
+                              message_type=getattr(e, "message_type", None) or None)
+                # SAP counters of the failed attempt (SapOperationError)
+                result.update(getattr(e, "counters", None) or {})
+                if self.on_error is not None:
+                    try:
+                        await self.on_error(e)
+                    except Exception as handler_error:
+                        logging.error(f"Error handling the failure of {item}: {handler_error}")
+            await done.put(result)
+            self._settle()
+            if not recovered:
+                return self._leave(session)
+
+    async def _recover(self, session):
+        # Bring the session back to a known screen before its next item
+        if self.recover is None:
+            return True
+        try:
+            if await session.run(self.recover, session.sap_session) is not False:
+                return True
+            logging.error(f"Could not recover {session.name}: it did not get back to an idle main window")
+        except Exception as e:
+            logging.error(f"Could not recover {session.name}: {e}")
+        return False
+
+    def _leave(self, session):
+        # A session in an unknown state must not take more items
+        self._active -= 1
+        if not self._active:
+            raise RuntimeError(f"No SAP session left: {session.name}, the last one, could not be recovered.")
+        logging.error(f"Taking {session.name} out of the pipeline; {self._active} session(s) left.")
+
+    async def _sink(self, done, results):
+        while True:
+            result = await done.get()
+            if result is _STOP:
+                break
+            results[result["index"]] = result
+            if self.on_result is not None:
+                try:
+                    await self.on_result(result)
+                except Exception as e:
+                    logging.error(f"Error handling the result of {result['ordem']}: {e}")
+
+    async def run(self, items):
+        """
+        Runs every item of the input through the pipeline.
+
+        Args:
+            items (iterable): Work items (order numbers, or batches of them); consumed lazily.
+
+        Returns:
+            list: One result dict per item ({"index", "ordem", "status", "session", "attempts"}, plus
+                "failure" and "message" for failed items), in input order.
+        """
+        self._in_flight = 0
+        self._input_done = False
+        self._drained = asyncio.Event()
+        self._deferred = set()
+        self._active = len(self.sessions)
+
+        work = asyncio.Queue(maxsize=self.queue_size)
+        done = asyncio.Queue(maxsize=self.queue_size)
+        results = {}
+
+        sink = asyncio.create_task(self._sink(done, results))
+        producer = asyncio.create_task(self._produce(items, work))
+        consumers = [asyncio.create_task(self._consume(session, work, done)) for session in self.sessions]
+        try:
+            # The producer waits for the consumers: a consumer failing (no session left) ends the run
+            await asyncio.gather(producer, *consumers)
+            count = producer.result()
+        finally:
+            for task in [producer] + consumers:
+                task.cancel()
+            await done.put(_STOP)
+            await sink
+
+        return [results.get(index, {"index": index, "ordem": None, "status": False, "session": None})
+                for index in range(count)]
@@ -0,0 +1,203 @@
+import logging
+import os
+from datetime import datetime
+
+from helpers.orders import batched, order_key
+
+
+# Parse a table extract exported as text with tabs into rows indexed by order number.
+def parse_extract(path, order_column, encoding="cp1252"):
+    """
+    The export may start with blank or title lines; the header is the first line
+    containing the order column. Cells are stripped and order numbers normalized
+    without leading zeros, as SAP may show VBELN with or without them.
+
+    Args:
+        path (str): The exported file.
+        order_column (str): Header of the order number column (e.g. "VBELN").
+        encoding (str): Code page of the file, as written by SAP GUI.
+
+    Returns:
+        dict: Row (dict of header -> value) per normalized order number.
+    """
+    index = {}
+    header = None
+    with open(path, 'r', encoding=encoding, errors='replace', newline='') as file:
+        for line in file:
+            cells = [cell.strip() for cell in line.rstrip("\r\n").split("\t")]
+            if header is None:
+                if order_column in cells:
+                    header = cells
+                    position = header.index(order_column)
+                continue
+            if len(cells) <= position or not cells[position]:
+                continue
+            index[_key(cells[position])] = dict(zip(header, cells))
+
+    if header is None:
+        raise ValueError(f"Column {order_column} not found in the extract {path}.")
+    return index
+
+
+# Reads the status of the orders in bulk and drops the ones SAP would refuse, before any per-order work.
+class PreflightCheck():
+    """
+    Orders are read in batches of batch_size: one table extract (SE16N on VBUK by
+    default) per batch, parsed into an in-memory index. An order whose row matches a
+    skip rule (e.g. FKSTK = C, already billed), or that has no row (it does not
+    exist), is not queued: it is reported with the rule's status and reason instead.
+
+    An order only counts as missing when the extract ran: a failed or unfinished
+    extract raises, and filter() then queues the whole batch unchecked.
+
+    Attributes:
+        order_column (str): Column of the order number in the extract.
+        rules (list): Skip rules: {"column", "values", "status" ("done" | "failed"), "reason"}.
+        skip_missing (bool): Skip the orders absent from the extract.
+        roundtrips_per_order (int, optional): Roundtrips of the per-order work, to report
+            the interactions avoided.
+        stats (dict): Orders checked, extracts, roundtrips spent and orders skipped per reason.
+    """
+
+    def __init__(self, settings, roundtrips_per_order=None):
+        self.order_column = settings.get('columns', {}).get('order', 'VBELN')
+        self.rules = settings.get('skip', [])
+        self.skip_missing = settings.get('skip_missing', True)
+        self.missing_reason = settings.get('missing_reason', "Ordem não existe")
+        self.batch_size = settings.get('batch_size', 5000)
+        self.export_dir = os.path.abspath(settings.get('export_dir', 'preflight'))
+        self.encoding = settings.get('encoding', 'cp1252')
+        self.keep_files = settings.get('keep_files', False)
+        self.roundtrips_per_order = roundtrips_per_order
+        self.stats = {"checked": 0, "extracts": 0, "roundtrips": 0, "skipped": {}}
+
+    @classmethod
+    def from_config(cls, settings, roundtrips_per_order=None):
+        """
+        Args:
+            settings (dict): The 'preflight' section of the configuration.
+            roundtrips_per_order (int, optional): Roundtrips of the per-order work.
+
+        Returns:
+            PreflightCheck or None: None when the pre-flight is disabled.
+        """
+        if not settings.get('enabled', False):
+            return None
+        return cls(settings, roundtrips_per_order)
+
+    def read(self, sap_session, orders):
+        """
+        Runs one extract on the session thread and indexes it.
+
+        Args:
+            sap_session (SapGui): The session running the extract.
+            orders (list): Order numbers of the batch.
+
+        Returns:
+            dict: Row per normalized order number (orders absent from the extract have none);
+                empty when SAP reported that no order matched. The session is reset to the
+                start menu afterwards.
+
+        Raises:
+            RuntimeError: If the extract failed or did not finish.
+        """
+        os.makedirs(self.export_dir, exist_ok=True)
+        self.stats["extracts"] += 1
+        path = os.path.join(self.export_dir,
+                            f"preflight_{datetime.now().strftime('%Y%m%d%H%M%S')}_{self.stats['extracts']}.txt")
+
+        before = _roundtrips(sap_session)
+        try:
+            if not sap_session.export_table(orders, path):
+                return {}
+            return parse_extract(path, self.order_column, self.encoding)
+        finally:
+            # Leave SE16N: the orders type a bare transaction code, only accepted from the start menu
+            try:
+                if not sap_session.reset_session():
+                    logging.warning("The session did not get back to the start menu after the extract.")
+            except Exception as e:
+                logging.warning(f"Could not leave the extract screen: {e}")
+            after = _roundtrips(sap_session)
+            if before is not None and after is not None:
+                self.stats["roundtrips"] += max(0, after - before)
+            if not self.keep_files and os.path.exists(path):
+                os.remove(path)
+
+    def classify(self, row):
+        """
+        Args:
+            row (dict or None): The extract row of an order.
+
+        Returns:
+            dict or None: The matching skip rule, or None if the order must be processed.
+        """
+        if row is None:
+            if self.skip_missing:
+                return {"status": "failed", "reason": self.missing_reason}
+            return None
+        for rule in self.rules:
+            if row.get(rule["column"], "") in rule["values"]:
+                return rule
+        return None
+
+    def filter(self, orders, read, on_skip):
+        """
+        Yields the orders to process, reading their status one batch ahead.
+
+        Args:
+            orders (iterable): Order numbers.
+            read (callable): Called with a batch of orders; returns the index of read().
+                Lets the caller run the extract on the session thread.
+            on_skip (callable): Called with the outcome of each skipped order
+                ({"ordem", "status", "message_type", "message", "skipped"}).
+        """
+        for batch in batched(orders, self.batch_size):
+            try:
+                index = read(batch)
+            except Exception as e:
+                # The pre-flight only saves work: without it, every order goes through SAP
+                logging.error(f"Pre-flight extract failed, processing the batch without it: {e}")
+                yield from batch
+                continue
+
+            self.stats["checked"] += len(batch)
+            for ordem in batch:
+                rule = self.classify(index.get(_key(ordem)))
+                if rule is None:
+                    yield ordem
+                    continue
+                reason = rule["reason"]
+                self.stats["skipped"][reason] = self.stats["skipped"].get(reason, 0) + 1
+                on_skip({"ordem": ordem, "status": rule.get("status", "failed") == "done",
+                         "message_type": "", "message": f"Pré-verificação: {reason}", "skipped": True})
+
+    def report(self):
+        """
+        Logs and returns the orders skipped and the SAP interactions avoided.
+
+        Returns:
+            dict: stats, with "avoided_roundtrips" when roundtrips_per_order is known.
+        """
+        skipped = sum(self.stats["skipped"].values())
+        report = dict(self.stats, skipped_total=skipped)
+        message = (f"Pre-flight: {self.stats['checked']} orders checked in {self.stats['extracts']} extracts "
+                   f"({self.stats['roundtrips']} roundtrips), {skipped} skipped {self.stats['skipped']}")
+        if self.roundtrips_per_order:
+            report["avoided_roundtrips"] = skipped * self.roundtrips_per_order - self.stats["roundtrips"]
+            message += (f"; avoided {skipped * self.roundtrips_per_order} per-order roundtrips "
+                        f"(net {report['avoided_roundtrips']}).")
+        logging.info(message)
+        return report
+
+
+def _key(ordem):
+    return order_key(ordem).lstrip("0")
+
+
+def _roundtrips(sap_session):
+    # GuiSessionInfo.RoundTrips: roundtrips of the session so far
+    try:
+        return int(sap_session.session.Info.RoundTrips)
+    except Exception:
+        return None
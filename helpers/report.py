@@ -0,0 +1,177 @@
+import io
+from html import escape
+from itertools import chain, islice
+
+# Characters kept from one field (a traceback, a long message) before truncating it
+MAX_FIELD = 20000
+
+# Rows kept from one list of records
+MAX_ROWS = 1000
+
+# Records examined to find the columns of a table, when they are not given
+COLUMN_SCAN = 50
+
+STYLE = ("<style>table{border-collapse:collapse}th,td{border:1px solid #999;padding:2px 6px;"
+         "text-align:left;vertical-align:top}pre{margin:0;white-space:pre-wrap}</style>")
+
+
+# HTML report written piece by piece to a text stream, with every value escaped.
+class HtmlReport():
+    """
+    Nothing is concatenated: each piece goes straight to the output stream (a StringIO
+    by default, or an open file), so a large report is built in linear time and, with a
+    file, in bounded memory. Lists of records are consumed as iterables, one row at a
+    time.
+
+    Values are rendered by type: dicts as key/value tables, lists of dicts as tables
+    with one row per record, other lists as bullet lists, multi-line strings (e.g.
+    tracebacks) as <pre> blocks. Strings longer than max_field characters are truncated.
+
+    Attributes:
+        out (TextIO): The output stream.
+        max_field (int): Characters kept per field.
+        max_rows (int): Rows kept per list of records; the remaining ones are only counted.
+    """
+
+    def __init__(self, title=None, out=None, max_field=MAX_FIELD, max_rows=MAX_ROWS):
+        self.buffered = out is None
+        self.out = io.StringIO() if self.buffered else out
+        self.max_field = max_field
+        self.max_rows = max_rows
+        self.closed = False
+        self.write = self.out.write
+        self.write(f"<html><head><meta charset='utf-8'>{STYLE}</head><body>")
+        if title:
+            self.heading(title)
+
+    def text(self, value):
+        """
+        Args:
+            value: Any value; None gives an empty string.
+
+        Returns:
+            str: The value as escaped HTML, truncated to max_field characters.
+        """
+        if value is None:
+            return ""
+        text = value if isinstance(value, str) else str(value)
+        if len(text) > self.max_field:
+            omitted = len(text) - self.max_field
+            return f"{escape(text[:self.max_field])}<br><em>… ({omitted} caracteres omitidos)</em>"
+        return escape(text)
+
+    def heading(self, text, level=1):
+        self.write(f"<h{level}>{self.text(text)}</h{level}>")
+
+    def paragraph(self, text):
+        self.write(f"<p>{self.text(text)}</p>")
+
+    def raw(self, html):
+        """Writes trusted HTML as is (e.g. a message body from the configuration)."""
+        self.write(html)
+
+    def value(self, value):
+        """Writes one value, rendered according to its type."""
+        if isinstance(value, dict):
+            self.table(value)
+        elif isinstance(value, (list, tuple)):
+            if value and all(isinstance(item, dict) for item in value):
+                self.records(value)
+            elif value:
+                self.write("<ul>")
+                for item in islice(value, self.max_rows):
+                    self.write("<li>")
+                    self.value(item)
+                    self.write("</li>")
+                if len(value) > self.max_rows:
+                    self.write(f"<li><em>… mais {len(value) - self.max_rows}</em></li>")
+                self.write("</ul>")
+        elif isinstance(value, str) and "\n" in value:
+            self.write(f"<pre>{self.text(value)}</pre>")
+        else:
+            self.write(self.text(value))
+
+    def table(self, data):
+        """
+        Args:
+            data (dict): Rendered as one row per key; nested values become nested tables.
+        """
+        self.write("<table>")
+        for key, value in data.items():
+            self.write(f"<tr><th>{self.text(key)}</th><td>")
+            self.value(value)
+            self.write("</td></tr>")
+        self.write("</table>")
+
+    def records(self, rows, columns=None):
+        """
+        Args:
+            rows (iterable): Dicts, one per table row; consumed lazily.
+            columns (list, optional): Columns to show. Defaults to the keys of the first
+                COLUMN_SCAN records, in order of appearance.
+
+        Returns:
+            int: Number of records (shown or not).
+        """
+        rows = iter(rows)
+        head = []
+        if columns is None:
+            head = list(islice(rows, COLUMN_SCAN))
+            columns = list(dict.fromkeys(key for row in head for key in row))
+
+        self.write("<table><tr>")
+        for column in columns:
+            self.write(f"<th>{self.text(column)}</th>")
+        self.write("</tr>")
+
+        count = 0
+        for row in chain(head, rows):
+            count = self._row(row, columns, count)
+
+        if count > self.max_rows:
+            self.write(f"<tr><td colspan='{max(len(columns), 1)}'><em>… mais {count - self.max_rows} linhas"
+                       f"</em></td></tr>")
+        self.write("</table>")
+        return count
+
+    def _row(self, row, columns, count):
+        if count < self.max_rows:
+            self.write("<tr>")
+            for column in columns:
+                self.write("<td>")
+                self.value(row.get(column))
+                self.write("</td>")
+            self.write("</tr>")
+        return count + 1
+
+    def close(self):
+        """
+        Ends the document.
+
+        Returns:
+            str or None: The HTML, unless an output stream was given.
+        """
+        if not self.closed:
+            self.write("</body></html>")
+            self.closed = True
+        if self.buffered:
+            return self.out.getvalue()
+        return None
+
+
+def render_html(data, title=None, out=None, **options):
+    """
+    Render a dict (or list of records) as an HTML report.
+
+    Args:
+        data (dict or list): The report content.
+        title (str, optional): Heading of the report.
+        out (TextIO, optional): Stream receiving the HTML; defaults to a string.
+        **options: max_field and max_rows of HtmlReport.
+
+    Returns:
+        str or None: The HTML, unless written to out.
+    """
+    report = HtmlReport(title, out, **options)
+    report.value(data)
+    return report.close()
@@ -0,0 +1,131 @@
+import csv
+import logging
+import os
+import threading
+from datetime import datetime
+
+# Columns of the results file
+COLUMNS = ("ordem", "status", "message_type", "message", "document", "attempts", "session", "roundtrips",
+           "flushes", "response_ms", "interpretation_ms", "finished_at")
+
+
+# Per-order results written to a CSV or xlsx file as the orders complete.
+class ResultsWriter():
+    """
+    Rows are written one at a time and never kept in memory: CSV rows are flushed as
+    they are written, and xlsx files use openpyxl's write-only mode, which streams the
+    rows to a temporary file until close() saves the workbook.
+
+    With append (a resumed run), the rows of an existing file are kept: a CSV file is
+    opened for appending, and the rows of an xlsx file are streamed into the new
+    workbook before the new ones.
+
+    Attributes:
+        path (str): The results file; the format follows its extension (.xlsx or .csv).
+        rows (int): Rows in the file, including the ones kept from an earlier run.
+        counts (dict): Rows per status ("done", "failed").
+    """
+
+    def __init__(self, path, append=False):
+        self.path = path
+        self.rows = 0
+        self.counts = {"done": 0, "failed": 0}
+        self.lock = threading.Lock()
+        self.xlsx = os.path.splitext(path)[1].lower() == ".xlsx"
+        append = append and os.path.exists(path) and os.path.getsize(path) > 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        if self.xlsx:
+            from openpyxl import Workbook
+
+            self.workbook = Workbook(write_only=True)
+            self.sheet = self.workbook.create_sheet("Resultados")
+            self.sheet.append(COLUMNS)
+            if append:
+                self._copy_rows()
+        else:
+            if append:
+                self._count_rows()
+            self.file = open(path, 'a' if append else 'w', newline='', encoding='utf-8-sig')
+            self.writer = csv.writer(self.file, delimiter=';')
+            if not append:
+                self.writer.writerow(COLUMNS)
+
+    def _count(self, row):
+        status = row[1] if len(row) > 1 else None
+        if status in self.counts:
+            self.counts[status] += 1
+        self.rows += 1
+
+    def _copy_rows(self):
+        # write-only workbooks cannot be reopened: stream the earlier rows into the new one
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(self.path, read_only=True)
+        try:
+            for row in workbook.active.iter_rows(min_row=2, values_only=True):
+                self.sheet.append(["" if value is None else value for value in row])
+                self._count(row)
+        finally:
+            workbook.close()
+
+    def _count_rows(self):
+        with open(self.path, newline='', encoding='utf-8-sig') as file:
+            rows = csv.reader(file, delimiter=';')
+            next(rows, None)
+            for row in rows:
+                self._count(row)
+
+    @classmethod
+    def from_config(cls, settings, run_id=None, append=False):
+        """
+        Args:
+            settings (dict): The 'results' section of the configuration.
+            run_id (str, optional): Replaces {run_id} in the path.
+            append (bool): Keep the rows already in the file (resumed run).
+
+        Returns:
+            ResultsWriter or None: None when no results path is configured.
+        """
+        path = settings.get('path')
+        if not path:
+            return None
+        return cls(path.format(run_id=run_id or datetime.now().strftime("%Y%m%d%H%M%S")), append=append)
+
+    def write(self, result):
+        """
+        Args:
+            result (dict): Result of one order ({"ordem", "status", ...}); missing keys are left empty.
+        """
+        status = "done" if result.get("status") else "failed"
+        row = [result.get("ordem"), status] + [result.get(column) for column in COLUMNS[2:-1]] \
+            + [datetime.now().isoformat(timespec="seconds")]
+        row = ["" if value is None else value for value in row]
+        with self.lock:
+            if self.xlsx:
+                self.sheet.append(row)
+            else:
+                self.writer.writerow(row)
+                self.file.flush()
+            self.rows += 1
+            self.counts[status] += 1
+
+    def close(self):
+        """
+        Saves the file and logs the totals.
+
+        Returns:
+            str: The path of the results file.
+        """
+        with self.lock:
+            if self.xlsx:
+                if self.workbook is not None:
+                    self.workbook.save(self.path)
+                    self.workbook = None
+            elif not self.file.closed:
+                self.file.close()
+        logging.info(f"Results: {self.rows} orders written to {self.path} ({self.counts}).")
+        return self.path
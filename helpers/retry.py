@@ -0,0 +1,110 @@
+import logging
+
+from helpers.sapplan import PlanError
+
+# Failure classes
+TRANSIENT = "transient"
+PERMANENT = "permanent"
+
+# Status bar / error texts of failures that may succeed later (lowercase substrings)
+TRANSIENT_PATTERNS = (
+    "bloquead", "está a ser processado", "está sendo processado", "being processed", "locked",
+    "timed out", "timeout", "tempo esgotado", "busy", "ocupad", "could not be found by id",
+)
+
+# Failures that will fail again, whatever the number of attempts (checked first)
+PERMANENT_PATTERNS = (
+    "não existe", "does not exist", "já foi faturad", "already billed", "bloqueio de faturamento",
+    "billing block",
+)
+
+# Exception types classified without looking at their text
+TRANSIENT_ERRORS = (TimeoutError, ConnectionError)
+PERMANENT_ERRORS = (PlanError, KeyError)
+
+
+# Decides whether a failed order is retried, and when.
+class RetryPolicy():
+    """
+    A failure after the save was sent (SapOperationError.committed) is permanent,
+    whatever its text: the output may already be issued, and a retry would issue it
+    again. Otherwise a failure is permanent if its exception type or text (including
+    the status bar text of a SapOperationError) matches a permanent pattern, transient
+    if it matches a transient one, and `default` otherwise. Transient failures are retried up to
+    max_retries times, after backoff * backoff_factor ** (attempt - 1) seconds, capped
+    at max_backoff.
+
+    Unknown failures are permanent by default: one raised after the save may have
+    already issued the output, and retrying the order would issue it twice.
+
+    Attributes:
+        max_retries (int): Retries per order after the first attempt.
+        backoff (float): Seconds before the first retry.
+        backoff_factor (float): Growth of the delay between retries.
+        max_backoff (float): Longest delay between retries.
+        default (str): Class of failures matching no pattern.
+    """
+
+    def __init__(self, max_retries=3, backoff=5.0, backoff_factor=2.0, max_backoff=120.0, default=PERMANENT,
+                 transient=TRANSIENT_PATTERNS, permanent=PERMANENT_PATTERNS):
+        if default not in (TRANSIENT, PERMANENT):
+            raise ValueError(f"Invalid default failure class: {default}")
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.default = default
+        self.transient = tuple(pattern.lower() for pattern in transient)
+        self.permanent = tuple(pattern.lower() for pattern in permanent)
+
+    @classmethod
+    def from_config(cls, settings):
+        """
+        Args:
+            settings (dict): The 'retry' section of the configuration.
+        """
+        return cls(
+            max_retries=settings.get('max_retries', 3),
+            backoff=settings.get('backoff', 5.0),
+            backoff_factor=settings.get('backoff_factor', 2.0),
+            max_backoff=settings.get('max_backoff', 120.0),
+            default=settings.get('default', PERMANENT),
+            transient=settings.get('transient', TRANSIENT_PATTERNS),
+            permanent=settings.get('permanent', PERMANENT_PATTERNS),
+        )
+
+    def classify(self, error):
+        """
+        Args:
+            error (Exception): The failure of an order.
+
+        Returns:
+            str: TRANSIENT or PERMANENT.
+        """
+        if getattr(error, "committed", False) or isinstance(error, PERMANENT_ERRORS):
+            return PERMANENT
+        if isinstance(error, TRANSIENT_ERRORS):
+            return TRANSIENT
+
+        text = f"{getattr(error, 'status_text', '')} {error}".lower()
+        if any(pattern in text for pattern in self.permanent):
+            return PERMANENT
+        if any(pattern in text for pattern in self.transient):
+            return TRANSIENT
+        return self.default
+
+    def should_retry(self, error, attempt):
+        """
+        Args:
+            error (Exception): The failure.
+            attempt (int): Number of the attempt that failed (1 for the first).
+
+        Returns:
+            tuple: (failure class, delay in seconds before the retry, or None to give up).
+        """
+        kind = self.classify(error)
+        if kind == PERMANENT or attempt > self.max_retries:
+            return kind, None
+        delay = min(self.max_backoff, self.backoff * self.backoff_factor ** (attempt - 1))
+        logging.debug(f"Transient failure on attempt {attempt}, retrying in {delay:.1f}s: {error}")
+        return kind, delay
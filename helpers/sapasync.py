@@ -0,0 +1,71 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+
+# Non-blocking facade over one SAP GUI session.
+class AsyncSapSession():
+    """
+    Every call for the session runs on a dedicated single-thread executor whose thread
+    initializes the COM apartment, so the blocking SAP GUI Scripting calls never run
+    on the event loop and the COM objects always stay on the thread that created them.
+
+    Attributes:
+        driver (SapDriver): Driver of the session, used to set up the thread.
+        sap_session (SapGui): The session, created on the executor thread by open().
+    """
+
+    def __init__(self, driver, name="sap"):
+        self.driver = driver
+        self.name = name
+        self.sap_session = None
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=name,
+                                           initializer=driver.init_thread)
+
+    @classmethod
+    async def open(cls, driver, factory, name="sap"):
+        """
+        Creates the facade and builds its SapGui on the dedicated thread.
+
+        Args:
+            driver (SapDriver): Driver of the session.
+            factory (callable): Called without arguments on the session thread; returns the SapGui.
+            name (str): Name of the thread.
+
+        Returns:
+            AsyncSapSession: The facade, with sap_session set.
+        """
+        session = cls(driver, name)
+        try:
+            session.sap_session = await session.run(factory)
+        except Exception:
+            await session.close()
+            raise
+        return session
+
+    async def run(self, func, *args):
+        """
+        Runs func(*args) on the session thread.
+
+        Returns:
+            The value returned by func.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, lambda: func(*args))
+
+    async def call(self, method, *args):
+        """
+        Calls a SapGui method by name on the session thread, e.g. await session.call("sapLogin").
+
+        Returns:
+            The value returned by the method.
+        """
+        return await self.run(lambda: getattr(self.sap_session, method)(*args))
+
+    async def close(self):
+        """Releases the COM apartment and stops the session thread."""
+        try:
+            await self.run(self.driver.uninit_thread)
+        except Exception as e:
+            logging.error(f"Error releasing SAP session thread {self.name}: {e}")
+        self.executor.shutdown(wait=True)
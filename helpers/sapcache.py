@@ -0,0 +1,170 @@
+import threading
+
+# Element methods that send a roundtrip to the server and may change the screen
+ACTIONS = ("press", "sendvkey", "select", "selectall", "doubleclick", "selectcontextmenuitem",
+           "pressbutton", "presstoolbarbutton", "clickcurrentcell", "doubleclickcurrentcell")
+
+# Session methods that change the screen
+SESSION_ACTIONS = ("sendcommand", "starttransaction", "endtransaction", "createsession")
+
+# Hits and misses of every cached session, for the end-of-run log
+_totals = {"hits": 0, "misses": 0, "invalidations": 0}
+_totals_lock = threading.Lock()
+
+
+# Elements that live as long as the session, whatever the screen: SAP GUI creates the main
+# window, its command field and its status bar with the session and never replaces them
+# (a new screen only replaces the user area, wnd[0]/usr, and the toolbars below tbar[0])
+PERSISTENT = ("wnd[0]", "wnd[0]/tbar[0]/okcd", "wnd[0]/sbar")
+
+
+# GuiSession wrapper caching element handles until the screen changes.
+class CachedSession():
+    """
+    findById returns the handle found earlier for the same id instead of walking the
+    object tree again, as long as the screen it was found on is still displayed.
+
+    Every action (press, sendVKey, select, ...) starts a new epoch. Handles found in the
+    current epoch are reused as they are. A handle from an earlier epoch is only reused
+    if the screen signature (session.Info.Transaction, Info.ScreenNumber and the number
+    of open windows) is the one it was found under. The signature is read lazily, at most
+    once per epoch, and only when such a handle is asked for. Handles found under another
+    signature are then dropped. Property writes (text, key, ...) do not start an epoch.
+    Failed lookups are never cached.
+
+    The persistent handles (main window, command field, status bar) are reused without
+    any check: they belong to the GuiSession, not to a screen, and a CachedSession wraps
+    a single GuiSession, so it is dropped with it when the session is replaced.
+
+    Every other attribute is read from and written to the wrapped GuiSession.
+
+    Attributes:
+        persistent (tuple): Ids whose handles stay valid across screens.
+    """
+
+    def __init__(self, session, persistent=PERSISTENT):
+        object.__setattr__(self, "_session", session)
+        object.__setattr__(self, "persistent", frozenset(persistent))
+        object.__setattr__(self, "_elements", {})
+        object.__setattr__(self, "_epoch", 0)
+        object.__setattr__(self, "_signature", None)
+        object.__setattr__(self, "_stats", {"hits": 0, "misses": 0, "invalidations": 0})
+
+    def _current_signature(self):
+        # Read once per epoch; None while the session is busy (the screen is about to change)
+        if self._signature is None:
+            session = self._session
+            if session.Busy:
+                return None
+            info = session.Info
+            object.__setattr__(self, "_signature", (info.Transaction, info.ScreenNumber, session.Children.Count))
+        return self._signature
+
+    def _invalidate(self, signature):
+        # Drop the handles found on other screens
+        stale = [element_id for element_id, (_, _, found_on) in self._elements.items()
+                 if found_on != signature and element_id not in self.persistent]
+        for element_id in stale:
+            del self._elements[element_id]
+        if stale:
+            self._count("invalidations")
+
+    def _count(self, name):
+        self._stats[name] += 1
+        with _totals_lock:
+            _totals[name] += 1
+
+    def mark_dirty(self):
+        """Starts a new epoch: the screen may change (called before every action)."""
+        object.__setattr__(self, "_epoch", self._epoch + 1)
+        object.__setattr__(self, "_signature", None)
+
+    def findById(self, element_id, raise_error=True):
+        entry = self._elements.get(element_id)
+        if entry is not None:
+            element, epoch, found_on = entry
+            if epoch == self._epoch or element_id in self.persistent:
+                self._count("hits")
+                return element
+
+            signature = self._current_signature()
+            if signature is not None and found_on == signature:
+                self._elements[element_id] = (element, self._epoch, signature)
+                self._count("hits")
+                return element
+            if signature is not None:
+                self._invalidate(signature)
+            else:
+                self._elements.pop(element_id, None)
+
+        self._count("misses")
+        element = self._session.findById(element_id, raise_error)
+        if element is None:
+            return None
+        element = CachedElement(element, self)
+        # Under the signature of this epoch, so the handle can be reused on the same screen later
+        self._elements[element_id] = (element, self._epoch, self._current_signature())
+        return element
+
+    # COM names are case insensitive
+    FindById = findById
+
+    def stats(self):
+        """
+        Returns:
+            dict: Hits, misses, invalidations and hit rate of this session.
+        """
+        return dict(self._stats, hit_rate=hit_rate(self._stats))
+
+    def __getattr__(self, name):
+        attribute = getattr(self._session, name)
+        if name.lower() not in SESSION_ACTIONS:
+            return attribute
+
+        def action(*args):
+            self.mark_dirty()
+            return attribute(*args)
+        return action
+
+    def __setattr__(self, name, value):
+        setattr(self._session, name, value)
+
+
+# Element handle that marks its session's cache dirty when it triggers a roundtrip.
+class CachedElement():
+
+    def __init__(self, element, cache):
+        object.__setattr__(self, "_element", element)
+        object.__setattr__(self, "_cache", cache)
+
+    def __getattr__(self, name):
+        attribute = getattr(self._element, name)
+        if name.lower() not in ACTIONS:
+            return attribute
+
+        def action(*args):
+            self._cache.mark_dirty()
+            return attribute(*args)
+        return action
+
+    def __setattr__(self, name, value):
+        setattr(self._element, name, value)
+
+    def __bool__(self):
+        return bool(self._element)
+
+
+def hit_rate(stats):
+    lookups = stats["hits"] + stats["misses"]
+    return round(stats["hits"] / lookups, 3) if lookups else 0.0
+
+
+def element_cache_stats():
+    """
+    Returns:
+        dict: Hits, misses, invalidations and hit rate over every cached session.
+    """
+    with _totals_lock:
+        totals = dict(_totals)
+    return dict(totals, hit_rate=hit_rate(totals))
+
@@ -0,0 +1,240 @@
+import logging
+import threading
+
+# GuiSessionInfo counters sampled around the steps: (result key, COM property)
+COUNTERS = (
+    ("roundtrips", "RoundTrips"),
+    ("flushes", "Flushes"),
+    ("response_ms", "ResponseTime"),
+    ("interpretation_ms", "InterpretationTime"),
+)
+
+# Keys added to the result of an order
+COUNTER_NAMES = tuple(name for name, _ in COUNTERS)
+
+
+def read_counters(session):
+    """
+    Args:
+        session: A GuiSession.
+
+    Returns:
+        tuple or None: The counters, in COUNTERS order, or None if they cannot be read.
+    """
+    try:
+        info = session.Info
+        return tuple(int(getattr(info, prop)) for _, prop in COUNTERS)
+    except Exception:
+        return None
+
+
+def counter_delta(before, after):
+    """
+    Difference between two samples of the counters of a session.
+
+    The counters grow for the lifetime of the session, but start again from zero when
+    the session is replaced (reconnection, new session, attach to another session). A
+    counter lower than before has been reset in between: its delta is the value counted
+    since the reset.
+
+    Args:
+        before (tuple or None): Earlier sample.
+        after (tuple or None): Later sample.
+
+    Returns:
+        tuple or None: The deltas, or None if a sample is missing.
+    """
+    if before is None or after is None:
+        return None
+    return tuple(now - then if now >= then else now for then, now in zip(before, after))
+
+
+# Shared do-nothing trace and step, returned when the counters are disabled
+class _NullTrace():
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def step(self, name):
+        return self
+
+    def values(self):
+        return {}
+
+
+NULL_TRACE = _NullTrace()
+
+
+# One step of a trace; records the counters spent since the previous sample when it exits.
+class _TraceStep():
+    __slots__ = ("trace", "name")
+
+    def __init__(self, trace, name):
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.trace.mark(self.name)
+        return False
+
+
+# Counters of one order (or batch) on one session, split by step.
+class _Trace():
+    """
+    The samples are chained: the end of a step is the start of the next one, so each
+    step costs one read of the counters.
+    """
+
+    __slots__ = ("counters", "session", "first", "last", "delta")
+
+    def __init__(self, counters, session):
+        self.counters = counters
+        self.session = session
+        self.delta = None
+
+    def __enter__(self):
+        self.first = self.last = read_counters(self.session)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.delta = counter_delta(self.first, read_counters(self.session))
+        return False
+
+    def step(self, name):
+        """Context manager covering one step; its counters are added to the step totals on exit."""
+        return _TraceStep(self, name)
+
+    def mark(self, name):
+        current = read_counters(self.session)
+        self.counters.add(name, counter_delta(self.last, current))
+        self.last = current
+
+    def values(self):
+        """
+        Returns:
+            dict: The counters of the whole trace by result key, or {} if they could not be read.
+        """
+        return dict(zip(COUNTER_NAMES, self.delta)) if self.delta is not None else {}
+
+
+# SAP-side counters (roundtrips, flushes, server response and interpretation time) per step.
+class SapCounters():
+    """
+    GuiSessionInfo tells how much of a step was spent in the network and on the server
+    (ResponseTime) and how much in the SAP GUI itself (InterpretationTime), and how many
+    roundtrips it took. The counters are sampled before and after each step and order;
+    the deltas are summed per step and returned with the result of each order.
+
+    When disabled, trace() returns a shared no-op and the counters are never read.
+
+    Attributes:
+        enabled (bool): Whether the counters are sampled.
+        top (int): Steps listed in each ranking of the summary.
+        steps (dict): Per step name: [samples, roundtrips, flushes, response_ms,
+            interpretation_ms, max response_ms].
+    """
+
+    def __init__(self, enabled=False, top=5):
+        self.enabled = enabled
+        self.top = top
+        self.steps = {}
+        self.lock = threading.Lock()
+
+    def trace(self, session):
+        """
+        Args:
+            session: The GuiSession running the order.
+
+        Returns:
+            Context manager sampling the counters of the order; its step(name) covers one step.
+        """
+        if not self.enabled or session is None:
+            return NULL_TRACE
+        return _Trace(self, session)
+
+    def add(self, name, delta):
+        if delta is None:
+            return
+        with self.lock:
+            totals = self.steps.get(name)
+            if totals is None:
+                totals = self.steps[name] = [0, 0, 0, 0, 0, 0]
+            totals[0] += 1
+            for position, value in enumerate(delta, 1):
+                totals[position] += value
+            totals[5] = max(totals[5], delta[2])
+
+    def summary(self, top=None):
+        """
+        Args:
+            top (int, optional): Steps per ranking. Defaults to self.top.
+
+        Returns:
+            dict: {"by_roundtrips": [...], "by_response": [...]}, each a list of
+                {"step", "count", "roundtrips", "flushes", "response_ms", "interpretation_ms",
+                "mean_response_ms", "max_response_ms"}, the largest first.
+        """
+        with self.lock:
+            steps = {name: list(totals) for name, totals in self.steps.items()}
+
+        rows = []
+        for name, (count, roundtrips, flushes, response, interpretation, slowest) in steps.items():
+            rows.append({"step": name, "count": count, "roundtrips": roundtrips, "flushes": flushes,
+                         "response_ms": response, "interpretation_ms": interpretation,
+                         "mean_response_ms": round(response / count, 1), "max_response_ms": slowest})
+
+        top = self.top if top is None else top
+        return {
+            "by_roundtrips": sorted(rows, key=lambda row: row["roundtrips"], reverse=True)[:top],
+            "by_response": sorted(rows, key=lambda row: row["response_ms"], reverse=True)[:top],
+        }
+
+    def report(self):
+        """
+        Logs the steps with the most roundtrips and the most server response time.
+
+        Returns:
+            dict: The summary.
+        """
+        summary = self.summary()
+        if not self.enabled or not self.steps:
+            return summary
+        for row in summary["by_roundtrips"]:
+            logging.info(f"SAP roundtrips {row['step']}: {row['roundtrips']} in {row['count']} runs "
+                         f"({row['flushes']} flushes)")
+        for row in summary["by_response"]:
+            logging.info(f"SAP response {row['step']}: {row['response_ms']} ms in {row['count']} runs "
+                         f"(mean {row['mean_response_ms']} ms, max {row['max_response_ms']} ms, "
+                         f"interpretation {row['interpretation_ms']} ms)")
+        return summary
+
+
+# Counters shared by the SAP sessions of the run; disabled until configure_counters() enables it
+counters = SapCounters()
+
+
+def configure_counters(settings):
+    """
+    Replace the shared counters with ones built from the 'sap_counters' section of the configuration.
+
+    Args:
+        settings (dict): {"enabled": bool, "top": int}.
+
+    Returns:
+        SapCounters: The new shared counters.
+    """
+    global counters
+    counters = SapCounters(enabled=settings.get('enabled', True), top=settings.get('top', 5))
+    return counters
+
+
+def get_counters():
+    """Return the shared SapCounters."""
+    return counters
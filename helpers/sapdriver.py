@@ -0,0 +1,124 @@
+import subprocess
+import logging
+
+
+# Base class for the objects that give SapGui access to a SAP GUI Scripting engine.
+class SapDriver():
+    """
+    A SapDriver hides how the SAP GUI Scripting object tree is reached, so SapGui
+    can run against the real SAP Logon on Windows or against a simulated tree.
+
+    Subclasses must implement:
+        launch(path): start the SAP Logon executable.
+        get_scripting_engine(): return the GuiApplication object (or None).
+        dispatch(prog_id): return an automation object such as "WScript.Shell".
+        set_clipboard(text): put text on the clipboard (multiple selection uploads).
+
+    Threads other than the one that created the driver must call init_thread()
+    before touching the scripting objects and uninit_thread() when done.
+    """
+
+    name = "base"
+
+    def launch(self, path):
+        raise NotImplementedError
+
+    def get_scripting_engine(self):
+        raise NotImplementedError
+
+    def dispatch(self, prog_id):
+        raise NotImplementedError
+
+    def set_clipboard(self, text):
+        raise NotImplementedError
+
+    def init_thread(self):
+        pass
+
+    def uninit_thread(self):
+        pass
+
+    def is_valid(self, obj):
+        """
+        Checks whether an object returned by the scripting engine is usable.
+
+        Args:
+            obj: Object returned by the scripting engine.
+
+        Returns:
+            bool: True if the object can be used, False otherwise.
+        """
+        return obj is not None
+
+
+# Driver for the real SAP GUI on Windows, through win32com.
+class Win32SapDriver(SapDriver):
+
+    name = "win32"
+
+    def __init__(self):
+        # Imported here so the rest of the package can be loaded off Windows
+        import win32com.client as win32
+        self.win32 = win32
+
+    def launch(self, path):
+        # Open SAPLogon
+        return subprocess.Popen(path)
+
+    def get_scripting_engine(self):
+        # Connect to the SAP GUI Scripting engine
+        sap_gui_auto = self.win32.GetObject("SAPGUI")
+        if not self.is_valid(sap_gui_auto):
+            return None
+
+        # Get the SAP Scripting engine
+        application = sap_gui_auto.GetScriptingEngine
+        if not self.is_valid(application):
+            return None
+
+        return application
+
+    def dispatch(self, prog_id):
+        return self.win32.Dispatch(prog_id)
+
+    def set_clipboard(self, text):
+        import win32clipboard
+        win32clipboard.OpenClipboard()
+        try:
+            win32clipboard.EmptyClipboard()
+            win32clipboard.SetClipboardText(text, win32clipboard.CF_UNICODETEXT)
+        finally:
+            win32clipboard.CloseClipboard()
+
+    def init_thread(self):
+        # Every thread using COM objects needs its own apartment
+        import pythoncom
+        pythoncom.CoInitialize()
+
+    def uninit_thread(self):
+        import pythoncom
+        pythoncom.CoUninitialize()
+
+    def is_valid(self, obj):
+        return isinstance(obj, self.win32.CDispatch)
+
+
+# Build the driver named in the configuration.
+def get_driver(name=None, **kwargs):
+    """
+    Args:
+        name (str, optional): 'win32' (default) or 'simulated'.
+        **kwargs: Options passed to the driver constructor.
+
+    Returns:
+        SapDriver: The driver instance.
+    """
+    if name in (None, "win32"):
+        return Win32SapDriver()
+
+    if name == "simulated":
+        from helpers.sapsim import SimulatedSapDriver
+        return SimulatedSapDriver(**kwargs)
+
+    logging.error(f"Unknown SAP driver: {name}")
+    raise ValueError(f"Unknown SAP driver '{name}'.")
@@ -1,18 +1,73 @@
-import subprocess
-import time
+import json
 import logging
-import win32com.client as win32
+import os
+import re
+import threading
+import time
 from datetime import datetime, timedelta
 from helpers.configuration import *
-import keyboard
+from helpers.sapdriver import get_driver
+from helpers.sapwait import ReadinessWaiter
+from helpers.timing import get_timer
+from helpers.sapcounters import get_counters
+from helpers.sapcache import CachedSession
+from helpers.sapplan import load_plans, PlanError
+from helpers.orders import order_key
 import sys
 
+# The Windows clipboard is shared by every session: one multiple selection upload at a time
+_clipboard_lock = threading.Lock()
+
+# Popups closed with F12 before giving up on resetting a session
+MAX_POPUPS = 5
+
+# Popup asking to confirm that unsaved changes will be lost (title or first text line), and its "Yes" button
+DATA_LOSS_POPUP = ("Sair do processamento", "Exit editing", "serão perdidos", "will be lost")
+CONFIRM_DATA_LOSS = "wnd[1]/usr/btnSPOP-OPTION1"
+
+# Transaction of the logon screen
+LOGON_TRANSACTION = "S000"
+
+# Document number in a status bar text, e.g. "Documento de vendas 5100234350 foi gravado"
+DOCUMENT_PATTERN = r"\b(\d{6,10})\b"
+
+# Duration of the last cold start, to report the time saved by attaching
+STARTUP_STATS_FILE = '.sap_startup.json'
+
+
+# Raised when an order fails; carries the status bar shown when it failed, to classify the failure.
+class SapOperationError(RuntimeError):
+    """
+    Attributes:
+        ordem: The order being processed.
+        message_type (str): Status bar message type (S, I, W, E, A), or "" if there was none.
+        status_text (str): Status bar text.
+        counters (dict): SAP counters of the failed attempt (see SapCounters), or {}.
+        step (int, optional): Number of the plan step (block) that failed.
+        committed (bool): Whether the failure came after the save was sent; the order must not be retried.
+    """
+
+    def __init__(self, message, ordem=None, message_type="", status_text="", counters=None, step=None,
+                 committed=False):
+        super().__init__(f"{message} [{message_type}: {status_text}]" if status_text else message)
+        self.ordem = ordem
+        self.message_type = message_type
+        self.status_text = status_text
+        self.counters = counters or {}
+        self.step = step
+        self.committed = committed
+
 
 # Define the SapGui class
 class SapGui():
 
-    # This code opens a SAP session using the win32 library.
-    def __init__(self, sap_args):
+    # This code opens a SAP session through the configured driver (win32 by default).
+    def __init__(self, sap_args, driver=None, element_cache=None, attach=None):
+
+        # Startup path taken ("attach" or "cold") and its duration, set once logged in
+        self.started = time.perf_counter()
+        self.attached = False
+        self.startup = None
 
         try:
 
@@ -20,6 +75,23 @@ class SapGui():
             config = load_config()
             sap = config['sap_app']
 
+            # Driver giving access to the SAP GUI Scripting engine
+            self.driver = driver or get_driver(sap.get('driver'))
+
+            # Adaptive waits for screens and elements (sap_app.wait)
+            self.waiter = ReadinessWaiter.from_config(sap)
+
+            # Per-order, per-step and per-call spans (timing), no-ops unless enabled
+            self.timer = get_timer()
+
+            # Roundtrips and server response time per step and order (sap_counters)
+            self.counters = get_counters()
+
+            # Reuse element handles until the screen changes (sap_app.element_cache)
+            self.element_cache = sap.get('element_cache', True) if element_cache is None else element_cache
+            self.SapGuiAuto = None
+            self.connection = None
+
             # Initialize instance variables for SAP configurations
             self.system = sap_args["platform"]
             self.client = sap['client']
@@ -30,38 +102,58 @@ class SapGui():
             # Path to SAPLogon executable
             self.path = sap['path']
 
-            # Open SAPLogon
-            subprocess.Popen(self.path)
-            time.sleep(2)  # Give it some time to open
+            # Collective billing settings (transaction, element ids and log columns)
+            self.collective = config.get('collective_billing', {})
 
-            # Connect to the SAP GUI Scripting engine
-            self.SapGuiAuto = win32.GetObject("SAPGUI")
-            if not isinstance(self.SapGuiAuto, win32.CDispatch):
-                return None
+            # Pre-flight status extract settings (transaction, table and element ids)
+            self.preflight = config.get('preflight', {})
 
-            # Get the SAP Scripting engine
-            application = self.SapGuiAuto.GetScriptingEngine
-            if not isinstance(application, win32.CDispatch):
-                self.SapGuiAuto = None
+            # Step plans (plans.json), compiled once and shared by every session
+            self.plans = load_plans(sap.get('plans_path'))
+            self.operation_plan = sap.get('operation_plan', 'va02_output')
+
+            # Document number in the status bar shown after saving (sap_app.document_pattern)
+            self.document_pattern = re.compile(sap.get('document_pattern', DOCUMENT_PATTERN))
+
+            # "Data will be lost" popup answered when a session is reset (sap_app.reset)
+            reset = sap.get('reset', {})
+            self.data_loss_popup = [text.lower() for text in reset.get('data_loss', DATA_LOSS_POPUP)]
+            self.confirm_data_loss = reset.get('confirm_exit', CONFIRM_DATA_LOSS)
+
+            # Fast start: reuse a logged in, idle session left by a previous job (sap_app.attach)
+            attach_settings = sap.get('attach', {})
+            if isinstance(attach, dict):
+                attach_settings = dict(attach_settings, **attach)
+            elif attach is not None:
+                attach_settings = dict(attach_settings, enabled=attach)
+            self.startup_stats_path = attach_settings.get('stats_path', STARTUP_STATS_FILE)
+            if attach_settings.get('enabled', True) and self._attach():
+                return
+
+            # Open SAPLogon
+            self.driver.launch(self.path)
+
+            # Connect to the SAP GUI Scripting engine as soon as SAPLogon registers it
+            application = self.waiter.wait_until(self.driver.get_scripting_engine, label="scripting engine")
+            if not self.driver.is_valid(application):
                 return None
+            self.SapGuiAuto = application
 
             # Open a connection to the SAP system
             self.connection = application.OpenConnection(self.system, True)
-            if not isinstance(self.connection, win32.CDispatch):
+            if not self.driver.is_valid(self.connection):
                 application = None
                 self.SapGuiAuto = None
                 return None
 
-            # Wait for the connection to be established
-            time.sleep(3)
-
-            # Get the first available session
-            self.session = self.connection.Children(0)
-            if not isinstance(self.session, win32.CDispatch):
+            # Wait for the connection to be established and get the first available session
+            self.session = self.waiter.wait_until(lambda: self.connection.Children(0), label="session")
+            if not self.driver.is_valid(self.session) or not self.waiter.wait_idle(self.session, label="logon screen"):
                 self.connection = None
                 application = None
                 self.SapGuiAuto = None
                 return None
+            self.session = self._bind(self.session)
 
             # Resize the SAP GUI window
             self.session.findById("wnd[0]").resizeWorkingPane(169, 30, False)
@@ -69,12 +161,134 @@ class SapGui():
             # Maximize the main window (window 0) in SAP GUI.
             # self.session.findById("wnd[0]").maximize()
 
+        except PlanError:
+            # An invalid plan must stop the run before any order is processed
+            raise
         except Exception as e:
             logging.error(f"An exception occurred in __init__: {str(e)}")
             return None
 
+    # Build a SapGui bound to an already opened session, sharing the settings of another instance.
+    @classmethod
+    def from_session(cls, parent, session, connection=None):
+        """
+        Args:
+            parent (SapGui): Instance whose settings and connection are reused.
+            session: The GuiSession object to drive.
+            connection (optional): The GuiConnection as seen from the calling thread.
+
+        Returns:
+            SapGui: A new instance driving the given session.
+        """
+        instance = cls.__new__(cls)
+        instance.__dict__.update(parent.__dict__)
+        instance.session = instance._bind(session)
+        instance.attached = False
+        if connection is not None:
+            instance.connection = connection
+        return instance
+
+    # Wrap a GuiSession with the timing spans and the element cache, as configured.
+    def _bind(self, session):
+        session = self.timer.instrument(session)
+        if self.element_cache:
+            session = CachedSession(session)
+        return session
+
+    # Find a session of the configured system, client and user that is logged in and idle, and drive it.
+    def _attach(self):
+        """
+        Returns:
+            bool: True if an existing session is reused; False to take the cold path
+                (SAPLogon not running, or no matching session ready).
+        """
+        try:
+            application = self.driver.get_scripting_engine()
+        except Exception:
+            logging.info("SAP Logon is not running: cold start.")
+            return False
+        if not self.driver.is_valid(application):
+            return False
+
+        try:
+            for connection in application.Children:
+                if connection.Description != self.system:
+                    continue
+                for session in connection.Children:
+                    if not self._reusable(session):
+                        continue
+
+                    self.SapGuiAuto = application
+                    self.connection = connection
+                    self.session = self._bind(session)
+                    self.attached = True
+
+                    # Start from the main menu, whatever the previous job left on screen
+                    self.session.findById("wnd[0]/tbar[0]/okcd").text = "/n"
+                    self.session.findById("wnd[0]").sendVKey(0)
+                    self.waiter.wait_idle(self.session, label="attach")
+                    self._record_startup("attach")
+                    return True
+
+        except Exception as e:
+            logging.warning(f"Could not reuse an existing SAP session: {e}")
+            self.SapGuiAuto = self.connection = None
+            self.attached = False
+            return False
+
+        logging.info(f"No idle SAP session of {self.user}@{self.system}/{self.client} to reuse: cold start.")
+        return False
+
+    def _reusable(self, session):
+        # Logged in (not on the logon screen) with our client and user, idle and without a popup
+        if session.Busy or session.Children.Count > 1:
+            return False
+        info = session.Info
+        return (info.Transaction != LOGON_TRANSACTION
+                and str(info.Client) == str(self.client)
+                and str(info.User).upper() == str(self.user).upper())
+
+    # Log the startup path and its duration; a cold start is persisted to compute the time saved next time.
+    def _record_startup(self, path):
+        seconds = time.perf_counter() - self.started
+        stats = {}
+        try:
+            if os.path.exists(self.startup_stats_path):
+                with open(self.startup_stats_path, encoding="utf-8") as file:
+                    stats = json.load(file)
+        except (OSError, ValueError) as e:
+            logging.warning(f"Could not read {self.startup_stats_path}: {e}")
+
+        cold = stats.get("cold_start_s")
+        self.startup = {"path": path, "seconds": round(seconds, 3),
+                        "saved_s": round(cold - seconds, 3) if path == "attach" and cold is not None else None}
+
+        if path == "cold":
+            try:
+                with open(self.startup_stats_path, "w", encoding="utf-8") as file:
+                    json.dump({"cold_start_s": round(seconds, 3), "updated_at": datetime.now().isoformat()}, file)
+            except OSError as e:
+                logging.warning(f"Could not write {self.startup_stats_path}: {e}")
+            logging.info(f"SAP startup: cold start in {seconds:.2f}s.")
+        elif cold is not None:
+            logging.info(f"SAP startup: attached to {self.session.Id} in {seconds:.2f}s, "
+                         f"{cold - seconds:.2f}s saved over the last cold start ({cold:.2f}s).")
+        else:
+            logging.info(f"SAP startup: attached to {self.session.Id} in {seconds:.2f}s.")
+
     # Method to login to SAP using the SAP GUI Scripting API and the win32 library.
     def sapLogin(self):
+        # An attached session is already logged in: no logon, no multiple logon popup
+        if self.attached:
+            return True
+        with self.timer.span("login"):
+            logged_in = self._login()
+        if logged_in and self.startup is None:
+            self._record_startup("cold")
+        return logged_in
+
+    # Login steps, timed as one span by sapLogin.
+    def _login(self):
         try:
             # Set the SAP login credentials and language in the GUI
             self.session.findById("wnd[0]/usr/txtRSYST-MANDT").text = self.client  # Mandante
@@ -85,8 +299,8 @@ class SapGui():
             # Perform the login
             self.session.findById("wnd[0]").sendVKey(0)
 
-            # Wait for a short time to see if any popup appears
-            time.sleep(2)
+            # Wait for the server to answer before checking for a popup
+            self.waiter.wait_idle(self.session, label="login")
 
             # Check for the specific popup window
             if self.session.ActiveWindow.Name == "wnd[1]":
@@ -98,8 +312,9 @@ class SapGui():
                     self.session.findById("wnd[1]/tbar[0]/btn[0]").press()
 
                     # click enter to close the popup
-                    shell = win32.Dispatch("WScript.Shell")
+                    shell = self.driver.dispatch("WScript.Shell")
                     shell.SendKeys("{ENTER}", 0)
+                    self.waiter.wait_idle(self.session, label="login")
 
             # Check if login is successful by finding a UI element that appears only when logged in
             if self.session.findById("wnd[0]/tbar[0]/btn[15]"):
@@ -177,23 +392,17 @@ class SapGui():
 
 
     # Waits for the SAP GUI element with the specified ID to appear within the given timeout.
-    def wait_for_element(self, element_id, timeout=60):
+    def wait_for_element(self, element_id, timeout=None):
         """
         Args:
             element_id (str): SAP GUI Scripting ID of the element to wait for.
-            timeout (int, optional): The number of seconds to wait for the element. Defaults to 60.
+            timeout (float, optional): The number of seconds to wait for the element.
+                Defaults to the per-element timeout in sap_app.wait.timeouts, or sap_app.wait.timeout.
 
         Returns:
             bool: True if the element appears within the timeout, otherwise False.
         """
-        start_time = time.time()
-        while time.time() - start_time < timeout:
-            try:
-                if self.session.findById(element_id):
-                    return True
-            except Exception:
-                time.sleep(1)  # wait for 1 second before trying again
-        return False
+        return self.waiter.wait_for_element(self.session, element_id, timeout) is not None
 
     def get_sap_element_text(self, element_path):
         """
@@ -213,39 +422,278 @@ class SapGui():
             return None
 
 
+    # Run a step plan of plans.json, binding its parameters from a dict (e.g. a workbook row).
+    def run_plan(self, name, params, trace=None, progress=None):
+        """
+        Args:
+            name (str): Name of the plan.
+            params (dict): Values of the plan parameters.
+            trace (optional): SapCounters trace receiving the counters of each step.
+            progress (dict, optional): Receives the step reached and whether the save was sent.
+
+        Returns:
+            bool: True if every step ran, False if an awaited element did not appear.
+        """
+        return self.plans[name].run(self, params, trace, progress)
+
     # Enter a command in the SAP command field, submit, and perform additional operations.
     def perform_operation(self, command, ordem):
         """
-        Performs the specified command in the SAP GUI.
+        Performs the specified command in the SAP GUI, through the sap_app.operation_plan step plan.
 
         Args:
             command (str): The command to be executed.
+            ordem (int | str): The sales order number to process.
 
         Returns:
-            None
+            dict: The outcome read from the status bar after saving: "status" (True),
+                "message_type", "message" and "document" (the document number in the
+                message, or None), plus the SAP counters of the order ("roundtrips",
+                "flushes", "response_ms", "interpretation_ms") when sap_counters is enabled.
+
+        Raises:
+            SapOperationError: If a step failed or timed out, with the status bar shown at that moment,
+                the failed step and whether the save had been sent (committed).
+                The session may be left on any screen: call reset_session() before the next order.
         """
+        trace = self.counters.trace(self.session)
+        progress = {}
         try:
+            with trace:
+                completed = self.run_plan(self.operation_plan, {"command": command, "ordem": ordem}, trace,
+                                          progress)
+            if completed:
+                message_type, text = self.get_status_bar()
+                return {"status": True, "message_type": message_type, "message": text,
+                        "document": self.parse_document(text), **trace.values()}
+            error = f"Timed out waiting for the screen of order {ordem}."
 
-            # Set the value of the specified field and Submit the command
-            self.session.findById("wnd[0]/tbar[0]/okcd").text = command
-            self.session.findById("wnd[0]").sendVKey(0)
+        except Exception as e:
+            error = str(e)
 
-            # Wait for a specific element from the new page to be present
-            element_to_wait_for = "wnd[0]/tbar[1]/btn[5]"
+        message_type, text = self.get_status_bar()
+        logging.error(f"Error during command execution: {error} [{message_type}: {text}]")
+        raise SapOperationError(error, ordem, message_type, text, trace.values(), progress.get("step"),
+                                progress.get("committed", False))
 
-            # Element found, now perform the operations for the new page
-            if self.wait_for_element(element_to_wait_for):
-                # Set the text
-                self.session.findById("wnd[0]/usr/ctxtVBAK-VBELN").text = "5100234350"
+    # Read the message type and text of the status bar of the main window.
+    def get_status_bar(self):
+        """
+        Returns:
+            tuple: (message type, text); ("", "") if the status bar cannot be read.
+        """
+        try:
+            statusbar = self.session.findById("wnd[0]/sbar")
+            return statusbar.MessageType, statusbar.Text
+        except Exception:
+            return "", ""
+
+    # Extract the document number from a status bar message.
+    def parse_document(self, text):
+        """
+        Args:
+            text (str): Status bar text.
 
-                self.session.findById("wnd[0]/usr/ctxtVBAK-VBELN").text = "5100234350"
-                self.session.findById("wnd[0]/tbar[1]/btn[5]").press()
-                self.session.findById("wnd[1]/tbar[0]/btn[0]").press()
-                self.session.findById("wnd[0]/mbar/menu[3]/menu[13]/menu[0]/menu[0]").select()
-                self.session.findById("wnd[0]/tbar[1]/btn[5]").press()
-                self.session.findById("wnd[0]/usr/cmbNAST-VSZTP").key = "4"
-                self.session.findById("wnd[0]/tbar[0]/btn[3]").press()
-                self.session.findById("wnd[0]/tbar[0]/btn[11]").press()
+        Returns:
+            str or None: The first number matching sap_app.document_pattern.
+        """
+        match = self.document_pattern.search(text or "")
+        if match is None:
+            return None
+        return match.group(1) if match.groups() else match.group(0)
+
+    # Close any popup and return to the initial screen with /n, so the next order starts from a known state.
+    def reset_session(self):
+        """
+        Popups are cancelled (F12), except the one asking to confirm that unsaved changes
+        will be lost, shown by /n on a changed document: cancelling it would keep the
+        session on the document, so the exit is confirmed without saving.
+
+        Returns:
+            bool: True if the session is back on the main window, idle.
+        """
+        session = self.session
+        self._close_popups()
+        session.findById("wnd[0]/tbar[0]/okcd").text = "/n"
+        session.findById("wnd[0]").sendVKey(0)
+        if not self.waiter.wait_idle(session, label="reset idle"):
+            return False
+        self._close_popups()
+        return self.waiter.wait_idle(session, label="reset idle") and session.findById("wnd[1]", False) is None
+
+    def _close_popups(self):
+        session = self.session
+        for _ in range(MAX_POPUPS):
+            popup = session.findById("wnd[1]", False)
+            if popup is None:
+                return
+            line = session.findById("wnd[1]/usr/txtSPOP-TEXTLINE1", False)
+            text = f"{popup.Text} {line.Text if line is not None else ''}".lower()
+            if any(pattern in text for pattern in self.data_loss_popup):
+                # Yes: leave the document without saving
+                logging.warning(f"Discarding unsaved changes to reset the session: {popup.Text}")
+                session.findById(self.confirm_data_loss).press()
+            else:
+                # F12: cancel
+                popup.sendVKey(12)
+            self.waiter.wait_idle(session, label="reset popup")
+
+    # Bill a batch of orders through one collective billing screen (VF04) and read back the log.
+    def perform_collective_billing(self, orders):
+        """
+        Selects all the orders at once in the billing due list, bills them with a single
+        collective run and parses the resulting log into one result per order.
+
+        Args:
+            orders (list): The sales order numbers of the batch.
+
+        Returns:
+            list: One dict per order, in input order, with keys "ordem", "status",
+                "document" (billing document number or None) and "message".
+        """
+        ids = self.collective['ids']
+        columns = self.collective['columns']
+        timer = self.timer
+        trace = self.counters.trace(self.session)
+
+        keys = [order_key(ordem) for ordem in orders]
+        outcomes = {
+            key: {"ordem": ordem, "status": False, "document": None,
+                  "message": "Ordem não consta da lista de faturamento."}
+            for key, ordem in zip(keys, orders)
+        }
+
+        try:
+            with timer.span("vf04.batch", "order", order=keys[0] if keys else None, size=len(keys)), trace:
+
+                # Open the billing due list
+                with timer.span("vf04.open"), trace.step("vf04.open"):
+                    self.session.findById("wnd[0]/tbar[0]/okcd").text = f"/n{self.collective['transaction_code']}"
+                    self.session.findById("wnd[0]").sendVKey(0)
+                    if not self.wait_for_element(ids['multiple_selection']):
+                        raise RuntimeError(f"{self.collective['transaction_code']} selection screen not found.")
+
+                # Enter every order in one go through the multiple selection clipboard upload
+                with timer.span("vf04.select_orders"), trace.step("vf04.select_orders"):
+                    with _clipboard_lock:
+                        self.driver.set_clipboard("\r\n".join(keys))
+                        self.session.findById(ids['multiple_selection']).press()
+                        self.session.findById(ids['upload_clipboard']).press()
+                    self.session.findById(ids['accept_selection']).press()
+                    self.session.findById(ids['execute']).press()
+
+                    # Nothing due for billing: SAP stays on the selection screen
+                    self.waiter.wait_idle(self.session, self.collective.get('timeout'), label="billing due list")
+                    due_list = self.session.findById(ids['grid'], False)
+
+                if due_list is None:
+                    message = self.get_sap_element_text("wnd[0]/sbar")
+                    for outcome in outcomes.values():
+                        outcome["message"] = message or outcome["message"]
+                    return [outcomes[key] for key in keys]
+
+                # Select the whole due list and create the billing documents
+                with timer.span("vf04.bill"), trace.step("vf04.bill"):
+                    due_list.selectAll()
+                    self.session.findById(ids['collective_billing']).press()
+                    self.waiter.wait_idle(self.session, self.collective.get('timeout'), label="collective billing")
+                    log = self.session.findById(ids['grid'], False)
+                    if log is None:
+                        raise RuntimeError(f"Collective billing log not found: {self.get_sap_element_text('wnd[0]/sbar')}")
+
+                # Read the log; the grid only loads the rows around firstVisibleRow
+                with timer.span("vf04.read_log"), trace.step("vf04.read_log"):
+                    visible = max(1, log.VisibleRowCount)
+                    for row in range(log.RowCount):
+                        if row % visible == 0:
+                            log.firstVisibleRow = row
+                        outcome = outcomes.get(order_key(log.GetCellValue(row, columns['order'])))
+                        if outcome is None:
+                            continue
+                        document = log.GetCellValue(row, columns['document']).strip()
+                        outcome["status"] = bool(document) and log.GetCellValue(row, columns['type']) in ("S", "I", "W")
+                        outcome["document"] = document or None
+                        outcome["message"] = log.GetCellValue(row, columns['message'])
 
         except Exception as e:
-            logging.error(f"Error during command execution: {str(e)}")
+            logging.error(f"Error during collective billing: {str(e)}")
+            for outcome in outcomes.values():
+                if not outcome["status"]:
+                    outcome["message"] = str(e)
+
+        return [outcomes[key] for key in keys]
+
+    # Extract the table rows of many orders at once (SE16N) and export them to a local file.
+    def export_table(self, orders, path):
+        """
+        Selects every order through the multiple selection clipboard upload, runs the
+        extract of the preflight.table table and saves the result list as text with tabs.
+
+        Args:
+            orders (list): The sales order numbers.
+            path (str): Absolute path of the file receiving the extract.
+
+        Returns:
+            bool: True if the file was written, False if SAP reported that no row matched
+                the orders (a preflight.no_entries status bar message).
+
+        Raises:
+            RuntimeError: If a screen of the extract did not appear, the extract did not
+                finish within preflight.timeout, or it ended without a result list for
+                another reason.
+        """
+        settings = self.preflight
+        ids = settings['ids']
+        session = self.session
+        keys = [order_key(ordem) for ordem in orders]
+        trace = self.counters.trace(session)
+
+        with self.timer.span("se16n.extract", "order", order=keys[0] if keys else None, size=len(keys)), trace:
+
+            # Open the table selection screen
+            with self.timer.span("se16n.open"), trace.step("se16n.open"):
+                session.findById("wnd[0]/tbar[0]/okcd").text = f"/n{settings.get('transaction_code', 'SE16N')}"
+                session.findById("wnd[0]").sendVKey(0)
+                if not self.wait_for_element(ids['table']):
+                    raise RuntimeError(f"{settings.get('transaction_code', 'SE16N')} selection screen not found.")
+                session.findById(ids['table']).text = settings['table']
+                session.findById("wnd[0]").sendVKey(0)
+                if ids.get('max_lines'):
+                    session.findById(ids['max_lines']).text = ""
+
+            # Enter every order in one go and run the extract
+            with self.timer.span("se16n.select_orders"), trace.step("se16n.select_orders"):
+                with _clipboard_lock:
+                    self.driver.set_clipboard("\r\n".join(keys))
+                    session.findById(ids['multiple_selection']).press()
+                    session.findById(ids['upload_clipboard']).press()
+                session.findById(ids['accept_selection']).press()
+                session.findById(ids['execute']).press()
+                if not self.waiter.wait_idle(session, settings.get('timeout'), label="table extract"):
+                    raise RuntimeError(f"Table extract of {len(keys)} orders did not finish within "
+                                       f"{settings.get('timeout')}s.")
+                grid = session.findById(ids['grid'], False)
+
+            # No result list: only SAP's "no entries" message means the orders do not exist
+            if grid is None:
+                _, text = self.get_status_bar()
+                if not any(pattern.lower() in text.lower() for pattern in settings.get('no_entries', [])):
+                    raise RuntimeError(f"Table extract of {len(keys)} orders returned no result list: "
+                                       f"{text or 'no status bar message'}")
+                logging.info(f"Table extract of {len(keys)} orders returned no rows: {text}")
+                return False
+
+            # List > Export > Local file, as text with tabs
+            with self.timer.span("se16n.export"), trace.step("se16n.export"):
+                grid.pressToolbarContextButton("&MB_EXPORT")
+                grid.selectContextMenuItem("&PC")
+                session.findById(ids['export_format']).select()
+                session.findById(ids['confirm']).press()
+                session.findById(ids['path']).text = os.path.dirname(path)
+                session.findById(ids['filename']).text = os.path.basename(path)
+                session.findById(ids['replace']).press()
+                if not self.waiter.wait_idle(session, settings.get('timeout'), label="extract export"):
+                    raise RuntimeError(f"Export of the table extract did not finish within "
+                                       f"{settings.get('timeout')}s.")
+
+        return True
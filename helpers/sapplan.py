@@ -0,0 +1,245 @@
+import contextlib
+import logging
+import string
+import threading
+
+from helpers.configuration import load_config
+from helpers.sapcounters import NULL_TRACE
+
+# Default file holding the step plans, next to configs.json
+PLANS_FILE = 'plans.json'
+
+# Opcodes of the compiled instructions
+SET, PRESS, SELECT, VKEY, WAIT, WAIT_IDLE, ASSERT_STATUS = range(7)
+
+# Operations accepted in a plan: opcode, required keys, optional keys
+OPERATIONS = {
+    "set": (SET, ("id", "value"), ("property", "optional")),
+    "press": (PRESS, ("id",), ("optional", "commit")),
+    "select": (SELECT, ("id",), ("optional", "commit")),
+    "vkey": (VKEY, ("key",), ("id", "commit")),
+    "wait": (WAIT, ("id",), ("timeout",)),
+    "wait_idle": (WAIT_IDLE, (), ("timeout",)),
+    "assert_status": (ASSERT_STATUS, (), ("types", "not_types", "contains")),
+}
+
+# Keys allowed on every step
+COMMON_KEYS = ("op", "span")
+
+_NO_SPAN = contextlib.nullcontext()
+
+
+# Raised when a plan is invalid; reported at startup, before any order is processed.
+class PlanError(ValueError):
+    pass
+
+
+# Raised when an assert_status step fails while running a plan.
+class PlanAssertionError(RuntimeError):
+    pass
+
+
+# Compiles a value of a step into a function of the plan parameters.
+def _compile_value(value, params, where):
+    """
+    Args:
+        value: Constant, or string with {param} placeholders.
+        params (list): Parameter names declared by the plan.
+        where (str): Location of the value, for error messages.
+
+    Returns:
+        callable: Called with the parameter dict, returns the bound value.
+    """
+    if not isinstance(value, str):
+        return lambda bound: value
+
+    try:
+        fields = [field for _, field, _, _ in string.Formatter().parse(value) if field is not None]
+    except ValueError as e:
+        raise PlanError(f"{where}: invalid template {value!r}: {e}") from None
+
+    for field in fields:
+        if field not in params:
+            raise PlanError(f"{where}: unknown parameter {{{field}}}; declared: {params}")
+
+    if not fields:
+        return lambda bound: value
+    if len(fields) == 1 and value == f"{{{fields[0]}}}":
+        name = fields[0]
+        return lambda bound: str(bound[name])
+    return lambda bound: value.format_map(bound)
+
+
+# A plan compiled into blocks of pre-resolved instructions.
+class StepPlan():
+    """
+    Consecutive steps sharing a "span" form one block, timed as one step span.
+    Consecutive "set" steps are merged into a single instruction, so the fields are
+    written back to back right before the action that sends them in one roundtrip.
+
+    An action marked "commit" (the save) is the point of no return: once it has been
+    sent, the order may already be changed in SAP, so run() records it in its progress
+    and a failure from there on must not be retried.
+
+    Attributes:
+        name (str): Name of the plan in plans.json.
+        params (list): Parameter names; run() binds them from a dict such as a workbook row.
+        order_param (str, optional): Parameter holding the order number, for the per-order span.
+        blocks (list): (span name or None, [instructions]) pairs.
+    """
+
+    def __init__(self, name, definition):
+        self.name = name
+        if not isinstance(definition, dict) or not isinstance(definition.get("steps"), list):
+            raise PlanError(f"Plan {name}: expected an object with a 'steps' list.")
+
+        self.params = list(definition.get("params", []))
+        self.order_param = definition.get("order")
+        if self.order_param is not None and self.order_param not in self.params:
+            raise PlanError(f"Plan {name}: order parameter '{self.order_param}' is not declared in params.")
+
+        self.blocks = []
+        for index, step in enumerate(definition["steps"], 1):
+            span, instruction = self._compile_step(step, f"Plan {name}, step {index}")
+            if not self.blocks or self.blocks[-1][0] != span:
+                self.blocks.append((span, []))
+            instructions = self.blocks[-1][1]
+
+            # Merge consecutive property sets into one instruction
+            if instruction[0] == SET and instructions and instructions[-1][0] == SET:
+                instructions[-1][1].extend(instruction[1])
+            else:
+                instructions.append(instruction)
+
+    def roundtrips(self):
+        """
+        Returns:
+            int: Server roundtrips of one run of the plan (presses, menu selections and
+                virtual keys; property sets and waits stay on the client).
+        """
+        return sum(1 for _, instructions in self.blocks for instruction in instructions
+                   if instruction[0] in (PRESS, SELECT, VKEY))
+
+    def _compile_step(self, step, where):
+        if not isinstance(step, dict) or step.get("op") not in OPERATIONS:
+            raise PlanError(f"{where}: unknown operation {step.get('op') if isinstance(step, dict) else step!r}; "
+                            f"expected one of {sorted(OPERATIONS)}.")
+
+        opcode, required, optional = OPERATIONS[step["op"]]
+        missing = [key for key in required if key not in step]
+        if missing:
+            raise PlanError(f"{where}: '{step['op']}' needs {missing}.")
+        unknown = [key for key in step if key not in required + optional + COMMON_KEYS]
+        if unknown:
+            raise PlanError(f"{where}: unexpected keys {unknown} for '{step['op']}'.")
+
+        span = step.get("span")
+        element_id = step.get("id")
+        if opcode == SET:
+            value = _compile_value(step["value"], self.params, where)
+            # A list of (id, property, value, optional), extended when sets are merged
+            return span, (SET, [(element_id, step.get("property", "text"), value, step.get("optional", False))])
+        if opcode in (PRESS, SELECT):
+            return span, (opcode, element_id, step.get("optional", False), bool(step.get("commit", False)))
+        if opcode == VKEY:
+            return span, (VKEY, element_id or "wnd[0]", int(step["key"]), bool(step.get("commit", False)))
+        if opcode == WAIT:
+            return span, (WAIT, element_id, step.get("timeout"))
+        if opcode == WAIT_IDLE:
+            return span, (WAIT_IDLE, step.get("timeout"))
+
+        contains = step.get("contains")
+        return span, (ASSERT_STATUS, step.get("types"), step.get("not_types"),
+                      _compile_value(contains, self.params, where) if contains is not None else None)
+
+    def run(self, sap_session, bound, trace=None, progress=None):
+        """
+        Runs the plan on a SapGui session.
+
+        Args:
+            sap_session (SapGui): The session to drive.
+            bound (dict): Values of the plan parameters (extra keys are ignored).
+            trace (optional): SapCounters trace of the order; each block is one of its steps,
+                named after its span (or the plan).
+            progress (dict, optional): Receives "step" (number of the block being run, from 1)
+                and "committed" (True once a commit action has been sent).
+
+        Returns:
+            bool: True when every step ran; False when an element awaited by a wait step did not appear.
+
+        Raises:
+            PlanAssertionError: When an assert_status step fails.
+            KeyError: When a parameter of the plan is missing from bound.
+        """
+        session = sap_session.session
+        timer = sap_session.timer
+        waiter = sap_session.waiter
+        trace = trace or NULL_TRACE
+
+        progress = {} if progress is None else progress
+        progress["committed"] = False
+
+        with timer.order(bound[self.order_param]) if self.order_param else _NO_SPAN:
+            for number, (span, instructions) in enumerate(self.blocks, 1):
+                progress["step"] = number
+                with timer.span(span) if span else _NO_SPAN, trace.step(span or self.name):
+                    for instruction in instructions:
+                        opcode = instruction[0]
+                        if opcode == SET:
+                            for element_id, prop, value, optional in instruction[1]:
+                                element = session.findById(element_id, not optional)
+                                if element is not None:
+                                    setattr(element, prop, value(bound))
+                        elif opcode == PRESS or opcode == SELECT:
+                            element = session.findById(instruction[1], not instruction[2])
+                            if element is not None:
+                                # Committed as soon as the action is sent, even if it then fails
+                                progress["committed"] = progress["committed"] or instruction[3]
+                                element.press() if opcode == PRESS else element.select()
+                        elif opcode == VKEY:
+                            element = session.findById(instruction[1])
+                            progress["committed"] = progress["committed"] or instruction[3]
+                            element.sendVKey(instruction[2])
+                        elif opcode == WAIT:
+                            if waiter.wait_for_element(session, instruction[1], instruction[2]) is None:
+                                return False
+                        elif opcode == WAIT_IDLE:
+                            if not waiter.wait_idle(session, instruction[1], label=f"{self.name} idle"):
+                                return False
+                        else:
+                            self._assert_status(session, instruction, bound)
+        return True
+
+    def _assert_status(self, session, instruction, bound):
+        _, types, not_types, contains = instruction
+        statusbar = session.findById("wnd[0]/sbar")
+        message_type, text = statusbar.MessageType, statusbar.Text
+        if (types is not None and message_type not in types) \
+                or (not_types is not None and message_type in not_types) \
+                or (contains is not None and contains(bound) not in text):
+            raise PlanAssertionError(f"{self.name}: status bar {message_type!r} {text!r}")
+
+
+_plans = {}
+_plans_lock = threading.Lock()
+
+
+# Load and compile the plans of a file once; every session shares the compiled plans.
+def load_plans(path=None):
+    """
+    Args:
+        path (str, optional): Plans file. Defaults to 'plans.json'.
+
+    Returns:
+        dict: StepPlan objects by name.
+
+    Raises:
+        PlanError: If a plan is invalid.
+    """
+    path = path or PLANS_FILE
+    with _plans_lock:
+        if path not in _plans:
+            definitions = load_config(path)
+            _plans[path] = {name: StepPlan(name, definition) for name, definition in definitions.items()}
+            logging.info(f"Compiled {len(_plans[path])} step plan(s) from {path}.")
+        return _plans[path]
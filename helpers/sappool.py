@@ -0,0 +1,123 @@
+import time
+import logging
+
+from helpers.configuration import *
+from helpers.sapgui import SapGui
+from helpers.sapasync import AsyncSapSession
+
+# SAP limits the number of sessions per connection (rdisp/max_alt_modes)
+MAX_SAP_SESSIONS = 6
+
+# Pool of SAP GUI sessions on one connection, driven by OrderPipeline.
+class SapSessionPool():
+    """
+    The first session is the one opened by SapGui; the others are created on the same
+    connection with CreateSession, so they share its logon.
+
+    open_async gives each session its own AsyncSapSession thread, which resolves the
+    session through the scripting engine by id (COM objects cannot be shared between
+    apartments); OrderPipeline then feeds the orders to them.
+
+    Attributes:
+        sap_session (SapGui): The logged in primary session.
+        size (int): Number of sessions in the pool, capped at MAX_SAP_SESSIONS.
+        session_ids (list): Ids of the pooled sessions ("/app/con[0]/ses[n]").
+    """
+
+    def __init__(self, sap_session, size=None, create_timeout=30):
+        config = load_config()
+        sap = config['sap_app']
+
+        self.sap_session = sap_session
+        self.driver = sap_session.driver
+        self.size = max(1, min(size or sap.get('max_sessions', 1), MAX_SAP_SESSIONS))
+        self.create_timeout = create_timeout
+        self.session_ids = []
+        self.created_ids = []
+
+    def open(self):
+        """
+        Creates the extra sessions on the connection of the primary session.
+
+        Returns:
+            int: The number of sessions available in the pool.
+        """
+        connection = self.sap_session.connection
+        self.session_ids = [self.sap_session.session.Id]
+
+        while len(self.session_ids) < self.size:
+            known = {session.Id for session in connection.Children}
+            try:
+                connection.CreateSession()
+            except Exception as e:
+                logging.warning(f"Could not create SAP session {len(self.session_ids) + 1}: {e}")
+                break
+
+            # New sessions show up asynchronously in the connection children
+            new_id = None
+            deadline = time.monotonic() + self.create_timeout
+            while new_id is None and time.monotonic() < deadline:
+                new_id = next((session.Id for session in connection.Children if session.Id not in known), None)
+                if new_id is None:
+                    time.sleep(0.1)
+
+            if new_id is None:
+                logging.warning("Timed out waiting for a new SAP session.")
+                break
+
+            self.session_ids.append(new_id)
+            self.created_ids.append(new_id)
+
+        logging.info(f"SAP session pool ready with {len(self.session_ids)} session(s).")
+        return len(self.session_ids)
+
+    def _attach(self, session_id):
+        """Resolve a pooled session from the calling thread and bind a SapGui to it."""
+        application = self.driver.get_scripting_engine()
+        session = application.findById(session_id)
+        connection = application.findById(session_id.rsplit("/", 1)[0])
+        sap_session = SapGui.from_session(self.sap_session, session, connection)
+
+        # Sessions created on a logged in connection skip the logon screen; log in the others
+        if session.Info.Transaction == "S000" and not sap_session.sapLogin():
+            raise RuntimeError(f"Login failed on SAP session {session_id}.")
+
+        return sap_session
+
+    async def open_async(self, primary):
+        """
+        Creates the extra sessions and gives each one its own AsyncSapSession.
+
+        Args:
+            primary (AsyncSapSession): The facade running the primary session (self.sap_session).
+
+        Returns:
+            list: The AsyncSapSession of every pooled session, the primary first.
+        """
+        await primary.run(self.open)
+        sessions = [primary]
+        for session_id in self.session_ids[1:]:
+            try:
+                sessions.append(await AsyncSapSession.open(
+                    self.driver, lambda session_id=session_id: self._attach(session_id), name=f"sap-{session_id}"))
+            except Exception as e:
+                logging.error(f"Could not attach SAP session {session_id}: {e}")
+        return sessions
+
+    async def close_async(self, primary, sessions):
+        """Stops the threads of the extra sessions and closes them from the primary session thread."""
+        for session in sessions:
+            if session is not primary:
+                await session.close()
+        await primary.run(self.close)
+
+    def close(self):
+        """Closes the sessions created by the pool, leaving the primary session open."""
+        connection = self.sap_session.connection
+        for session_id in self.created_ids:
+            try:
+                connection.CloseSession(session_id)
+            except Exception as e:
+                logging.error(f"Error closing SAP session {session_id}: {e}")
+        self.created_ids = []
+        self.session_ids = []
@@ -0,0 +1,951 @@
+import random
+import threading
+import time
+import logging
+from collections import defaultdict
+
+from helpers.sapdriver import SapDriver
+
+
+# Raised by the simulated tree wherever the real COM object would raise pywintypes.com_error.
+class SimComError(Exception):
+    pass
+
+
+# Screens of the simulated system: transaction, program, screen number and the elements they contain.
+SCREENS = {
+    "login": {
+        "transaction": "S000", "program": "SAPMSYST", "screen": 20,
+        "elements": {
+            "wnd[0]/usr/txtRSYST-MANDT": "field",
+            "wnd[0]/usr/txtRSYST-BNAME": "field",
+            "wnd[0]/usr/pwdRSYST-BCODE": "field",
+            "wnd[0]/usr/txtRSYST-LANGU": "field",
+        },
+    },
+    "main": {
+        "transaction": "SESSION_MANAGER", "program": "SAPLSMTR_NAVIGATION", "screen": 100,
+        "elements": {},
+    },
+    "va02_initial": {
+        "transaction": "VA02", "program": "SAPMV45A", "screen": 102,
+        "elements": {
+            "wnd[0]/usr/ctxtVBAK-VBELN": "field",
+            "wnd[0]/tbar[1]/btn[5]": "button",
+        },
+    },
+    "va02_overview": {
+        "transaction": "VA02", "program": "SAPMV45A", "screen": 4001,
+        "elements": {
+            "wnd[0]/mbar/menu[3]/menu[13]/menu[0]/menu[0]": "menu",
+        },
+    },
+    "output_overview": {
+        "transaction": "VA02", "program": "SAPDV70A", "screen": 100,
+        "elements": {
+            "wnd[0]/tbar[1]/btn[5]": "button",
+        },
+    },
+    "output_detail": {
+        "transaction": "VA02", "program": "SAPDV70A", "screen": 101,
+        "elements": {
+            "wnd[0]/usr/cmbNAST-VSZTP": "combo",
+        },
+    },
+    "vf04_selection": {
+        "transaction": "VF04", "program": "SDBILLDL", "screen": 1000,
+        "elements": {
+            "wnd[0]/usr/btn%_S_VBELN_%_APP_%-VALU_PUSH": "button",
+            "wnd[0]/tbar[1]/btn[8]": "button",
+        },
+    },
+    "vf04_list": {
+        "transaction": "VF04", "program": "SDBILLDL", "screen": 500,
+        "elements": {
+            "wnd[0]/usr/cntlGRID1/shellcont/shell": "grid",
+            "wnd[0]/tbar[1]/btn[19]": "button",
+        },
+    },
+    "vf04_log": {
+        "transaction": "VF04", "program": "SDBILLDL", "screen": 600,
+        "elements": {
+            "wnd[0]/usr/cntlGRID1/shellcont/shell": "grid",
+        },
+    },
+    "se16n_selection": {
+        "transaction": "SE16N", "program": "SAPLSE16N", "screen": 100,
+        "elements": {
+            "wnd[0]/usr/ctxtGD-TAB": "field",
+            "wnd[0]/usr/txtGD-MAX_LINES": "field",
+            "wnd[0]/usr/tblSAPLSE16NSELFIELDS_TC/btnPUSH[4,1]": "button",
+            "wnd[0]/tbar[1]/btn[8]": "button",
+        },
+    },
+    "se16n_result": {
+        "transaction": "SE16N", "program": "SAPLSE16N", "screen": 200,
+        "elements": {
+            "wnd[0]/usr/cntlRESULT_LIST/shellcont/shell": "grid",
+        },
+    },
+}
+
+# Rows shown at once by a simulated grid; further rows need scrolling (firstVisibleRow).
+GRID_VISIBLE_ROWS = 30
+
+# Elements present on every main window, whatever the screen.
+COMMON_ELEMENTS = {
+    "wnd[0]": "window",
+    "wnd[0]/tbar[0]/okcd": "field",
+    "wnd[0]/sbar": "statusbar",
+    "wnd[0]/tbar[0]/btn[3]": "button",
+    "wnd[0]/tbar[0]/btn[11]": "button",
+    "wnd[0]/tbar[0]/btn[15]": "button",
+}
+
+# Maximum number of sessions per connection (rdisp/max_alt_modes).
+MAX_SESSIONS = 6
+
+# Screens of a sales document being changed: leaving them with changes asks for confirmation.
+EDIT_SCREENS = ("va02_overview", "output_overview", "output_detail")
+
+# Transactions reachable through the command field.
+TRANSACTIONS = {
+    "VA02": "va02_initial",
+    "VF04": "vf04_selection",
+    "SE16N": "se16n_selection",
+}
+
+
+# Base for every simulated COM object.
+class SimObject():
+    """
+    COM names are case-insensitive (FindById and findById are the same call), so
+    unknown attributes are resolved against the class members and properties ignoring case.
+    """
+
+    def __getattr__(self, name):
+        lowered = name.lower()
+        for attr in dir(type(self)):
+            if attr.lower() == lowered and attr != name:
+                return getattr(self, attr)
+        raise AttributeError(name)
+
+
+# Collection returned by Children: callable by index, iterable and with a Count.
+class SimCollection(SimObject):
+
+    def __init__(self, items):
+        self._items = list(items)
+
+    def __call__(self, index):
+        return self.ElementAt(index)
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __len__(self):
+        return len(self._items)
+
+    def ElementAt(self, index):
+        try:
+            return self._items[index]
+        except IndexError:
+            raise SimComError(f"Index {index} out of bounds.") from None
+
+    @property
+    def Count(self):
+        return len(self._items)
+
+    @property
+    def Length(self):
+        return len(self._items)
+
+
+# A control of the simulated screen; its state lives in the owning session.
+class SimElement(SimObject):
+
+    def __init__(self, session, element_id, kind):
+        object.__setattr__(self, "_session", session)
+        object.__setattr__(self, "_id", element_id)
+        object.__setattr__(self, "_kind", kind)
+
+    def __setattr__(self, name, value):
+        # Property writes (text, key, ...) are client-side: no roundtrip
+        self._session._set_value(self._id, name.lower(), value)
+
+    def __getattr__(self, name):
+        lowered = name.lower()
+        values = self._session._values.get(self._id, {})
+        if lowered in values:
+            return values[lowered]
+        if lowered in ("text", "key"):
+            return ""
+        return super().__getattr__(name)
+
+    @property
+    def Id(self):
+        return f"{self._session.Id}/{self._id}"
+
+    @property
+    def Name(self):
+        return self._id.rsplit("/", 1)[-1]
+
+    @property
+    def Type(self):
+        return {"window": "GuiMainWindow", "popup": "GuiModalWindow", "field": "GuiTextField",
+                "combo": "GuiComboBox", "button": "GuiButton", "menu": "GuiMenu", "grid": "GuiShell",
+                "radio": "GuiRadioButton", "statusbar": "GuiStatusbar"}.get(self._kind, "GuiComponent")
+
+    def press(self):
+        self._session._roundtrip(self._id, "press")
+
+    def select(self):
+        if self._kind == "radio":
+            # Selecting a radio button stays on the client
+            self._session._set_value(self._id, "selected", True)
+            return
+        self._session._roundtrip(self._id, "select")
+
+    def sendVKey(self, key):
+        self._session._roundtrip(self._id, f"vkey{key}")
+
+    def resizeWorkingPane(self, width, height, async_mode):
+        pass
+
+    def maximize(self):
+        pass
+
+
+# Main window and popups: their text is derived from the session state.
+class SimWindow(SimElement):
+
+    @property
+    def Text(self):
+        if self._id == "wnd[1]" and self._session._popup:
+            return self._session._popup["text"]
+        return SCREENS[self._session._screen].get("title", self._session._screen)
+
+    @property
+    def Name(self):
+        return self._id
+
+
+# Status bar of the main window.
+class SimStatusbar(SimElement):
+
+    @property
+    def Text(self):
+        return self._session._status[1]
+
+    @property
+    def MessageType(self):
+        return self._session._status[0]
+
+
+# ALV grid (GuiGridView) showing the rows held by the session.
+class SimGrid(SimElement):
+
+    @property
+    def RowCount(self):
+        return len(self._session._grid)
+
+    @property
+    def VisibleRowCount(self):
+        return GRID_VISIBLE_ROWS
+
+    @property
+    def ColumnOrder(self):
+        rows = self._session._grid
+        return SimCollection(rows[0].keys() if rows else [])
+
+    def GetCellValue(self, row, column):
+        # Like the real ALV, only rows in the loaded window have data
+        first = self._session._values.get(self._id, {}).get("firstvisiblerow", 0)
+        if not first <= row < first + GRID_VISIBLE_ROWS:
+            return ""
+        try:
+            return str(self._session._grid[row][column])
+        except (IndexError, KeyError):
+            raise SimComError(f"Invalid cell ({row}, {column}).") from None
+
+    def selectAll(self):
+        for row in self._session._grid:
+            row["SEL"] = True
+
+    def pressToolbarContextButton(self, button_id):
+        # Opening the context menu stays on the client
+        pass
+
+    def selectContextMenuItem(self, item_id):
+        self._session._roundtrip(self._id, f"menu{item_id}")
+
+
+# GuiSessionInfo of a simulated session.
+class SimSessionInfo(SimObject):
+
+    def __init__(self, session):
+        self._session = session
+
+    @property
+    def SystemName(self):
+        return self._session._connection._system
+
+    @property
+    def Client(self):
+        return self._session._client
+
+    @property
+    def User(self):
+        return self._session._user
+
+    @property
+    def Language(self):
+        return self._session._language
+
+    @property
+    def Transaction(self):
+        return SCREENS[self._session._screen]["transaction"]
+
+    @property
+    def Program(self):
+        return SCREENS[self._session._screen]["program"]
+
+    @property
+    def ScreenNumber(self):
+        return SCREENS[self._session._screen]["screen"]
+
+    @property
+    def SessionNumber(self):
+        return self._session._number
+
+    @property
+    def RoundTrips(self):
+        return self._session._counters["roundtrips"]
+
+    @property
+    def Flushes(self):
+        return self._session._counters["flushes"]
+
+    @property
+    def ResponseTime(self):
+        return int(self._session._counters["response_time"])
+
+    @property
+    def InterpretationTime(self):
+        return int(self._session._counters["interpretation_time"])
+
+
+# A simulated GuiSession: holds the current screen, field values and popup.
+class SimSession(SimObject):
+
+    def __init__(self, connection, number, screen="login"):
+        self._connection = connection
+        self._driver = connection._driver
+        self._number = number
+        self._lock = threading.RLock()
+        self._screen = screen
+        self._values = {}
+        self._popup = None
+        self._status = ("", "")
+        self._busy = False
+        self._ready_at = 0.0
+        self._client = ""
+        self._user = ""
+        self._language = ""
+        self._order = None
+        self._selection = []
+        self._grid = []
+        self._counters = {"roundtrips": 0, "flushes": 0, "response_time": 0.0, "interpretation_time": 0.0}
+        self.Info = SimSessionInfo(self)
+
+    @property
+    def Id(self):
+        return f"{self._connection.Id}/ses[{self._number}]"
+
+    @property
+    def Busy(self):
+        return self._busy or time.perf_counter() < self._ready_at
+
+    @property
+    def ActiveWindow(self):
+        return self.findById("wnd[1]" if self._popup else "wnd[0]")
+
+    @property
+    def Children(self):
+        windows = [self.findById("wnd[0]")]
+        if self._popup:
+            windows.append(self.findById("wnd[1]"))
+        return SimCollection(windows)
+
+    def findById(self, element_id, raise_error=True):
+        # Walking the object tree costs a client-side call
+        self._driver._client_call()
+
+        # Nothing is rendered until the session has finished loading
+        if time.perf_counter() < self._ready_at:
+            if raise_error:
+                raise SimComError("The session is busy.")
+            return None
+
+        kind = self._element_kind(element_id)
+        if kind is None:
+            if raise_error:
+                raise SimComError(f"The control could not be found by id: {element_id}")
+            return None
+
+        if kind in ("window", "popup"):
+            return SimWindow(self, element_id, kind)
+        if kind == "statusbar":
+            return SimStatusbar(self, element_id, kind)
+        if kind == "grid":
+            return SimGrid(self, element_id, kind)
+        return SimElement(self, element_id, kind)
+
+    def _element_kind(self, element_id):
+        if self._popup:
+            if element_id == "wnd[1]":
+                return "popup"
+            if element_id in self._popup["elements"]:
+                return self._popup["elements"][element_id]
+        if element_id in COMMON_ELEMENTS:
+            return COMMON_ELEMENTS[element_id]
+        return SCREENS[self._screen]["elements"].get(element_id)
+
+    def _set_value(self, element_id, name, value):
+        self._values.setdefault(element_id, {})[name] = value
+
+    def _value(self, element_id, name="text"):
+        return str(self._values.get(element_id, {}).get(name, "")).strip()
+
+    def _goto(self, screen):
+        # Leaving a screen discards what was typed on it, except the command field
+        self._screen = screen
+        self._values = {}
+
+    def _roundtrip(self, element_id, action):
+        """Send the pending client state to the simulated server and apply its response."""
+        with self._lock:
+            self._busy = True
+            started = time.perf_counter()
+            responded = None
+            try:
+                self._status = ("", "")
+                self._driver._server_call()
+                responded = time.perf_counter()
+                self._dispatch(element_id, action)
+            finally:
+                # Server call: response time; applying the new screen: interpretation time
+                finished = time.perf_counter()
+                responded = responded or finished
+                self._counters["roundtrips"] += 1
+                self._counters["flushes"] += 1
+                self._counters["response_time"] += (responded - started) * 1000
+                self._counters["interpretation_time"] += (finished - responded) * 1000
+                self._driver._record(f"{action} {element_id}", finished - started)
+                self._busy = False
+
+    def _dispatch(self, element_id, action):
+        # Back (F3 or the back button)
+        if action == "vkey3" or (element_id == "wnd[0]/tbar[0]/btn[3]" and action == "press"):
+            return self._back()
+
+        # Save (Ctrl+S or the save button)
+        if action == "vkey11" or (element_id == "wnd[0]/tbar[0]/btn[11]" and action == "press"):
+            return self._save()
+
+        # Enter on the main window runs the command field first
+        if action == "vkey0" and element_id == "wnd[0]":
+            code = self._value("wnd[0]/tbar[0]/okcd")
+            self._set_value("wnd[0]/tbar[0]/okcd", "text", "")
+            if code:
+                return self._command(code)
+
+        if self._popup:
+            # F12 cancels the popup
+            if element_id == "wnd[1]" and action == "vkey12":
+                self._popup = None
+                return
+            return self._popup_action(element_id, action)
+
+        handler = getattr(self, f"_on_{self._screen}", None)
+        if handler:
+            return handler(element_id, action)
+
+    def _command(self, code):
+        code = code.upper()
+        if code in ("/NEX", "/NEND"):
+            return self._connection._close(self)
+        explicit = code.startswith("/N") or code.startswith("/O")
+        if explicit:
+            code = code[2:]
+        if self._screen in EDIT_SCREENS and self._changed():
+            return self._confirm_data_loss(code)
+        if not code:
+            self._popup = None
+            return self._goto("main")
+        if self._screen == "login":
+            self._status = ("E", "Efetue primeiro o logon")
+            return
+        # Inside a transaction a bare code is a function code of that screen, not a new transaction
+        if not explicit and self._screen != "main":
+            self._status = ("E", f"Função {code} não é possível")
+            return
+        if code not in TRANSACTIONS:
+            self._status = ("E", f"A transação {code} não existe")
+            return
+        self._popup = None
+        self._goto(TRANSACTIONS[code])
+
+    def _changed(self):
+        # Something was typed on the document besides the command field
+        return any(element_id != "wnd[0]/tbar[0]/okcd" for element_id in self._values)
+
+    def _confirm_data_loss(self, code):
+        def leave():
+            self._popup = None
+            self._values = {}
+            self._command(code)
+
+        # Leaving a changed document: Yes leaves it without saving, No and F12 stay on it
+        self._popup = {
+            "text": "Sair do processamento",
+            "elements": {"wnd[1]/usr/btnSPOP-OPTION1": "button", "wnd[1]/usr/btnSPOP-OPTION2": "button"},
+            "actions": {"wnd[1]/usr/btnSPOP-OPTION1": leave, "wnd[1]/usr/btnSPOP-OPTION2": self._close_popup},
+        }
+
+    def _close_popup(self):
+        self._popup = None
+
+    def _back(self):
+        if self._popup:
+            self._popup = None
+            return
+        previous = {"output_detail": "output_overview", "output_overview": "va02_overview",
+                    "va02_overview": "va02_initial", "va02_initial": "main"}
+        if self._screen in previous:
+            screen = self._screen
+            self._screen = previous[screen]
+            if screen not in ("output_detail",):
+                self._values = {}
+
+    def _save(self):
+        if self._screen not in ("output_overview", "output_detail", "va02_overview"):
+            self._status = ("E", "Função não é possível neste ecrã")
+            return
+        order = self._order
+        dispatch_time = self._value("wnd[0]/usr/cmbNAST-VSZTP", "key")
+        self._driver.backend.issue_output(order, dispatch_time)
+        self._goto("va02_initial")
+        self._status = ("S", f"Documento de vendas {order} foi gravado")
+
+    def _popup_action(self, element_id, action):
+        popup = self._popup
+        if action == "press" and element_id in popup.get("actions", {}):
+            return popup["actions"][element_id]()
+        if element_id in ("wnd[1]/tbar[0]/btn[0]", "wnd[1]") and action in ("press", "vkey0"):
+            self._popup = None
+            on_confirm = popup.get("on_confirm")
+            if on_confirm:
+                on_confirm()
+
+    def _on_login(self, element_id, action):
+        if action != "vkey0":
+            return
+        client = self._value("wnd[0]/usr/txtRSYST-MANDT")
+        user = self._value("wnd[0]/usr/txtRSYST-BNAME")
+        password = self._value("wnd[0]/usr/pwdRSYST-BCODE")
+        language = self._value("wnd[0]/usr/txtRSYST-LANGU")
+        if not (client and user and password):
+            self._status = ("E", "Preencha todos os campos obrigatórios")
+            return
+
+        def logged_in():
+            self._client, self._user, self._language = client, user, language or "PT"
+            self._goto("main")
+
+        if self._driver.multi_logon:
+            self._popup = {
+                "text": "Informação sobre logon múltiplo",
+                "elements": {
+                    "wnd[1]/usr/radMULTI_LOGON_OPT1": "radio",
+                    "wnd[1]/usr/radMULTI_LOGON_OPT2": "radio",
+                    "wnd[1]/tbar[0]/btn[0]": "button",
+                },
+                "on_confirm": logged_in,
+            }
+            return
+        logged_in()
+
+    def _on_va02_initial(self, element_id, action):
+        if not (action == "vkey0" or (element_id == "wnd[0]/tbar[1]/btn[5]" and action == "press")):
+            return
+        order = self._value("wnd[0]/usr/ctxtVBAK-VBELN")
+        if not self._driver.backend.order_exists(order):
+            self._status = ("E", f"O documento de vendas {order} não existe")
+            return
+        if self._driver.backend.is_locked(order):
+            self._status = ("E", f"O documento de vendas {order} está a ser processado pelo utilizador OUTRO")
+            return
+        self._order = order
+
+        def show_overview():
+            self._goto("va02_overview")
+
+        # VA02 shows an information popup before the overview
+        self._popup = {
+            "text": "Informação",
+            "elements": {"wnd[1]/tbar[0]/btn[0]": "button"},
+            "on_confirm": show_overview,
+        }
+
+    def _on_va02_overview(self, element_id, action):
+        if element_id == "wnd[0]/mbar/menu[3]/menu[13]/menu[0]/menu[0]" and action == "select":
+            self._goto("output_overview")
+
+    def _on_output_overview(self, element_id, action):
+        if element_id == "wnd[0]/tbar[1]/btn[5]" and action == "press":
+            self._screen = "output_detail"
+
+    def _on_vf04_selection(self, element_id, action):
+        if element_id == "wnd[0]/usr/btn%_S_VBELN_%_APP_%-VALU_PUSH" and action == "press":
+            entered = []
+
+            def upload_clipboard():
+                entered[:] = [line.strip() for line in self._driver.clipboard.splitlines() if line.strip()]
+
+            def accept():
+                self._selection = list(entered)
+                self._popup = None
+
+            # Multiple selection popup: upload from clipboard (btn[24]) and copy (btn[8])
+            self._popup = {
+                "text": "Seleção múltipla para Documento de vendas",
+                "elements": {"wnd[1]/tbar[0]/btn[24]": "button", "wnd[1]/tbar[0]/btn[8]": "button"},
+                "actions": {"wnd[1]/tbar[0]/btn[24]": upload_clipboard, "wnd[1]/tbar[0]/btn[8]": accept},
+            }
+            return
+
+        if action == "vkey8" or (element_id == "wnd[0]/tbar[1]/btn[8]" and action == "press"):
+            due = self._driver.backend.billing_due_list(self._selection)
+            if not due:
+                self._status = ("S", "Não foram selecionados documentos para faturamento")
+                return
+            self._goto("vf04_list")
+            self._grid = [{"VBELN": order, "FKART": "F2", "FKDAT": "", "SEL": False} for order in due]
+
+    def _on_vf04_list(self, element_id, action):
+        if element_id == "wnd[0]/tbar[1]/btn[19]" and action == "press":
+            selected = [row["VBELN"] for row in self._grid if row["SEL"]]
+            if not selected:
+                self._status = ("E", "Selecione pelo menos uma linha")
+                return
+            log = self._driver.backend.collective_billing(selected)
+            self._goto("vf04_log")
+            self._grid = log
+            created = sum(1 for row in log if row["VBELN_VF"])
+            self._status = ("S", f"{created} documento(s) de faturamento gravado(s)")
+
+
+    def _on_se16n_selection(self, element_id, action):
+        if element_id == "wnd[0]/usr/tblSAPLSE16NSELFIELDS_TC/btnPUSH[4,1]" and action == "press":
+            entered = []
+
+            def upload_clipboard():
+                entered[:] = [line.strip() for line in self._driver.clipboard.splitlines() if line.strip()]
+
+            def accept():
+                self._selection = list(entered)
+                self._popup = None
+
+            # Same multiple selection popup as VF04
+            self._popup = {
+                "text": "Seleção múltipla para Documento de vendas",
+                "elements": {"wnd[1]/tbar[0]/btn[24]": "button", "wnd[1]/tbar[0]/btn[8]": "button"},
+                "actions": {"wnd[1]/tbar[0]/btn[24]": upload_clipboard, "wnd[1]/tbar[0]/btn[8]": accept},
+            }
+            return
+
+        if action == "vkey8" or (element_id == "wnd[0]/tbar[1]/btn[8]" and action == "press"):
+            table = self._value("wnd[0]/usr/ctxtGD-TAB").upper()
+            if table != "VBUK":
+                self._status = ("E", f"A tabela {table} não existe ou não está ativa")
+                return
+            rows = self._driver.backend.order_status(self._selection)
+            if not rows:
+                self._status = ("S", "Nenhuma entrada encontrada para os critérios de seleção")
+                return
+            self._goto("se16n_result")
+            self._grid = rows
+
+    def _on_se16n_result(self, element_id, action):
+        if element_id != "wnd[0]/usr/cntlRESULT_LIST/shellcont/shell" or action != "menu&PC":
+            return
+        rows = self._grid
+
+        def save():
+            path = self._value("wnd[1]/usr/ctxtDY_PATH")
+            filename = self._value("wnd[1]/usr/ctxtDY_FILENAME")
+            # Tab-delimited text in the code page of the front end, as "Text with Tabs"
+            with open(f"{path}/{filename}", "w", encoding="cp1252", newline="") as file:
+                file.write("\r\n")
+                file.write("\t".join(rows[0].keys()) + "\r\n")
+                for row in rows:
+                    file.write("\t".join(str(value) for value in row.values()) + "\r\n")
+            self._popup = None
+            self._status = ("S", f"{len(rows)} linhas transferidas")
+
+        def choose_file():
+            self._popup = {
+                "text": "Exportar lista de objetos para ficheiro local",
+                "elements": {"wnd[1]/usr/ctxtDY_PATH": "field", "wnd[1]/usr/ctxtDY_FILENAME": "field",
+                             "wnd[1]/tbar[0]/btn[11]": "button"},
+                "actions": {"wnd[1]/tbar[0]/btn[11]": save},
+            }
+
+        # Export format popup (unconverted, spreadsheet, rich text, HTML, ...), then the file popup
+        radio = "wnd[1]/usr/subSUBSCREEN_STEPLOOP:SAPLSPO5:0150/sub:SAPLSPO5:0150/radSPOPLI-SELFLAG"
+        self._popup = {
+            "text": "Gravar lista no ficheiro...",
+            "elements": {f"{radio}[0,0]": "radio", f"{radio}[1,0]": "radio", "wnd[1]/tbar[0]/btn[0]": "button"},
+            "on_confirm": choose_file,
+        }
+
+
+# A simulated GuiConnection.
+class SimConnection(SimObject):
+
+    def __init__(self, application, number, system):
+        self._application = application
+        self._driver = application._driver
+        self._number = number
+        self._system = system
+        self._sessions = []
+        self._next_session = 0
+
+    @property
+    def Id(self):
+        return f"/app/con[{self._number}]"
+
+    @property
+    def Description(self):
+        return self._system
+
+    @property
+    def Children(self):
+        return SimCollection(self._sessions)
+
+    def _new_session(self, screen="login"):
+        session = SimSession(self, self._next_session, screen)
+        self._next_session += 1
+        self._sessions.append(session)
+        return session
+
+    def CreateSession(self):
+        self._driver._server_call()
+        if len(self._sessions) >= MAX_SESSIONS:
+            raise SimComError("Maximum number of sessions reached.")
+
+        # New sessions share the logon of the connection and start on the main menu
+        source = next((session for session in self._sessions if session._user), None)
+        session = self._new_session("main" if source else "login")
+        if source:
+            session._client, session._user, session._language = source._client, source._user, source._language
+
+    def CloseSession(self, session_id):
+        for session in list(self._sessions):
+            if session.Id.endswith(session_id):
+                self._close(session)
+
+    def _close(self, session):
+        if session in self._sessions:
+            self._sessions.remove(session)
+
+
+# The simulated GuiApplication returned by GetScriptingEngine.
+class SimApplication(SimObject):
+
+    def __init__(self, driver):
+        self._driver = driver
+        self._connections = []
+
+    @property
+    def Children(self):
+        return SimCollection(self._connections)
+
+    def OpenConnection(self, system, sync=True):
+        self._driver._server_call()
+        connection = SimConnection(self, len(self._connections), system)
+        session = connection._new_session()
+        session._ready_at = time.perf_counter() + self._driver.connect_delay
+        self._connections.append(connection)
+        return connection
+
+    def findById(self, element_id, raise_error=True):
+        # Resolve "/app/con[n]/ses[m]" style ids
+        parts = [part for part in element_id.split("/") if part and part != "app"]
+        node = self
+        try:
+            for part in parts:
+                kind, index = part.rstrip("]").split("[")
+                items = node._connections if kind == "con" else node._sessions
+                node = next(item for item in items if item._number == int(index))
+        except (StopIteration, ValueError, AttributeError):
+            if raise_error:
+                raise SimComError(f"The control could not be found by id: {element_id}") from None
+            return None
+        return node
+
+
+# Automation objects obtained through dispatch (e.g. WScript.Shell).
+class SimShell(SimObject):
+
+    def SendKeys(self, keys, wait=0):
+        pass
+
+
+# Server-side state shared by every simulated session.
+class SimBackend():
+    """
+    Args:
+        orders (iterable, optional): Existing sales orders. If None, every ten-digit
+            number starting with order_prefix exists.
+        order_prefix (str): Prefix of valid sales order numbers.
+        locked (dict, optional): Orders being edited by another user, with the number of
+            times VA02 refuses them before the lock is released.
+    """
+
+    def __init__(self, orders=None, order_prefix="51", billed=None, blocked=None, locked=None):
+        self.lock = threading.Lock()
+        self.orders = {str(order) for order in orders} if orders is not None else None
+        self.order_prefix = order_prefix
+        self.outputs = {}
+        self.billed = {str(order): "" for order in (billed or [])}
+        self.blocked = {str(order) for order in (blocked or [])}
+        self.locked = {str(order): count for order, count in (locked or {}).items()}
+        self.next_document = 90000001
+
+    def is_locked(self, order):
+        """Whether another user holds the order; each refusal counts towards releasing the lock."""
+        with self.lock:
+            remaining = self.locked.get(order, 0)
+            if remaining <= 0:
+                return False
+            self.locked[order] = remaining - 1
+            return True
+
+    def order_exists(self, order):
+        order = str(order)
+        if self.orders is not None:
+            return order in self.orders
+        return order.isdigit() and len(order) == 10 and order.startswith(self.order_prefix)
+
+    def issue_output(self, order, dispatch_time):
+        with self.lock:
+            self.outputs[order] = dispatch_time
+
+    def order_status(self, orders):
+        """
+        Status rows (VBUK) of the existing orders of the selection.
+
+        Returns:
+            list: Rows with VBELN, GBSTK (overall), FKSTK (billing, C when billed) and
+                SPSTG (block, C when blocked).
+        """
+        with self.lock:
+            return [{"VBELN": order, "GBSTK": "C" if order in self.billed else "B",
+                     "FKSTK": "C" if order in self.billed else "A",
+                     "SPSTG": "C" if order in self.blocked else ""}
+                    for order in dict.fromkeys(orders) if self.order_exists(order)]
+
+    def billing_due_list(self, orders):
+        """Orders of the selection that exist and are not billed yet."""
+        return [order for order in orders if self.order_exists(order) and order not in self.billed]
+
+    def collective_billing(self, orders):
+        """
+        Bill the orders, one billing document each.
+
+        Returns:
+            list: Log rows (VBELN, VBELN_VF, MSGTY, MSGTXT).
+        """
+        log = []
+        with self.lock:
+            for order in orders:
+                if order in self.blocked:
+                    log.append({"VBELN": order, "VBELN_VF": "", "MSGTY": "E",
+                                "MSGTXT": f"Documento {order} tem bloqueio de faturamento"})
+                    continue
+                document = str(self.next_document)
+                self.next_document += 1
+                self.billed[order] = document
+                log.append({"VBELN": order, "VBELN_VF": document, "MSGTY": "S",
+                            "MSGTXT": f"Documento de faturamento {document} gravado"})
+        return log
+
+
+# Driver that runs SapGui against the in-process simulated tree.
+class SimulatedSapDriver(SapDriver):
+    """
+    Args:
+        latency (float): Seconds spent on each server roundtrip.
+        jitter (float): Maximum random seconds added to each roundtrip.
+        lookup_latency (float): Seconds spent on each findById (client-side tree walk).
+        failure_rate (float): Probability that a roundtrip raises SimComError.
+        multi_logon (bool): Show the multiple logon popup after login.
+        startup_delay (float): Seconds before the scripting engine is available after launch.
+        connect_delay (float): Seconds before a new connection shows its logon screen.
+        backend (SimBackend, optional): Shared server state.
+        seed (int, optional): Seed for jitter and failure injection.
+    """
+
+    name = "simulated"
+
+    def __init__(self, latency=0.0, jitter=0.0, lookup_latency=0.0, failure_rate=0.0,
+                 multi_logon=False, startup_delay=0.0, connect_delay=0.0, backend=None, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.lookup_latency = lookup_latency
+        self.failure_rate = failure_rate
+        self.multi_logon = multi_logon
+        self.startup_delay = startup_delay
+        self.connect_delay = connect_delay
+        self.engine_ready_at = None
+        self.clipboard = ""
+        self.backend = backend or SimBackend()
+        self.random = random.Random(seed)
+        self.application = None
+        self.stats = defaultdict(list)
+        self.stats_lock = threading.Lock()
+
+    def launch(self, path):
+        logging.info(f"Simulated SAP Logon started (instead of {path}).")
+        if self.application is None:
+            self.application = SimApplication(self)
+            self.engine_ready_at = time.perf_counter() + self.startup_delay
+
+    def get_scripting_engine(self):
+        # Like GetObject("SAPGUI") before SAPLogon has registered the engine
+        if self.application is None or time.perf_counter() < self.engine_ready_at:
+            raise SimComError("Operation unavailable.")
+        return self.application
+
+    def dispatch(self, prog_id):
+        return SimShell()
+
+    def set_clipboard(self, text):
+        self.clipboard = text
+
+    def _client_call(self):
+        if self.lookup_latency:
+            time.sleep(self.lookup_latency)
+
+    def _server_call(self):
+        delay = self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0.0)
+        if delay:
+            time.sleep(delay)
+        if self.failure_rate and self.random.random() < self.failure_rate:
+            raise SimComError("Simulated roundtrip failure.")
+
+    def _record(self, step, elapsed):
+        with self.stats_lock:
+            self.stats[step].append(elapsed)
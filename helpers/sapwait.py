@@ -0,0 +1,138 @@
+import threading
+import time
+import logging
+from collections import defaultdict
+
+
+# Waits for SAP GUI readiness with adaptive polling instead of fixed sleeps.
+class ReadinessWaiter():
+    """
+    Polls a condition starting at initial_delay and doubling the interval up to
+    max_delay, so fast transitions are seen within a few milliseconds while long
+    waits do not flood the scripting engine with calls.
+
+    Every wait is recorded under a label, so the time actually spent waiting can be reported.
+
+    Attributes:
+        initial_delay (float): First polling interval in seconds.
+        max_delay (float): Longest polling interval in seconds.
+        default_timeout (float): Timeout used when none is given for the wait or the element.
+        timeouts (dict): Per-element timeouts in seconds, keyed by element id.
+    """
+
+    def __init__(self, initial_delay=0.005, max_delay=0.08, default_timeout=60, timeouts=None):
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.default_timeout = default_timeout
+        self.timeouts = dict(timeouts or {})
+        self.waits = defaultdict(list)
+        self.timeouts_hit = defaultdict(int)
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, sap):
+        """
+        Args:
+            sap (dict): The 'sap_app' section of the configuration.
+
+        Returns:
+            ReadinessWaiter: A waiter using the 'wait' settings of the section.
+        """
+        wait = sap.get('wait', {})
+        return cls(
+            initial_delay=wait.get('poll_initial', 0.005),
+            max_delay=wait.get('poll_max', 0.08),
+            default_timeout=wait.get('timeout', 60),
+            timeouts=wait.get('timeouts'),
+        )
+
+    def wait_until(self, condition, timeout=None, label="condition"):
+        """
+        Polls a condition until it returns a truthy value or the timeout expires.
+        Exceptions raised by the condition count as "not ready yet".
+
+        Args:
+            condition (callable): Function without arguments.
+            timeout (float, optional): Seconds to wait. Defaults to default_timeout.
+            label (str): Name under which the wait is recorded.
+
+        Returns:
+            The truthy value returned by the condition, or None on timeout.
+        """
+        timeout = self.default_timeout if timeout is None else timeout
+        started = time.perf_counter()
+        deadline = started + timeout
+        delay = self.initial_delay
+
+        while True:
+            try:
+                result = condition()
+                if result:
+                    self._record(label, time.perf_counter() - started)
+                    return result
+            except Exception:
+                pass
+
+            now = time.perf_counter()
+            if now >= deadline:
+                break
+            time.sleep(min(delay, deadline - now))
+            delay = min(delay * 2, self.max_delay)
+
+        self._record(label, time.perf_counter() - started, timed_out=True)
+        logging.warning(f"Timed out after {timeout}s waiting for {label}.")
+        return None
+
+    def wait_idle(self, session, timeout=None, label="idle"):
+        """
+        Waits until the session is no longer busy with a server roundtrip.
+
+        Returns:
+            bool: True if the session became idle within the timeout.
+        """
+        return bool(self.wait_until(lambda: not session.Busy, timeout, label))
+
+    def wait_for_element(self, session, element_id, timeout=None):
+        """
+        Waits until the session is idle and the element exists.
+
+        Args:
+            session: The GuiSession object.
+            element_id (str): SAP GUI Scripting ID of the element to wait for.
+            timeout (float, optional): Seconds to wait. Defaults to the per-element
+                timeout, or default_timeout.
+
+        Returns:
+            The element, or None if it did not appear within the timeout.
+        """
+        if timeout is None:
+            timeout = self.timeouts.get(element_id, self.default_timeout)
+
+        def element_ready():
+            if session.Busy:
+                return None
+            return session.findById(element_id, False)
+
+        return self.wait_until(element_ready, timeout, element_id)
+
+    def _record(self, label, elapsed, timed_out=False):
+        with self.lock:
+            self.waits[label].append(elapsed)
+            if timed_out:
+                self.timeouts_hit[label] += 1
+
+    def summary(self):
+        """
+        Returns:
+            dict: Per label, the number of waits, timeouts, total and longest wait in seconds.
+        """
+        with self.lock:
+            return {
+                label: {
+                    "count": len(times),
+                    "timeouts": self.timeouts_hit.get(label, 0),
+                    "total_s": round(sum(times), 4),
+                    "max_s": round(max(times), 4),
+                }
+                for label, times in self.waits.items()
+            }
@@ -0,0 +1,274 @@
+import json
+import logging
+import threading
+import time
+from array import array
+from collections import defaultdict
+
+# Quantiles reported in the summary and in the Prometheus export
+QUANTILES = (50, 95, 99)
+
+
+def percentile(values, q):
+    """
+    Args:
+        values (list): Sample values.
+        q (float): Percentile between 0 and 100.
+
+    Returns:
+        float: The percentile using the nearest-rank method, or 0.0 if there are no values.
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(q / 100 * len(ordered))) - 1))
+    return ordered[rank]
+
+
+# Shared do-nothing span, returned when timing is disabled
+class _NullSpan():
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+# One timed section; records itself in the timer when it exits.
+class _Span():
+    __slots__ = ("timer", "name", "kind", "attrs", "started", "previous_order")
+
+    def __init__(self, timer, name, kind, attrs):
+        self.timer = timer
+        self.name = name
+        self.kind = kind
+        self.attrs = attrs
+
+    def __enter__(self):
+        if self.kind == "order":
+            local = self.timer.local
+            self.previous_order = getattr(local, "order", None)
+            local.order = self.attrs.get("order")
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self.started
+        self.timer.record(self.name, self.kind, duration, self.started, self.attrs, exc_type is None)
+        if self.kind == "order":
+            self.timer.local.order = self.previous_order
+        return False
+
+
+# Span instrumentation of the SAP GUI steps, exported as JSON Lines and Prometheus text.
+class SpanTimer():
+    """
+    Three kinds of spans are recorded:
+
+    - "order": one per order (or collective billing batch), the end-to-end latency;
+    - "step": the SapGui steps (login, VA02 entry, output menu, save, ...);
+    - "call": every findById/press/sendVKey/select on the session, by element id.
+
+    When disabled, span() returns a shared no-op context manager and instrument()
+    returns the session unchanged, so the SAP calls are not wrapped at all.
+
+    Attributes:
+        enabled (bool): Whether spans are recorded.
+        jsonl_path (str, optional): File receiving one JSON line per span, written as they end.
+        prometheus_path (str, optional): File receiving the summaries when export() is called.
+    """
+
+    def __init__(self, enabled=False, jsonl_path=None, prometheus_path=None):
+        self.enabled = enabled
+        self.jsonl_path = jsonl_path
+        self.prometheus_path = prometheus_path
+        self.durations = defaultdict(lambda: array('d'))
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.jsonl = open(jsonl_path, 'w', encoding='utf-8') if enabled and jsonl_path else None
+
+    def span(self, name, kind="step", **attrs):
+        """
+        Context manager timing a section of code.
+
+        Args:
+            name (str): Step name, e.g. "va02.save", or "press wnd[0]/tbar[0]/btn[11]" for calls.
+            kind (str): "order", "step" or "call".
+            **attrs: Extra fields written to the JSON line (an "order" span needs order=...).
+        """
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, kind, attrs)
+
+    def order(self, ordem):
+        """Span covering one order; the spans opened inside it on the same thread are tagged with it."""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, "order", "order", {"order": str(ordem)})
+
+    def record(self, name, kind, duration, started, attrs, ok=True):
+        with self.lock:
+            self.durations[(kind, name)].append(duration)
+            if self.jsonl is not None:
+                line = {"kind": kind, "name": name, "order": getattr(self.local, "order", None),
+                        "thread": threading.current_thread().name, "start": round(started, 6),
+                        "duration_ms": round(duration * 1000, 3), "ok": ok}
+                if attrs:
+                    line.update(attrs)
+                self.jsonl.write(json.dumps(line, default=str) + "\n")
+
+    def instrument(self, session):
+        """
+        Args:
+            session: A GuiSession.
+
+        Returns:
+            The session wrapped so its calls are timed, or the session itself when disabled.
+        """
+        if not self.enabled or session is None or isinstance(session, InstrumentedSession):
+            return session
+        return InstrumentedSession(session, self)
+
+    def summary(self):
+        """
+        Returns:
+            dict: {kind: {name: {"count", "p50_ms", "p95_ms", "p99_ms", "max_ms"}}}.
+        """
+        with self.lock:
+            durations = {key: list(values) for key, values in self.durations.items()}
+
+        summary = defaultdict(dict)
+        for (kind, name), values in sorted(durations.items()):
+            figures = {"count": len(values)}
+            figures.update({f"p{q}_ms": round(percentile(values, q) * 1000, 3) for q in QUANTILES})
+            figures["max_ms"] = round(max(values) * 1000, 3)
+            summary[kind][name] = figures
+        return dict(summary)
+
+    def prometheus(self):
+        """
+        Returns:
+            str: The spans as a Prometheus summary in the text exposition format.
+        """
+        def escape(value):
+            return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+        with self.lock:
+            durations = {key: list(values) for key, values in self.durations.items()}
+
+        lines = [
+            "# HELP sap_span_seconds Duration of the SAP GUI orders, steps and calls.",
+            "# TYPE sap_span_seconds summary",
+        ]
+        for (kind, name), values in sorted(durations.items()):
+            labels = f'kind="{escape(kind)}",name="{escape(name)}"'
+            for q in QUANTILES:
+                lines.append(f'sap_span_seconds{{{labels},quantile="{q / 100}"}} {percentile(values, q):.6f}')
+            lines.append(f"sap_span_seconds_sum{{{labels}}} {sum(values):.6f}")
+            lines.append(f"sap_span_seconds_count{{{labels}}} {len(values)}")
+        return "\n".join(lines) + "\n"
+
+    def export(self):
+        """Closes the JSON Lines file, writes the Prometheus file and logs the per-order and per-step figures."""
+        if not self.enabled:
+            return
+        with self.lock:
+            if self.jsonl is not None:
+                self.jsonl.close()
+                self.jsonl = None
+        if self.prometheus_path:
+            with open(self.prometheus_path, 'w', encoding='utf-8') as file:
+                file.write(self.prometheus())
+
+        summary = self.summary()
+        for kind in ("order", "step"):
+            for name, figures in summary.get(kind, {}).items():
+                logging.info(f"Timing {kind} {name}: {figures}")
+
+
+# Times the findById calls of a session and hands out timed elements.
+class InstrumentedSession():
+    """
+    Every other attribute is read from and written to the wrapped GuiSession.
+    """
+
+    def __init__(self, session, timer):
+        object.__setattr__(self, "_session", session)
+        object.__setattr__(self, "_timer", timer)
+
+    def findById(self, element_id, *args):
+        with self._timer.span(f"findById {element_id}", "call"):
+            element = self._session.findById(element_id, *args)
+        return InstrumentedElement(element, element_id, self._timer) if element is not None else None
+
+    # COM names are case insensitive
+    FindById = findById
+
+    def __getattr__(self, name):
+        return getattr(self._session, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._session, name, value)
+
+
+# Times the actions that cause a server roundtrip on a GUI element.
+class InstrumentedElement():
+    """
+    Property writes (text, key, ...) only change the screen locally and go straight to the element.
+    """
+
+    TIMED = ("press", "sendvkey", "select", "selectall")
+
+    def __init__(self, element, element_id, timer):
+        object.__setattr__(self, "_element", element)
+        object.__setattr__(self, "_id", element_id)
+        object.__setattr__(self, "_timer", timer)
+
+    def __getattr__(self, name):
+        attribute = getattr(self._element, name)
+        if name.lower() not in self.TIMED:
+            return attribute
+
+        def timed(*args):
+            with self._timer.span(f"{name} {self._id}", "call"):
+                return attribute(*args)
+        return timed
+
+    def __setattr__(self, name, value):
+        setattr(self._element, name, value)
+
+    def __bool__(self):
+        return bool(self._element)
+
+
+# Timer shared by the SAP sessions of the run; disabled until configure_timing() enables it
+timer = SpanTimer()
+
+
+def configure_timing(settings):
+    """
+    Replace the shared timer with one built from the 'timing' section of the configuration.
+
+    Args:
+        settings (dict): {"enabled": bool, "jsonl_path": str, "prometheus_path": str}.
+
+    Returns:
+        SpanTimer: The new shared timer.
+    """
+    global timer
+    timer = SpanTimer(
+        enabled=settings.get('enabled', False),
+        jsonl_path=settings.get('jsonl_path'),
+        prometheus_path=settings.get('prometheus_path'),
+    )
+    return timer
+
+
+def get_timer():
+    """Return the shared SpanTimer."""
+    return timer
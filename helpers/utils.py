@@ -1,5 +1,4 @@
 from datetime import datetime
-import subprocess
 import re
 import os
 
@@ -83,80 +82,69 @@ def is_image_file(filepath):
 
 
 def json_to_html(json_data):
-    """Converts JSON data to an HTML table.
+    """Converts JSON data to an HTML report.
+
+    Nested dicts become nested tables and lists of dicts become tables with one row per
+    item; every value is escaped and huge fields are truncated (see helpers/report.py).
 
     Args:
         json_data: A dictionary containing the JSON data or None.
 
     Returns:
-        str: The HTML representation of the JSON data as a table.
+        str: The HTML representation of the JSON data.
     """
+    from helpers.report import render_html
 
     if json_data is None:
         return "<html><body><h1>Error Report</h1><p>No data available to display.</p></body></html>"
 
-    html = "<html><body><h1>Error Report</h1><table border='1'>"
-    for key, value in json_data.items():
-        html += f"<tr><th>{key}</th><td>{value}</td></tr>"
-    html += "</table></body></html>"
-    return html
+    return render_html(json_data, title="Error Report")
 
 
 async def get_ad_user(identity: str = None, email: str = None):
     """
-    Retrieve and parse Active Directory user information.
-
-    This function executes a PowerShell command to retrieve properties of an Active Directory user
-    specified by their identity. The output is then parsed to extract key-value pairs from the data.
+    Retrieve Active Directory user information.
 
-    The PowerShell output is decoded from bytes to a string using various encodings. The parsed data is returned as a dictionary of properties.
+    The lookup goes through the shared ADResolver (helpers/directory.py): one long-lived
+    PowerShell process answering in JSON, with a TTL cache in front of it. Use
+    get_ad_users to resolve many users in a single request.
 
     Args:
     identity (str): The identity of the Active Directory user.
+    email (str): The email address of the user, when no identity is given.
 
     Returns:
-    dict: A dictionary containing the parsed user properties.
+    dict: The user properties, or an empty dict if no user matches.
 
     Raises:
-    Exception: If the PowerShell command execution fails or returns an error.
+    Exception: If no identity or email is given, or the lookup fails.
     """
-    # Format the PowerShell command with the provided identity
     if identity:
-        command = f"Get-ADUser -Identity {identity} -Properties *"
-    elif email:
-        command = f"Get-ADUser -Filter {{Emailaddress -eq '{email}'}} -Properties *"
-    else:
-        raise Exception("No identity or email provided.")
-
-    # Execute the PowerShell command
-    result = subprocess.run(
-        ["powershell", "-Command", command], capture_output=True)
-
-    if result.returncode != 0:
-        error_message = result.stderr.decode('utf-8', errors='replace')
-        raise Exception(f"Error: {error_message}")
-
-    # List of possible encodings
-    encodings = ['utf-8', 'windows-1252', 'iso-8859-1', 'cp850']
-
-    # Try decoding with different encodings
-    for encoding in encodings:
-        try:
-            output = result.stdout.decode(encoding)
-            break
-        except UnicodeDecodeError:
-            continue
-    else:
-        raise Exception("Failed to decode output with known encodings.")
-
-    # Split the output into lines and parse it into a dictionary
-    lines = output.strip().split('\n')
-    parsed_data = {}
-    for line in lines:
-        parts = line.split(':', 1)
-        if len(parts) == 2:
-            key = parts[0].strip()
-            value = parts[1].strip()
-            parsed_data[key] = value
-
-    return parsed_data
+        users = await get_ad_users(identities=[identity])
+        return users.get(identity) or {}
+    if email:
+        users = await get_ad_users(emails=[email])
+        return users.get(email) or {}
+    raise Exception("No identity or email provided.")
+
+
+async def get_ad_users(identities=(), emails=()):
+    """
+    Retrieve many Active Directory users in one request.
+
+    Args:
+    identities (iterable): Identities of the users.
+    emails (iterable): Email addresses of the users.
+
+    Returns:
+    dict: The user properties per given identity or email (None when not found).
+
+    Raises:
+    Exception: If the lookup fails.
+    """
+    from helpers.directory import get_resolver
+
+    try:
+        return await get_resolver().resolve(identities=identities, emails=emails)
+    except RuntimeError as e:
+        raise Exception(f"Error: {e}") from e
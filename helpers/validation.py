@@ -0,0 +1,157 @@
+import logging
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+# Rejection reasons, in the order they are checked
+MISSING = "missing"
+NOT_NUMERIC = "not_numeric"
+NOT_INTEGER = "not_integer"
+OUT_OF_RANGE = "out_of_range"
+BAD_PREFIX = "bad_prefix"
+DUPLICATE = "duplicate"
+
+# Reason of each row as a small integer code; 0 means accepted
+REASONS = ("", MISSING, NOT_NUMERIC, NOT_INTEGER, OUT_OF_RANGE, BAD_PREFIX, DUPLICATE)
+
+
+# Vectorized pre-flight validation of order numbers, batch by batch.
+class OrderValidator():
+    """
+    Coerces the order column to integers and rejects missing, non-numeric, non-integer,
+    out-of-range, wrongly prefixed and duplicate values, with whole-array operations
+    instead of a Python check per row.
+
+    Duplicates are detected across batches: only the first occurrence is accepted.
+
+    Attributes:
+        digits (int): Number of digits of an order number (None to skip the check).
+        prefixes (list): Accepted leading digits, e.g. ["51", "71"] (empty to skip the check).
+        min_value (int), max_value (int): Accepted range (None for no bound).
+        counts (Counter): Accepted rows and rejected rows per reason so far.
+    """
+
+    def __init__(self, digits=10, prefixes=None, min_value=None, max_value=None, report_path=None):
+        self.digits = digits
+        self.prefixes = [str(prefix) for prefix in (prefixes or [])]
+        self.min_value = min_value
+        self.max_value = max_value
+        if digits:
+            self.min_value = max(min_value or 0, 10 ** (digits - 1))
+            self.max_value = min(max_value or 10 ** digits - 1, 10 ** digits - 1)
+        self.seen = np.empty(0, dtype=np.int64)
+        self.rows = 0
+        self.counts = Counter()
+        self.report_path = report_path
+        self.report_file = None
+
+    @classmethod
+    def from_config(cls, settings):
+        """
+        Args:
+            settings (dict): The 'validation' section of the configuration.
+        """
+        return cls(
+            digits=settings.get('digits', 10),
+            prefixes=settings.get('prefixes'),
+            min_value=settings.get('min'),
+            max_value=settings.get('max'),
+            report_path=settings.get('report_path'),
+        )
+
+    def validate(self, values):
+        """
+        Validates one batch of raw order values.
+
+        Args:
+            values (list or array): Raw values of the order column (int, float, str or None).
+
+        Returns:
+            tuple: (accepted, report) where accepted is the list of clean order numbers (int)
+                and report a DataFrame with one row per input value: row, value, ordem, status, reason.
+        """
+        raw = pd.Series(values, dtype=object) if not isinstance(values, pd.Series) else values.reset_index(drop=True)
+        cells = raw.to_numpy()
+        count = len(cells)
+        codes = np.zeros(count, dtype=np.int8)
+        valid = np.ones(count, dtype=bool)
+
+        def reject(mask, reason):
+            mask = mask & valid
+            codes[mask] = REASONS.index(reason)
+            valid[mask] = False
+
+        # dtype coercion in one cast (None becomes NaN); to_numeric only when some cell is not a number at all
+        try:
+            numeric = cells.astype(float)
+        except (TypeError, ValueError):
+            numeric = pd.to_numeric(raw, errors='coerce').to_numpy(dtype=float)
+
+        # Only the cells that gave no finite number are looked at: empty cells and blank text
+        # are missing, other text is not a number
+        unparsed = np.flatnonzero(~np.isfinite(numeric))
+        unparsed_cells = cells[unparsed]
+        blank = pd.isna(unparsed_cells) | np.array(
+            [isinstance(cell, str) and not cell.strip() for cell in unparsed_cells], dtype=bool)
+        codes[unparsed] = np.where(blank, REASONS.index(MISSING), REASONS.index(NOT_NUMERIC))
+        valid[unparsed] = False
+
+        numeric = np.where(valid, numeric, 0)
+        reject(np.mod(numeric, 1) != 0, NOT_INTEGER)
+
+        # Values beyond int64 are out of any order range anyway
+        reject(np.abs(numeric) >= 2.0 ** 62, OUT_OF_RANGE)
+        integral = valid.copy()
+        orders = np.where(valid, numeric, 0).astype(np.int64)
+
+        if self.min_value is not None:
+            reject(orders < self.min_value, OUT_OF_RANGE)
+        if self.max_value is not None:
+            reject(orders > self.max_value, OUT_OF_RANGE)
+
+        if self.prefixes and self.digits:
+            prefixed = np.zeros(count, dtype=bool)
+            for prefix in self.prefixes:
+                prefixed |= orders // 10 ** (self.digits - len(prefix)) == int(prefix)
+            reject(~prefixed, BAD_PREFIX)
+
+        # Duplicates within the batch, then against the orders accepted by the previous batches,
+        # kept sorted: a lookup is a binary search and adding a batch is a merge
+        reject(pd.Series(np.where(valid, orders, -1)).duplicated().to_numpy(), DUPLICATE)
+        if len(self.seen):
+            found = np.minimum(np.searchsorted(self.seen, orders), len(self.seen) - 1)
+            reject(self.seen[found] == orders, DUPLICATE)
+
+        accepted = orders[valid]
+        self.seen = np.sort(np.concatenate([self.seen, np.sort(accepted)]), kind='stable')
+        accepted = accepted.tolist()
+
+        report = pd.DataFrame({
+            "row": np.arange(self.rows + 1, self.rows + count + 1),
+            "value": raw,
+            "ordem": pd.arrays.IntegerArray(orders, ~integral),
+            "status": pd.Categorical.from_codes(np.where(valid, 0, 1), ["accept", "reject"]),
+            "reason": pd.Categorical.from_codes(codes, REASONS),
+        })
+        self.rows += count
+        for reason, total in zip(REASONS, np.bincount(codes, minlength=len(REASONS)).tolist()):
+            self.counts[reason or "accepted"] += total
+        self._write_report(report)
+        return accepted, report
+
+    def _write_report(self, report):
+        if not self.report_path:
+            return
+        header = self.report_file is None
+        if header:
+            self.report_file = open(self.report_path, 'w', newline='', encoding='utf-8')
+        report.to_csv(self.report_file, header=header, index=False)
+
+    def close(self):
+        """Closes the report file and logs the totals."""
+        if self.report_file is not None:
+            self.report_file.close()
+            self.report_file = None
+        rejected = {reason: count for reason, count in self.counts.items() if reason != "accepted" and count}
+        logging.info(f"Order validation: {self.counts['accepted']} accepted, {sum(rejected.values())} rejected {rejected}.")
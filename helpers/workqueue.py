@@ -0,0 +1,362 @@
+import asyncio
+import logging
+import random
+import time
+from datetime import datetime
+
+from helpers.openflow import fetch_data, save_data, insert_data, delete_data
+from helpers.orders import batched
+from helpers.sapcounters import COUNTER_NAMES
+
+# Shard states
+PENDING = "pending"
+DONE = "done"
+
+# Fields of the per-order results stored in the shard
+RESULT_KEYS = ("ordem", "status", "message_type", "message", "document", "attempts") + COUNTER_NAMES
+
+
+# A shard claimed by this worker.
+class Shard():
+    """
+    Attributes:
+        id (str): _id of the shard document.
+        orders (list): Order numbers of the shard.
+        lease (int): Number of the lease this worker holds.
+        document (dict): The shard document as it was claimed.
+    """
+
+    def __init__(self, document, lease):
+        self.document = document
+        self.id = document["_id"]
+        self.job_id = document["job_id"]
+        self.index = document["index"]
+        self.orders = document["orders"]
+        self.lease = lease
+
+
+# Lease-based work queue of order shards, stored in an OpenIAP collection.
+class ShardQueue():
+    """
+    The coordinator splits the orders into shards and publishes one document per shard
+    ({"_type": "shard", "status": "pending", "orders": [...]}). Workers on other robots
+    claim shards, process them and store their results in the shard document.
+
+    A claim is an insert of a lease document whose _id is "<shard>:lease:<n>": the _id
+    is unique, so exactly one worker wins lease n. The holder renews the lease's
+    expiry while it works. Once it has expired, any worker may take lease n + 1. A
+    stale lease (crashed robot) is thereby reclaimed, and the previous holder finds
+    out on its next renewal and stops. Completing a shard turns its lease into a
+    tombstone that never expires, and every claim re-reads the status of the shard, so
+    a worker working from an outdated list of pending shards cannot take a done one.
+
+    Lease expiry is an absolute time.time() written by the holder and compared by the
+    other workers, so the robots' clocks must be in sync (NTP): a clock that is ahead by
+    more than the lease duration would let a worker take over a live lease. claim() logs
+    a warning when it finds a lease expiring further ahead than one lease duration.
+
+    Attributes:
+        client (openiap.Client): OpenIAP client (or SimOpenIAPClient).
+        collection (str): Collection holding the shards and leases.
+        job_id (str, optional): Job to work on; a worker without one joins the job of the
+            first shard it claims (see run_worker).
+        lease_seconds (float): Lease duration; renewed every third of it.
+        claim_scan (int): Pending shards examined per claim attempt.
+    """
+
+    def __init__(self, client, collection, job_id=None, lease_seconds=300, claim_scan=20):
+        self.client = client
+        self.collection = collection
+        self.job_id = job_id
+        self.lease_seconds = lease_seconds
+        self.claim_scan = claim_scan
+
+    @classmethod
+    def from_config(cls, client, settings, job_id=None):
+        """
+        Args:
+            client (openiap.Client): OpenIAP client.
+            settings (dict): The 'distributed' section of the configuration.
+            job_id (str, optional): Job to publish or work on.
+        """
+        return cls(client, settings['collection'], job_id,
+                   lease_seconds=settings.get('lease_seconds', 300),
+                   claim_scan=settings.get('claim_scan', 20))
+
+    def _job_query(self, **query):
+        if self.job_id is not None:
+            query["job_id"] = self.job_id
+        return query
+
+    async def _fetch_all(self, query, projection=None, page_size=100):
+        # fetch_data returns at most one page: read them all, without the query cache
+        documents = []
+        while True:
+            page = await fetch_data(self.client, self.collection, query, use_cache=False,
+                                    top=page_size, skip=len(documents), orderby={"_id": 1},
+                                    **({"projection": projection} if projection else {}))
+            if not page:
+                return documents
+            documents.extend(page)
+            if len(page) < page_size:
+                return documents
+
+    # Coordinator
+
+    async def publish(self, orders, shard_size=200, write_batch=50):
+        """
+        Splits the orders into shards and stores them as pending.
+
+        Args:
+            orders (iterable): Validated order numbers.
+            shard_size (int): Orders per shard.
+            write_batch (int): Shard documents per save_data call.
+
+        Returns:
+            int: Number of shards published.
+        """
+        if self.job_id is None:
+            self.job_id = datetime.now().strftime("%Y%m%d%H%M%S")
+
+        count = 0
+        shards = ({"_id": f"{self.job_id}:{index:06d}", "_type": "shard", "job_id": self.job_id,
+                   "index": index, "orders": list(chunk), "status": PENDING}
+                  for index, chunk in enumerate(batched(orders, shard_size)))
+        for documents in batched(shards, write_batch):
+            if not await save_data(self.client, self.collection, documents):
+                raise RuntimeError(f"Failed to publish shards of job {self.job_id}.")
+            count += len(documents)
+        logging.info(f"Published {count} shards for job {self.job_id}.")
+        return count
+
+    async def progress(self):
+        """
+        Counts the shards of the job (of every job while job_id is not set).
+
+        Returns:
+            dict: Number of shards per state ("pending", "leased", "done") and in total.
+        """
+        shards = await self._fetch_all(self._job_query(_type="shard"), projection={"status": 1})
+        leases = await self._fetch_all(self._job_query(_type="lease"), projection={"shard_id": 1, "expires": 1})
+        now = time.time()
+        live = {lease["shard_id"] for lease in leases if lease["expires"] > now}
+        counts = {PENDING: 0, "leased": 0, DONE: 0, "total": len(shards)}
+        for shard in shards:
+            if shard["status"] == DONE:
+                counts[DONE] += 1
+            elif shard["_id"] in live:
+                counts["leased"] += 1
+            else:
+                counts[PENDING] += 1
+        return counts
+
+    async def wait(self, poll_interval=10, timeout=None):
+        """
+        Waits until every shard of the job is done.
+
+        Args:
+            poll_interval (float): Seconds between progress checks.
+            timeout (float, optional): Maximum seconds to wait.
+
+        Returns:
+            bool: True if the job finished, False on timeout.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            counts = await self.progress()
+            logging.info(f"Job {self.job_id}: {counts}")
+            if counts["total"] and counts[DONE] == counts["total"]:
+                return True
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(poll_interval)
+
+    async def results(self):
+        """
+        Returns:
+            list: The per-order results reported by the workers, in shard order.
+        """
+        shards = await self._fetch_all(self._job_query(_type="shard", status=DONE))
+        shards.sort(key=lambda shard: (shard["job_id"], shard["index"]))
+        return [result for shard in shards for result in shard.get("results", [])]
+
+    async def cleanup(self):
+        """Deletes the shards and leases of the job."""
+        return await delete_data(self.client, self._job_query(), self.collection)
+
+    # Worker
+
+    async def _latest_leases(self, shard_ids):
+        leases = await self._fetch_all({"_type": "lease", "shard_id": {"$in": shard_ids}})
+        latest = {}
+        for lease in leases:
+            if lease["n"] > latest.get(lease["shard_id"], {"n": -1})["n"]:
+                latest[lease["shard_id"]] = lease
+        return latest
+
+    async def claim(self, worker_id):
+        """
+        Claims one pending shard whose lease is free or expired.
+
+        Args:
+            worker_id (str): Name of this worker (host and process).
+
+        Returns:
+            Shard or None: The claimed shard, or None if every pending shard is leased.
+        """
+        skip = 0
+        while True:
+            candidates = await fetch_data(self.client, self.collection, self._job_query(_type="shard", status=PENDING),
+                                          use_cache=False, top=self.claim_scan, skip=skip, orderby={"index": 1})
+            if not candidates:
+                return None
+
+            shard = await self._claim_any(candidates, worker_id)
+            if shard is not None:
+                return shard
+            if len(candidates) < self.claim_scan:
+                return None
+            skip += len(candidates)
+
+    async def _claim_any(self, candidates, worker_id):
+        latest = await self._latest_leases([shard["_id"] for shard in candidates])
+        now = time.time()
+        for lease in latest.values():
+            if not lease.get("done") and lease["expires"] - now > self.lease_seconds:
+                logging.warning(f"Lease {lease['_id']} of {lease['owner']} expires in {lease['expires'] - now:.0f}s, "
+                                f"more than {self.lease_seconds}s ahead: the robots' clocks are out of sync.")
+
+        # Workers start from different shards to avoid fighting over the same lease
+        random.shuffle(candidates)
+        for shard in candidates:
+            lease = latest.get(shard["_id"])
+            if lease is not None and (lease.get("done") or lease["expires"] > now):
+                continue
+            number = 0 if lease is None else lease["n"] + 1
+            claim = {
+                "_id": f"{shard['_id']}:lease:{number}", "_type": "lease", "job_id": shard["job_id"],
+                "shard_id": shard["_id"], "n": number, "owner": worker_id,
+                "expires": time.time() + self.lease_seconds,
+            }
+            if not await insert_data(self.client, self.collection, claim):
+                continue
+
+            # The candidates may be outdated: the shard may have been completed since they were read
+            current = await fetch_data(self.client, self.collection, {"_id": shard["_id"]}, use_cache=False, top=1)
+            if not current or current[0].get("status") != PENDING:
+                logging.warning(f"Shard {shard['_id']} is no longer pending; releasing lease {number}.")
+                await save_data(self.client, self.collection, [dict(claim, done=True)])
+                continue
+
+            if lease is not None:
+                logging.warning(f"Reclaimed shard {shard['_id']} from {lease['owner']} (lease expired).")
+            return Shard(current[0], number)
+        return None
+
+    async def renew(self, shard, worker_id):
+        """
+        Extends the lease on a shard.
+
+        Returns:
+            bool: False if the lease was lost to another worker (it expired and was reclaimed).
+        """
+        latest = await self._held_lease(shard)
+        if latest is None:
+            return False
+        latest["expires"] = time.time() + self.lease_seconds
+        if not await save_data(self.client, self.collection, [latest]):
+            # The lease is still valid for two thirds of its duration: try again on the next renewal
+            logging.warning(f"Could not renew the lease on shard {shard.id}.")
+        return True
+
+    async def _held_lease(self, shard):
+        latest = (await self._latest_leases([shard.id])).get(shard.id)
+        if latest is None or latest["n"] != shard.lease or latest.get("done"):
+            logging.error(f"Lost the lease on shard {shard.id}.")
+            return None
+        return latest
+
+    async def complete(self, shard, worker_id, results):
+        """
+        Stores the results of a shard, marks it done and turns its lease into a tombstone.
+
+        Args:
+            results (list): One dict per order ({"ordem", "status", ...}).
+
+        Returns:
+            bool: False if the results were not stored, e.g. because the lease was lost
+                to another worker, whose results must not be overwritten.
+        """
+        latest = await self._held_lease(shard)
+        if latest is None:
+            return False
+
+        # The upsert may replace the stored document, so the whole shard is written back
+        document = dict(shard.document, status=DONE, worker=worker_id, lease=shard.lease,
+                        completed_at=datetime.now().isoformat(), results=results)
+        if not await save_data(self.client, self.collection, [document]):
+            return False
+
+        # A done lease never expires: no worker can claim the shard again
+        await save_data(self.client, self.collection, [dict(latest, done=True)])
+        return True
+
+
+# Claim and process shards until the job has none left.
+async def run_worker(queue, worker_id, process, poll_interval=10):
+    """
+    Args:
+        queue (ShardQueue): The work queue.
+        worker_id (str): Name of this worker.
+        process (coroutine function): Awaited with the orders of a shard; returns one
+            result dict per order ({"ordem", "status", ...}).
+        poll_interval (float): Seconds to wait when every remaining shard is leased by others.
+
+    Returns:
+        list: The results of the shards processed by this worker.
+    """
+    processed = []
+    while True:
+        shard = await queue.claim(worker_id)
+        if shard is None:
+            counts = await queue.progress()
+            if counts[PENDING] == 0 and counts["leased"] == 0:
+                logging.info(f"Worker {worker_id}: no shards left ({counts}).")
+                return processed
+            # Others hold the remaining shards; one may expire if its robot died
+            await asyncio.sleep(poll_interval)
+            continue
+
+        logging.info(f"Worker {worker_id} claimed shard {shard.id} ({len(shard.orders)} orders).")
+        if queue.job_id is None:
+            # From now on claims and progress are scoped to this job, not to every job in the collection
+            queue.job_id = shard.job_id
+            logging.info(f"Worker {worker_id} joined job {queue.job_id}.")
+        work = asyncio.create_task(process(shard.orders))
+        lost = asyncio.Event()
+
+        # Another worker took the shard over: stop its orders here, they are being processed there
+        async def keep_lease():
+            while True:
+                await asyncio.sleep(queue.lease_seconds / 3)
+                if not await queue.renew(shard, worker_id):
+                    lost.set()
+                    work.cancel()
+                    return
+
+        renewal = asyncio.create_task(keep_lease())
+        try:
+            results = await work
+        except asyncio.CancelledError:
+            if not lost.is_set():
+                raise
+            logging.error(f"Worker {worker_id} stopped shard {shard.id}: its lease was lost.")
+            continue
+        finally:
+            renewal.cancel()
+
+        results = [{key: result.get(key) for key in RESULT_KEYS if key in result} for result in results]
+        if not await queue.complete(shard, worker_id, results):
+            logging.error(f"Worker {worker_id} could not store the results of shard {shard.id}.")
+            continue
+        processed.extend(results)
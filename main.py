@@ -1,18 +1,149 @@
+import argparse
 import asyncio
 import logging
-import pandas as pd
-from helpers import *
+import os
+import socket
+from helpers import (load_config, connect_to_service, fetch_data, configure_cache, get_query_cache,
+                     configure_timing, get_timer, configure_counters, get_counters, configure_directory,
+                     start_default_sender, stop_default_sender, configure_attachments, NotificationDispatcher,
+                     ExceptionHandler, ErrorSink, ResultsWriter, open_order_source, batched)
 
 # Set logging for debug.
 logging.basicConfig(level=logging.INFO)
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Gerar faturas de vendas no SAP.")
+    parser.add_argument("--source", help="Order source: an .xlsx/.csv file or 'openiap' (default: orders.source).")
+    parser.add_argument("--mode", choices=["single", "collective"],
+                        help="One VA02 per order, or collective billing in batches (default: sap_app.operation_mode).")
+    parser.add_argument("--resume", nargs="?", const=True, metavar="RUN_ID",
+                        help="Resume the given run, or the latest unfinished one, skipping completed orders.")
+    parser.add_argument("--role", choices=["standalone", "coordinator", "worker"], default="standalone",
+                        help="Process the orders here, publish them as shards for the robots (coordinator), "
+                             "or process shards published by a coordinator (worker).")
+    parser.add_argument("--job", help="Job id of the shards to publish or work on (default: a new one / any job).")
+    return parser.parse_args()
+
+
+def flatten_batches(batch_results):
+    """One result per order from the per-batch results of the session pool."""
+    results = []
+    for batch_result in batch_results:
+        outcomes = batch_result['status']
+        if not isinstance(outcomes, list):
+            # The whole batch failed
+            outcomes = [{"ordem": ordem, "status": False, "message": batch_result.get('message')}
+                        for ordem in batch_result['ordem']]
+        results.extend(dict(outcome, session=batch_result['session']) for outcome in outcomes)
+    return results
+
+
+def valid_orders(source, column, validator, batch_size):
+    """Validate the orders of the source a batch at a time; yields the accepted ones."""
+    for batch in batched(source.rows(), batch_size):
+        accepted, _ = validator.validate([row.get(column) for row in batch])
+        yield from accepted
+
+
+async def run_coordinator(client, config, args):
+    """Publish the valid orders as shards for the worker robots and wait for their results."""
+    from helpers import OrderValidator, ShardQueue
+
+    orders_config = config['orders']
+    distributed = config['distributed']
+    validation = orders_config.get('validation', {})
+
+    source = open_order_source(orders_config, client, asyncio.get_running_loop(), args.source)
+    validator = OrderValidator.from_config(validation)
+    try:
+        # The source and the validator block: read on a worker thread
+        orders = await asyncio.to_thread(list, valid_orders(source, orders_config['column'], validator,
+                                                            validation.get('batch_size', 5000)))
+    finally:
+        validator.close()
+
+    queue = ShardQueue.from_config(client, distributed, args.job)
+    await queue.publish(orders, shard_size=distributed.get('shard_size', 200))
+    finished = await queue.wait(distributed.get('poll_interval', 10), distributed.get('timeout'))
+    if not finished:
+        logging.warning(f"Job {queue.job_id} not finished after {distributed.get('timeout')}s: {await queue.progress()}")
+
+    results = await queue.results()
+    processed = sum(1 for result in results if result['status'])
+    logging.info(f"Job {queue.job_id}: processed {processed} of {len(results)} orders.")
+
+    # One results file for the whole job, from the results reported by the workers
+    results_path = None
+    results_writer = ResultsWriter.from_config(config.get('results', {}), queue.job_id)
+    if results_writer is not None:
+        for result in results:
+            results_writer.write(result)
+        results_path = results_writer.close()
+
+    # The results are out of the queue: drop the job's shards and leases. An unfinished
+    # job keeps them, so the workers still running can complete it.
+    if finished and not await queue.cleanup():
+        logging.warning(f"Could not delete the shards of job {queue.job_id} from {queue.collection}.")
+    return results, results_path
+
+
+async def send_final_notification(client, config, results, results_path=None):
+    """Send the end-of-run notification, with the per-order results file attached to the email (results.attach)."""
+    from helpers.report import HtmlReport
+
+    notify = config['notify']
+    processed = sum(1 for result in results if result['status'])
+
+    # The failed orders are listed in the body, up to notify.max_rows
+    report = HtmlReport(max_rows=notify.get('max_rows', 200))
+    report.raw(notify['message_body'])
+    report.paragraph(f"Ordens processadas: {processed} de {len(results)}.")
+    failed = [result for result in results if not result['status']]
+    if failed:
+        report.heading("Ordens com falha", level=2)
+        report.records(failed, columns=["ordem", "message_type", "message", "attempts"])
+    message_body = report.close()
+
+    attachments = None
+    if results_path and config.get('results', {}).get('attach', True) and os.path.exists(results_path):
+        attachments = [results_path]
+
+    # Email, SMS and desktop notifications are sent concurrently (notifications)
+    settings = config.get('notifications', {})
+    dispatcher = NotificationDispatcher.from_config(client, settings, app_name=config['process']['identifier'])
+    try:
+        await dispatcher.notify(notify['subject'], message_body, email_to=notify['recipient_email'],
+                                sms_to=settings.get('sms', {}).get('recipients'),
+                                sms_text=f"{notify['subject']}: {processed} de {len(results)} ordens processadas.",
+                                desktop=settings.get('desktop', False), attachment_paths=attachments)
+    finally:
+        await dispatcher.close()
+
+
 async def main():
+    args = parse_args()
+
     try:
         # Load configuration settings
         config = load_config()
 
-        notify = config['notify']
         database = config['database']
+        orders_config = config['orders']
+
+        # Cache of OpenIAP lookups (platforms, credentials), optionally persisted encrypted
+        configure_cache(config.get('cache', {}))
+
+        # Per-order, per-step and per-call SAP spans, exported at the end of the run
+        configure_timing(config.get('timing', {}))
+
+        # Roundtrips and server response time per SAP step and order, summarized at the end of the run
+        configure_counters(config.get('sap_counters', {}))
+
+        # Active Directory lookups: one PowerShell process for the run, with a TTL cache
+        configure_directory(config.get('active_directory', {}))
+
+        # Email attachments: zipped above a size, split into several messages above another
+        configure_attachments(config.get('email', {}))
 
         # sap configs
         sap_db = database['sap']
@@ -20,12 +151,22 @@ async def main():
         sap_collection = sap_db['collection']
         sap_query = sap_db['query']
         sap_transaction_code = sap_app['transaction_code']
+        mode = args.mode or sap_app.get('operation_mode', 'single')
 
         # Auth into OpenIAP
         client = await connect_to_service()
 
-        # Initialize the ExceptionHandler
-        exception_handler = ExceptionHandler(client, config)
+        # Initialize the ExceptionHandler; errors are stored in batches and emailed as one digest
+        exception_handler = ExceptionHandler(client, config, sink=ErrorSink.from_config(client, config))
+
+        # One pooled SMTP connection for every email of the run
+        await start_default_sender(client)
+
+        # The coordinator only splits the work; the worker robots drive SAP
+        if args.role == 'coordinator':
+            results, results_path = await run_coordinator(client, config, args)
+            await send_final_notification(client, config, results, results_path)
+            return
 
         # Connect to the service and fetch SAP data
         sap_args_data = await fetch_data(client, sap_collection, sap_query)
@@ -39,39 +180,146 @@ async def main():
         # Validate the structure of the SAP data.
         if 'platform' in sap_args and 'username' in sap_args and 'password' in sap_args:
 
-            # Call SapGui class and use its methods.
-            sap_session = SapGui(sap_args)
+            # The SAP stack (win32com) and the validator (pandas) are only loaded by the runs that drive SAP
+            from helpers import (SapGui, get_driver, AsyncSapSession, SapSessionPool, OrderPipeline, RetryPolicy,
+                                 OrderValidator, OrderJournal, ShardQueue, run_worker, element_cache_stats,
+                                 PreflightCheck, PENDING, IN_PROGRESS, DONE, FAILED)
+
+            # Call SapGui class and use its methods, on a dedicated thread off the event loop
+            driver = get_driver(sap_app.get('driver'))
+            primary = await AsyncSapSession.open(driver, lambda: SapGui(sap_args, driver))
+            sap_session = primary.sap_session
             if not sap_session:
                 raise Exception("Failed to create SapGui session.")
 
             # Login to SAP
-            sap_result = sap_session.sapLogin()
+            sap_result = await primary.call('sapLogin')
             if not sap_result:
                 raise Exception("SAP login failed.")
 
-            # Read Excel file
-            excel_file_path = 'resources/VendasSAP.xlsx'
-            df = pd.read_excel(excel_file_path)
+            # Journal of the run, to resume after a crash without redoing completed orders
+            journal = OrderJournal(config['journal']['path'])
+            run_id = None
+            if args.resume:
+                run_id = journal.resume(None if args.resume is True else args.resume)
+            resumed = run_id is not None
+            if run_id is None:
+                label = f"job:{args.job or '*'}" if args.role == 'worker' else args.source or orders_config['source']
+                run_id = journal.start_run(label)
+
+            # Outcome of each order (status bar message, document number), written as the orders complete
+            # A resumed run adds its rows to the results file of the interrupted one
+            results_writer = ResultsWriter.from_config(config.get('results', {}), run_id, append=resumed)
+            results_path = None
+
+            # Validate each batch as a whole before anything reaches SAP (orders.validation)
+            validation = orders_config.get('validation', {})
+            validator = OrderValidator.from_config(validation)
+
+            # Input stage: runs on a worker thread of the pipeline producer
+            def pending_orders(orders):
+                for ordem in orders:
+                    if journal.is_done(ordem):
+                        logging.info(f"Skipping order {ordem}, already done in run {run_id}.")
+                    else:
+                        journal.mark(ordem, PENDING)
+                        yield ordem
+
+            # SAP stage: runs on the thread of each SAP session
+            def process_order(session, ordem):
+                journal.mark(ordem, IN_PROGRESS)
+                return session.perform_operation(sap_transaction_code, ordem)
 
-            # Perform Verifications
-            column_to_verify = 'Ordem'
-            if all(df[column_to_verify] > 0):
-                for index, row in df.iterrows():
-                    # get order number
-                    ordem = row[column_to_verify]
-                    print(f"Processing order: {ordem}")
+            def process_batch(session, batch):
+                for ordem in batch:
+                    journal.mark(ordem, IN_PROGRESS)
+                return session.perform_collective_billing(batch)
 
-                    # Perform operation in SAP
-                    process_status = sap_session.perform_operation(sap_transaction_code, ordem)
-                    input(f"Press Enter to continue...")
+            # Persistence stage: records the outcome while SAP works on the next orders
+            def store_outcomes(result):
+                for outcome in flatten_batches([result]) if mode == 'collective' else [result]:
+                    journal.mark(outcome['ordem'], DONE if outcome['status'] else FAILED, outcome.get('message'))
+                    if results_writer is not None:
+                        results_writer.write(outcome)
 
-            # mail configs
-            subject = notify['subject']
-            recipient_email = notify['recipient_email']
-            message_body = notify['message_body']
+            async def store_result(result):
+                await asyncio.to_thread(store_outcomes, result)
 
-            # Send email
-            # await send_email(client, recipient_email, subject, message_body, html_body=True)
+            # Spread the orders over the sessions of the pool (sap_app.max_sessions)
+            pool = SapSessionPool(sap_session)
+            sessions = await pool.open_async(primary)
+
+            # Failed orders are isolated: the session goes back to a known screen with /n, and
+            # transient failures (locks, timeouts) are retried at the end of the queue (retry)
+            retry = RetryPolicy.from_config(config.get('retry', {}))
+
+            # Status of the orders read in bulk (one SE16N extract per batch): already billed,
+            # blocked or missing orders never reach the per-order transaction (preflight)
+            plan_roundtrips = sap_session.plans[sap_session.operation_plan].roundtrips() if mode == 'single' else None
+            preflight = PreflightCheck.from_config(config.get('preflight', {}), plan_roundtrips)
+
+            async def process_orders(orders):
+                skipped = []
+                orders = pending_orders(orders)
+                if preflight is not None:
+                    loop = asyncio.get_running_loop()
+
+                    # Runs on the producer thread: the extract itself runs on the primary session thread
+                    def read_status(batch):
+                        return asyncio.run_coroutine_threadsafe(
+                            primary.run(preflight.read, sap_session, batch), loop).result()
+
+                    def skip_order(outcome):
+                        journal.mark(outcome['ordem'], DONE if outcome['status'] else FAILED, outcome['message'])
+                        if results_writer is not None:
+                            results_writer.write(outcome)
+                        skipped.append(outcome)
+
+                    orders = preflight.filter(orders, read_status, skip_order)
+
+                if mode == 'collective':
+                    # Many orders per SAP transaction (collective_billing.batch_size)
+                    batch_size = config['collective_billing']['batch_size']
+                    pipeline = OrderPipeline(sessions, process_batch, store_result, on_error=exception_handler.get_exception,
+                                             retry=retry, recover=SapGui.reset_session)
+                    return flatten_batches(await pipeline.run(batched(orders, batch_size))) + skipped
+                pipeline = OrderPipeline(sessions, process_order, store_result, on_error=exception_handler.get_exception,
+                                         retry=retry, recover=SapGui.reset_session)
+                return await pipeline.run(orders) + skipped
+
+            try:
+                if args.role == 'worker':
+                    # Claim shards published by the coordinator until none is left (distributed)
+                    distributed = config['distributed']
+                    queue = ShardQueue.from_config(client, distributed, args.job)
+                    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+                    results = await run_worker(queue, worker_id, process_orders, distributed.get('poll_interval', 10))
+                else:
+                    # Stream the orders in batches: SAP starts on the first order while the rest is still being read
+                    source = open_order_source(orders_config, client, asyncio.get_running_loop(), args.source)
+                    results = await process_orders(valid_orders(source, orders_config['column'], validator,
+                                                                validation.get('batch_size', 5000)))
+            finally:
+                await pool.close_async(primary, sessions)
+                await primary.close()
+                validator.close()
+                if results_writer is not None:
+                    results_path = results_writer.close()
+
+            processed = sum(1 for result in results if result['status'])
+            logging.info(f"Processed {processed} of {len(results)} orders.")
+            journal.finish_run()
+            journal.close()
+            logging.info(f"OpenIAP query cache: {get_query_cache().stats()}")
+            logging.info(f"SAP element cache: {element_cache_stats()}")
+            if preflight is not None:
+                preflight.report()
+            get_timer().export()
+            get_counters().report()
+
+            # Workers report to the coordinator, which sends the notification of the whole job
+            if args.role != 'worker':
+                await send_final_notification(client, config, results, results_path)
 
         else:
             logging.error("Invalid data format for SAP arguments.")
@@ -83,6 +331,13 @@ async def main():
         logging.error(e)
 
     finally:
+        # Store the buffered errors and send the error digest
+        if 'exception_handler' in locals():
+            await exception_handler.close()
+
+        # Send the queued emails and close the SMTP connection
+        await stop_default_sender()
+
         # Close the connection to the OpenIAP service, if it's open
         if 'client' in locals():
             client.Close()
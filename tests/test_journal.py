@@ -0,0 +1,75 @@
+import os
+import tempfile
+import unittest
+
+from helpers.journal import OrderJournal, PENDING, IN_PROGRESS, DONE, FAILED
+
+
+# A run that stopped half way, resumed with --resume by a new process (a new OrderJournal)
+class ResumeTest(unittest.TestCase):
+
+    def setUp(self):
+        # Registered first, so it runs after the journals are closed
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.path = os.path.join(self.directory.name, "journal.db")
+
+        journal = OrderJournal(self.path)
+        self.run_id = journal.start_run("VendasSAP.xlsx")
+        journal.mark(5100000001, DONE)
+        journal.mark(5100000002, FAILED, "Ordem não existe")
+        journal.mark(5100000003, IN_PROGRESS)
+        journal.mark(5100000004, PENDING)
+        journal.close()
+
+    def resume(self, run_id=None):
+        journal = OrderJournal(self.path)
+        self.addCleanup(journal.close)
+        return journal, journal.resume(run_id)
+
+    def test_only_finished_orders_are_skipped(self):
+        journal, run_id = self.resume()
+        self.assertEqual(run_id, self.run_id)
+        self.assertTrue(journal.is_done(5100000001))
+        # Failed, interrupted and never started orders are processed again
+        self.assertFalse(journal.is_done(5100000002))
+        self.assertFalse(journal.is_done(5100000003))
+        self.assertFalse(journal.is_done(5100000004))
+
+    def test_order_numbers_read_as_float_or_text_match(self):
+        journal, _ = self.resume()
+        self.assertTrue(journal.is_done(5100000001.0))
+        self.assertTrue(journal.is_done(" 5100000001 "))
+
+    def test_orders_done_after_resuming_are_skipped_on_the_next_resume(self):
+        journal, _ = self.resume()
+        journal.mark(5100000003, DONE)
+        self.assertEqual(journal.counts(), {DONE: 2, FAILED: 1, PENDING: 1})
+        journal.close()
+
+        journal, _ = self.resume()
+        self.assertTrue(journal.is_done(5100000003))
+
+    def test_finished_run_is_not_resumed(self):
+        journal, _ = self.resume()
+        journal.finish_run()
+        journal.close()
+
+        journal, run_id = self.resume()
+        self.assertIsNone(run_id)
+        self.assertFalse(journal.is_done(5100000001))
+
+        # Unless it is asked for by id
+        journal, run_id = self.resume(self.run_id)
+        self.assertEqual(run_id, self.run_id)
+        self.assertTrue(journal.is_done(5100000001))
+
+    def test_new_run_starts_empty(self):
+        journal = OrderJournal(self.path)
+        self.addCleanup(journal.close)
+        journal.start_run("VendasSAP.xlsx")
+        self.assertFalse(journal.is_done(5100000001))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+import email
+import unittest
+
+from helpers.mime import build_messages, split_addresses
+
+
+# Recipient lists given as "a; b" strings, as in configs.json notify.recipient_email
+class SplitAddressesTest(unittest.TestCase):
+
+    def test_semicolon_and_comma_separated(self):
+        self.assertEqual(split_addresses(" a@example.com;b@example.com , c@example.com; "),
+                         ["a@example.com", "b@example.com", "c@example.com"])
+
+    def test_list_and_empty_values(self):
+        self.assertEqual(split_addresses(["a@example.com; b@example.com", "", "c@example.com"]),
+                         ["a@example.com", "b@example.com", "c@example.com"])
+        self.assertEqual(split_addresses(None), [])
+        self.assertEqual(split_addresses(""), [])
+
+
+class BuildMessagesTest(unittest.TestCase):
+
+    def test_every_recipient_is_a_separate_envelope_address(self):
+        messages, recipients = build_messages("robot@example.com", "a@example.com;b@example.com", "Assunto",
+                                              "<p>Olá</p>", html_body=True, cc=["c@example.com; d@example.com"],
+                                              bcc="e@example.com")
+        try:
+            self.assertEqual(recipients, ["a@example.com", "b@example.com", "c@example.com", "d@example.com",
+                                          "e@example.com"])
+            self.assertEqual(len(messages), 1)
+            messages[0].file.seek(0)
+            headers = email.message_from_binary_file(messages[0].file)
+            self.assertEqual(headers["To"], "a@example.com, b@example.com")
+            self.assertEqual(headers["Cc"], "c@example.com, d@example.com")
+            self.assertIsNone(headers["Bcc"])
+        finally:
+            for message in messages:
+                message.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import logging
+import os
+import tempfile
+import unittest
+
+from helpers.bench_common import SIMULATED_SAP_ARGS
+from helpers.configuration import load_config
+from helpers.preflight import PreflightCheck, parse_extract
+from helpers.sapgui import SapGui
+from helpers.sapsim import SimulatedSapDriver, SimBackend
+
+BILLED = 5100000002
+BLOCKED = 5100000004
+MISSING = 5200000000
+
+
+class ParseExtractTest(unittest.TestCase):
+
+    def test_header_after_title_lines_and_leading_zeros(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "extract.txt")
+            with open(path, "w", encoding="cp1252", newline="") as file:
+                file.write("Tabela: VBUK\r\n\r\n\tVBELN\tFKSTK\tSPSTG\r\n\t0005100000001\tC\t \r\n\t\t\t\r\n")
+            self.assertEqual(parse_extract(path, "VBELN"),
+                             {"5100000001": {"": "", "VBELN": "0005100000001", "FKSTK": "C", "SPSTG": ""}})
+
+            with self.assertRaises(ValueError):
+                parse_extract(path, "AUFNR")
+
+
+# The VBUK extract on SE16N against the simulated SAP GUI, followed by the per-order work
+class PreflightTest(unittest.TestCase):
+
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+        self.addCleanup(logging.disable, logging.NOTSET)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.export_dir = os.path.join(directory.name, "preflight")
+
+        backend = SimBackend(billed=[BILLED], blocked=[BLOCKED])
+        self.sap = SapGui(SIMULATED_SAP_ARGS, driver=SimulatedSapDriver(backend=backend),
+                          attach={"enabled": False, "stats_path": os.path.join(directory.name, "startup.json")})
+        self.assertTrue(self.sap.sapLogin())
+        settings = dict(load_config()['preflight'], batch_size=3, export_dir=self.export_dir)
+        self.preflight = PreflightCheck(settings, roundtrips_per_order=7)
+        self.skipped = []
+
+    def filter(self, orders, read=None):
+        read = read or (lambda batch: self.preflight.read(self.sap, batch))
+        return list(self.preflight.filter(orders, read, self.skipped.append))
+
+    def test_skips_billed_blocked_and_missing_orders(self):
+        orders = [5100000001, BILLED, 5100000003, BLOCKED, MISSING, 5100000005]
+        self.assertEqual(self.filter(orders), [5100000001, 5100000003, 5100000005])
+
+        outcomes = {outcome["ordem"]: (outcome["status"], outcome["message"]) for outcome in self.skipped}
+        self.assertEqual(outcomes, {BILLED: (True, "Pré-verificação: Ordem já faturada"),
+                                    BLOCKED: (False, "Pré-verificação: Ordem bloqueada"),
+                                    MISSING: (False, "Pré-verificação: Ordem não existe")})
+        report = self.preflight.report()
+        self.assertEqual((report["checked"], report["extracts"], report["skipped_total"]), (6, 2, 3))
+        self.assertGreater(report["roundtrips"], 0)
+        self.assertEqual(os.listdir(self.export_dir), [])
+
+    def test_session_is_back_on_the_start_menu(self):
+        self.filter([5100000001, BILLED])
+        # The orders type the bare transaction code, only accepted from the start menu
+        self.assertTrue(self.sap.perform_operation("VA02", 5100000001)["status"])
+
+    def test_batch_without_any_existing_order(self):
+        self.assertEqual(self.filter([MISSING, MISSING + 1]), [])
+        self.assertEqual([outcome["message"] for outcome in self.skipped], ["Pré-verificação: Ordem não existe"] * 2)
+
+    def test_failed_extract_queues_the_batch_unchecked(self):
+        def read(batch):
+            raise RuntimeError("SE16N did not finish")
+
+        orders = [5100000001, BILLED, MISSING]
+        self.assertEqual(self.filter(orders, read), orders)
+        self.assertEqual(self.skipped, [])
+        self.assertEqual(self.preflight.stats["checked"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
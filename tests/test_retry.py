@@ -0,0 +1,152 @@
+import logging
+import threading
+import unittest
+
+from helpers.configuration import load_config
+from helpers.pipeline import OrderPipeline
+from helpers.retry import RetryPolicy, TRANSIENT, PERMANENT
+from helpers.sapasync import AsyncSapSession
+from helpers.sapgui import SapOperationError
+from helpers.sapplan import PlanError
+from helpers.sapsim import SimulatedSapDriver
+
+LOCKED = "O documento de vendas 5100000001 está a ser processado pelo utilizador OUTRO"
+MISSING = "O documento de vendas 5200000000 não existe"
+
+
+def sap_error(status_text, committed=False, ordem=5100000001):
+    return SapOperationError("Step failed", ordem, "E", status_text, committed=committed)
+
+
+class ClassifyTest(unittest.TestCase):
+
+    def setUp(self):
+        self.policy = RetryPolicy()
+
+    def test_status_bar_text(self):
+        self.assertEqual(self.policy.classify(sap_error(LOCKED)), TRANSIENT)
+        self.assertEqual(self.policy.classify(sap_error(MISSING)), PERMANENT)
+        self.assertEqual(self.policy.classify(RuntimeError("The control could not be found by id: wnd[1]")),
+                         TRANSIENT)
+
+    def test_permanent_patterns_are_checked_first(self):
+        self.assertEqual(self.policy.classify(sap_error(f"{MISSING} (bloqueada)")), PERMANENT)
+
+    def test_failure_after_the_save_is_permanent(self):
+        self.assertEqual(self.policy.classify(sap_error(LOCKED, committed=True)), PERMANENT)
+        self.assertEqual(self.policy.should_retry(sap_error("Timeout", committed=True), 1), (PERMANENT, None))
+
+    def test_exception_types(self):
+        self.assertEqual(self.policy.classify(TimeoutError()), TRANSIENT)
+        self.assertEqual(self.policy.classify(ConnectionError("reset")), TRANSIENT)
+        self.assertEqual(self.policy.classify(PlanError("locked")), PERMANENT)
+        self.assertEqual(self.policy.classify(KeyError("ordem")), PERMANENT)
+
+    def test_unknown_failures_follow_the_default(self):
+        self.assertEqual(self.policy.classify(RuntimeError("Erro inesperado")), PERMANENT)
+        self.assertEqual(RetryPolicy(default=TRANSIENT).classify(RuntimeError("Erro inesperado")), TRANSIENT)
+        with self.assertRaises(ValueError):
+            RetryPolicy(default="maybe")
+
+    def test_backoff_grows_up_to_the_limit(self):
+        policy = RetryPolicy(max_retries=4, backoff=1, backoff_factor=2, max_backoff=3)
+        self.assertEqual([policy.should_retry(TimeoutError(), attempt)[1] for attempt in range(1, 6)],
+                         [1, 2, 3, 3, None])
+
+    def test_configured_patterns(self):
+        policy = RetryPolicy.from_config(load_config()['retry'])
+        self.assertEqual(policy.classify(sap_error(LOCKED)), TRANSIENT)
+        self.assertEqual(policy.classify(sap_error(MISSING)), PERMANENT)
+
+
+# Failures of the SAP stage, with the operation failing on demand instead of a SAP session
+class PipelineRetryTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        logging.disable(logging.CRITICAL)
+        self.addCleanup(logging.disable, logging.NOTSET)
+        self.sessions = [AsyncSapSession(SimulatedSapDriver(), f"sap-{index}") for index in range(2)]
+        for session in self.sessions:
+            self.addAsyncCleanup(session.close)
+        self.failures = {}
+        self.calls = []
+        self.errors = []
+        self.recovered = []
+
+    def operation(self, sap_session, ordem):
+        # Runs on the thread of the session, named after it
+        self.calls.append((ordem, threading.current_thread().name.split("_")[0]))
+        failures = self.failures.get(ordem)
+        if failures:
+            error = failures.pop(0)
+            raise error
+        return {"status": True, "message": f"Documento de vendas {ordem} foi gravado"}
+
+    @property
+    def processed(self):
+        return [ordem for ordem, _ in self.calls]
+
+    def recover(self, sap_session):
+        self.recovered.append(sap_session)
+        return True
+
+    async def on_error(self, error):
+        self.errors.append(error)
+
+    def pipeline(self, sessions=None, recover=None, max_retries=2):
+        return OrderPipeline(sessions or self.sessions[:1], self.operation, on_error=self.on_error,
+                             retry=RetryPolicy(max_retries=max_retries, backoff=0), recover=recover or self.recover)
+
+    async def test_transient_failure_goes_to_the_end_of_the_queue(self):
+        self.failures[2] = [sap_error(LOCKED)]
+        pipeline = self.pipeline()
+        results = await pipeline.run([1, 2, 3])
+
+        self.assertEqual(self.processed, [1, 2, 3, 2])
+        self.assertEqual([(result["ordem"], result["status"], result["attempts"]) for result in results],
+                         [(1, True, 1), (2, True, 2), (3, True, 1)])
+        self.assertEqual(pipeline.retried, 1)
+        self.assertEqual(len(self.recovered), 1)
+        self.assertEqual(self.errors, [])
+
+    async def test_permanent_and_committed_failures_are_not_retried(self):
+        self.failures[1] = [sap_error(MISSING)]
+        self.failures[2] = [sap_error(LOCKED, committed=True)]
+        pipeline = self.pipeline()
+        results = await pipeline.run([1, 2, 3])
+
+        self.assertEqual(self.processed, [1, 2, 3])
+        self.assertEqual([(result["status"], result.get("failure")) for result in results],
+                         [(False, PERMANENT), (False, PERMANENT), (True, None)])
+        self.assertEqual(results[0]["message_type"], "E")
+        self.assertEqual(pipeline.retried, 0)
+        self.assertEqual(len(self.errors), 2)
+
+    async def test_retries_are_limited(self):
+        self.failures[1] = [sap_error(LOCKED) for _ in range(5)]
+        results = await self.pipeline(max_retries=2).run([1])
+
+        self.assertEqual(self.processed, [1, 1, 1])
+        self.assertEqual((results[0]["status"], results[0]["failure"], results[0]["attempts"]), (False, TRANSIENT, 3))
+        self.assertEqual(len(self.errors), 1)
+
+    async def test_unrecovered_session_leaves_and_the_others_take_over(self):
+        self.failures[1] = [sap_error(LOCKED)]
+        results = await self.pipeline(sessions=self.sessions, recover=lambda sap_session: False).run(range(1, 7))
+
+        self.assertTrue(all(result["status"] for result in results))
+        self.assertEqual(results[0]["attempts"], 2)
+        # The session that failed took no item after its failure
+        failed = self.processed.index(1)
+        broken = self.calls[failed][1]
+        self.assertNotIn(broken, [session for _, session in self.calls[failed + 1:]])
+        self.assertEqual(len(self.calls), 7)
+
+    async def test_no_session_left_ends_the_run(self):
+        self.failures[1] = [sap_error(LOCKED)]
+        with self.assertRaises(RuntimeError):
+            await self.pipeline(recover=lambda sap_session: False).run([1, 2])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import asyncio
+import threading
+import time
+import unittest
+
+from helpers.pipeline import OrderPipeline
+from helpers.sapasync import AsyncSapSession
+
+
+# Driver recording the threads that set up and release the COM apartment
+class FakeDriver():
+
+    def __init__(self):
+        self.initialized = []
+        self.released = []
+
+    def init_thread(self):
+        self.initialized.append(threading.current_thread())
+
+    def uninit_thread(self):
+        self.released.append(threading.current_thread())
+
+
+class AsyncSapSessionTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.driver = FakeDriver()
+        self.session = await AsyncSapSession.open(self.driver, threading.current_thread, name="sap-test")
+
+    async def test_calls_run_on_the_session_thread(self):
+        thread = self.session.sap_session
+        self.assertIsNot(thread, threading.current_thread())
+        self.assertTrue(thread.name.startswith("sap-test"))
+        self.assertIs(await self.session.run(threading.current_thread), thread)
+        self.assertEqual(await self.session.call("getName"), thread.name)
+        self.assertEqual(self.driver.initialized, [thread])
+
+        await self.session.close()
+        self.assertEqual(self.driver.released, [thread])
+
+    async def test_blocking_calls_leave_the_event_loop_free(self):
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        ticker = asyncio.create_task(tick())
+        await self.session.run(time.sleep, 0.2)
+        ticker.cancel()
+        await self.session.close()
+        self.assertGreater(ticks, 5)
+
+    async def test_failed_factory_releases_the_thread(self):
+        def factory():
+            raise RuntimeError("Login failed")
+
+        with self.assertRaises(RuntimeError):
+            await AsyncSapSession.open(self.driver, factory, name="sap-failed")
+        self.assertEqual(len(self.driver.released), 1)
+        await self.session.close()
+
+
+# Reading the input and storing the results overlap with the SAP work
+class PipelineOverlapTest(unittest.IsolatedAsyncioTestCase):
+
+    async def test_results_are_stored_while_sap_works(self):
+        session = AsyncSapSession(FakeDriver(), "sap-1")
+        self.addAsyncCleanup(session.close)
+        events = []
+
+        def operation(sap_session, ordem):
+            events.append(("sap", ordem))
+            time.sleep(0.02)
+            return True
+
+        async def on_result(result):
+            events.append(("stored", result["ordem"]))
+            await asyncio.sleep(0.05)
+
+        results = await OrderPipeline([session], operation, on_result).run(range(4))
+        self.assertTrue(all(result["status"] for result in results))
+        # The second order was sent to SAP before the first result had been stored
+        self.assertLess(events.index(("sap", 1)), events.index(("stored", 1)))
+        self.assertLess(events.index(("sap", 2)), events.index(("stored", 1)))
+
+
+if __name__ == '__main__':
+    unittest.main()
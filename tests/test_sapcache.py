@@ -0,0 +1,136 @@
+import logging
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+from helpers.bench_common import SIMULATED_SAP_ARGS, make_orders
+from helpers.sapcache import CachedSession
+from helpers.sapgui import SapGui
+from helpers.sapsim import SimulatedSapDriver, SimBackend
+
+
+class FakeElement():
+
+    def __init__(self, session, element_id):
+        self.session = session
+        self.id = element_id
+        self.text = ""
+
+    def press(self):
+        # The screen shown after the roundtrip
+        self.session.screen = self.session.next_screen
+
+
+# GuiSession with a screen number and a count of the object tree walks
+class FakeSession():
+
+    def __init__(self):
+        self.screen = 100
+        self.next_screen = 100
+        self.Busy = False
+        self.Children = SimpleNamespace(Count=1)
+        self.lookups = []
+
+    @property
+    def Info(self):
+        return SimpleNamespace(Transaction="VA02", ScreenNumber=self.screen)
+
+    def findById(self, element_id, raise_error=True):
+        self.lookups.append(element_id)
+        if element_id.startswith("wnd[1]"):
+            if raise_error:
+                raise RuntimeError(f"The control could not be found by id: {element_id}")
+            return None
+        return FakeElement(self, element_id)
+
+    def StartTransaction(self, code):
+        self.screen = 200
+
+
+class CachedSessionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.gui = FakeSession()
+        self.session = CachedSession(self.gui)
+
+    def test_handles_are_reused_on_the_same_screen(self):
+        field = self.session.findById("wnd[0]/usr/ctxtVBAK-VBELN")
+        self.assertIs(self.session.findById("wnd[0]/usr/ctxtVBAK-VBELN"), field)
+
+        # An action that leaves the screen as it was keeps the handles found before it
+        self.session.findById("wnd[0]/tbar[1]/btn[5]").press()
+        self.assertIs(self.session.findById("wnd[0]/usr/ctxtVBAK-VBELN"), field)
+        self.assertEqual(self.gui.lookups, ["wnd[0]/usr/ctxtVBAK-VBELN", "wnd[0]/tbar[1]/btn[5]"])
+        self.assertEqual(self.session.stats()["hits"], 2)
+
+    def test_screen_change_drops_the_handles(self):
+        field = self.session.findById("wnd[0]/usr/ctxtVBAK-VBELN")
+        self.gui.next_screen = 200
+        self.session.findById("wnd[0]/tbar[1]/btn[5]").press()
+
+        self.assertIsNot(self.session.findById("wnd[0]/usr/ctxtVBAK-VBELN"), field)
+        self.assertEqual(self.gui.lookups.count("wnd[0]/usr/ctxtVBAK-VBELN"), 2)
+        self.assertEqual(self.session.stats()["invalidations"], 1)
+
+    def test_session_actions_start_a_new_epoch(self):
+        field = self.session.findById("wnd[0]/usr/ctxtVBAK-VBELN")
+        self.session.StartTransaction("VA02")
+        self.assertIsNot(self.session.findById("wnd[0]/usr/ctxtVBAK-VBELN"), field)
+
+    def test_busy_session_drops_the_handle(self):
+        field = self.session.findById("wnd[0]/usr/ctxtVBAK-VBELN")
+        self.session.findById("wnd[0]/tbar[1]/btn[5]").press()
+        self.gui.Busy = True
+        self.assertIsNot(self.session.findById("wnd[0]/usr/ctxtVBAK-VBELN"), field)
+
+    def test_persistent_handles_survive_screen_changes(self):
+        statusbar = self.session.findById("wnd[0]/sbar")
+        self.gui.next_screen = 200
+        self.session.findById("wnd[0]/tbar[1]/btn[5]").press()
+        self.assertIs(self.session.findById("wnd[0]/sbar"), statusbar)
+        self.assertEqual(self.gui.lookups.count("wnd[0]/sbar"), 1)
+
+    def test_failed_lookups_are_not_cached(self):
+        self.assertIsNone(self.session.findById("wnd[1]/tbar[0]/btn[0]", False))
+        self.assertIsNone(self.session.findById("wnd[1]/tbar[0]/btn[0]", False))
+        with self.assertRaises(RuntimeError):
+            self.session.findById("wnd[1]/tbar[0]/btn[0]")
+        self.assertEqual(len(self.gui.lookups), 3)
+
+    def test_property_writes_reach_the_element(self):
+        self.session.findById("wnd[0]/usr/ctxtVBAK-VBELN").text = "5100000001"
+        self.assertEqual(self.session.findById("wnd[0]/usr/ctxtVBAK-VBELN").text, "5100000001")
+
+
+# The same orders against the simulated SAP GUI, with and without the cache
+class SimulatedCacheTest(unittest.TestCase):
+
+    def run_orders(self, element_cache):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        backend = SimBackend(locked={5100000002: 1})
+        sap = SapGui(SIMULATED_SAP_ARGS, driver=SimulatedSapDriver(backend=backend), element_cache=element_cache,
+                     attach={"enabled": False, "stats_path": os.path.join(directory.name, "startup.json")})
+        self.assertTrue(sap.sapLogin())
+        outcomes = []
+        for ordem in make_orders(4):
+            try:
+                outcomes.append(sap.perform_operation("/nVA02", ordem)["message"])
+            except Exception as e:
+                outcomes.append(e.status_text)
+                sap.reset_session()
+        return sap, outcomes, backend.outputs
+
+    def test_same_outcomes_with_and_without_the_cache(self):
+        logging.disable(logging.CRITICAL)
+        self.addCleanup(logging.disable, logging.NOTSET)
+        cached, *with_cache = self.run_orders(True)
+        _, *without_cache = self.run_orders(False)
+        self.assertEqual(with_cache, without_cache)
+        self.assertIsInstance(cached.session, CachedSession)
+        self.assertGreater(cached.session.stats()["hits"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
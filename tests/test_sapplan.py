@@ -0,0 +1,119 @@
+import logging
+import os
+import tempfile
+import unittest
+
+from helpers.bench_common import SIMULATED_SAP_ARGS
+from helpers.sapgui import SapGui, SapOperationError
+from helpers.sapplan import StepPlan, PlanError, PlanAssertionError, load_plans, SET
+from helpers.sapsim import SimulatedSapDriver, SimBackend
+
+
+def plan(*steps, params=("ordem",), order=None):
+    definition = {"params": list(params), "steps": list(steps)}
+    if order is not None:
+        definition["order"] = order
+    return StepPlan("test", definition)
+
+
+# Plans are compiled at startup: a bad step must fail there, naming the plan and the step
+class CompileTest(unittest.TestCase):
+
+    def assertPlanError(self, text, *steps, **options):
+        with self.assertRaises(PlanError) as raised:
+            plan(*steps, **options)
+        self.assertIn(text, str(raised.exception))
+
+    def test_rejects_bad_steps(self):
+        self.assertPlanError("step 2: unknown operation 'click'",
+                             {"op": "wait_idle"}, {"op": "click", "id": "wnd[0]"})
+        self.assertPlanError("'press' needs ['id']", {"op": "press"})
+        self.assertPlanError("unexpected keys ['commit']", {"op": "set", "id": "x", "value": "1", "commit": True})
+        self.assertPlanError("unknown parameter {vbeln}", {"op": "set", "id": "x", "value": "{vbeln}"})
+        self.assertPlanError("invalid template", {"op": "set", "id": "x", "value": "{ordem"})
+        self.assertPlanError("unknown operation 'press'", "press")
+
+    def test_rejects_bad_plans(self):
+        with self.assertRaises(PlanError):
+            StepPlan("test", {"steps": "press"})
+        with self.assertRaises(PlanError):
+            StepPlan("test", [])
+        self.assertPlanError("order parameter 'vbeln' is not declared", {"op": "wait_idle"}, order="vbeln")
+
+    def test_consecutive_sets_are_merged(self):
+        compiled = plan({"op": "set", "id": "a", "value": "{ordem}"},
+                        {"op": "set", "id": "b", "value": 4, "property": "key"},
+                        {"op": "press", "id": "c"},
+                        {"op": "vkey", "key": 0, "commit": True})
+        instructions = compiled.blocks[0][1]
+        self.assertEqual(len(instructions), 3)
+        self.assertEqual(instructions[0][0], SET)
+        self.assertEqual([(element_id, prop) for element_id, prop, _, _ in instructions[0][1]],
+                         [("a", "text"), ("b", "key")])
+        self.assertEqual(instructions[0][1][0][2]({"ordem": 5100000001}), "5100000001")
+        self.assertEqual(compiled.roundtrips(), 2)
+
+    def test_plans_file_compiles(self):
+        plans = load_plans()
+        self.assertIn("va02_output", plans)
+        self.assertEqual(plans["va02_output"].order_param, "ordem")
+
+
+# va02_output through SapGui.perform_operation, against the simulated SAP GUI
+class Va02OutputTest(unittest.TestCase):
+
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+        self.addCleanup(logging.disable, logging.NOTSET)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.backend = SimBackend(locked={5100000004: 1})
+        self.sap = SapGui(SIMULATED_SAP_ARGS, driver=SimulatedSapDriver(backend=self.backend),
+                          attach={"enabled": False, "stats_path": os.path.join(directory.name, "startup.json")})
+        self.assertTrue(self.sap.sapLogin())
+
+    def test_issues_the_output_and_saves(self):
+        outcome = self.sap.perform_operation("/nVA02", 5100000001)
+        self.assertTrue(outcome["status"])
+        self.assertEqual(outcome["message_type"], "S")
+        self.assertEqual(outcome["document"], "5100000001")
+        self.assertEqual(self.backend.outputs, {"5100000001": "4"})
+
+    def test_missing_order_fails_before_the_save(self):
+        with self.assertRaises(SapOperationError) as raised:
+            self.sap.perform_operation("/nVA02", 5200000000)
+        error = raised.exception
+        self.assertEqual((error.ordem, error.message_type, error.step), (5200000000, "E", 2))
+        self.assertFalse(error.committed)
+        self.assertEqual(self.backend.outputs, {})
+
+        # The session goes back to a known screen and takes the next order
+        self.assertTrue(self.sap.reset_session())
+        self.assertTrue(self.sap.perform_operation("/nVA02", 5100000001)["status"])
+
+    def test_locked_order_succeeds_once_released(self):
+        with self.assertRaises(SapOperationError) as raised:
+            self.sap.perform_operation("/nVA02", 5100000004)
+        self.assertIn("OUTRO", raised.exception.status_text)
+        self.assertTrue(self.sap.reset_session())
+        self.assertTrue(self.sap.perform_operation("/nVA02", 5100000004)["status"])
+
+    def test_failure_after_the_save_is_committed(self):
+        checked = StepPlan("checked", {
+            "params": ["command", "ordem"], "order": "ordem",
+            "steps": [{"op": "set", "id": "wnd[0]/tbar[0]/okcd", "value": "{command}"},
+                      {"op": "vkey", "key": 0},
+                      {"op": "set", "id": "wnd[0]/usr/ctxtVBAK-VBELN", "value": "{ordem}", "span": "enter"},
+                      {"op": "press", "id": "wnd[0]/tbar[1]/btn[5]", "span": "enter"},
+                      {"op": "press", "id": "wnd[1]/tbar[0]/btn[0]", "span": "enter"},
+                      {"op": "press", "id": "wnd[0]/tbar[0]/btn[11]", "commit": True, "span": "save"},
+                      {"op": "assert_status", "types": ["E"], "span": "save"}],
+        })
+        progress = {}
+        with self.assertRaises(PlanAssertionError):
+            checked.run(self.sap, {"command": "/nVA02", "ordem": 5100000001}, progress=progress)
+        self.assertEqual(progress, {"step": 3, "committed": True})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,28 @@
+import argparse
+import unittest
+
+from helpers.bench_startup import SUBSYSTEMS, bench_startup
+from helpers.configuration import load_config
+
+# Budgets checked by the test, as in python -m helpers.benchmark startup
+CONFIG = "configs.json"
+
+
+# Import time and RSS of each subsystem against startup.budgets, each in a fresh interpreter
+class StartupBudgetTest(unittest.TestCase):
+
+    def test_budgets_name_known_subsystems(self):
+        budgets = load_config(CONFIG)['startup']['budgets']
+        self.assertTrue(budgets)
+        self.assertEqual([name for name in budgets if name not in SUBSYSTEMS], [])
+
+    def test_every_subsystem_within_budget(self):
+        # Best of two runs, so a slow first start (cold disk cache) does not fail the test
+        result = bench_startup(argparse.Namespace(config=CONFIG, subsystems=None, repeat=2))
+        for name, figures in result["subsystems"].items():
+            with self.subTest(subsystem=name):
+                self.assertNotIn(name, result["over_budget"], f"{name} is over its budget: {figures}")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import math
+import random
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from helpers.bench_validation import make_order_column
+from helpers.validation import (OrderValidator, MISSING, NOT_NUMERIC, NOT_INTEGER, OUT_OF_RANGE, BAD_PREFIX,
+                                DUPLICATE)
+
+# Cells the benchmark column does not have
+ODD_CELLS = ["abc", "nan", "", "   ", pd.NA, float("nan"), float("inf"), "-inf", -5100000001, 1e30, True,
+             "5,1", "7100000009", 99, np.int64(5100000002), " 5100000003.0 "]
+
+
+# The documented rules, checked one row at a time
+def per_row(values, validator, seen):
+    accepted, reasons = [], []
+    for value in values:
+        reason = None
+        if value is None or value is pd.NA or (isinstance(value, float) and math.isnan(value)) \
+                or (isinstance(value, str) and not value.strip()):
+            reason = MISSING
+        else:
+            try:
+                number = float(value)
+            except (TypeError, ValueError):
+                number = None
+            if number is None or not math.isfinite(number):
+                reason = NOT_NUMERIC
+            elif not number.is_integer():
+                reason = NOT_INTEGER
+            elif not validator.min_value <= number <= validator.max_value:
+                reason = OUT_OF_RANGE
+            elif validator.prefixes and not any(str(int(number)).startswith(prefix) for prefix in validator.prefixes):
+                reason = BAD_PREFIX
+            elif int(number) in seen:
+                reason = DUPLICATE
+            else:
+                seen.add(int(number))
+                accepted.append(int(number))
+        reasons.append(reason or "")
+    return accepted, reasons
+
+
+class ParityTest(unittest.TestCase):
+
+    def check(self, values, batch_size, **settings):
+        validator = OrderValidator(**settings)
+        seen = set()
+        for start in range(0, len(values), batch_size):
+            batch = values[start:start + batch_size]
+            accepted, report = validator.validate(batch)
+            expected, reasons = per_row(batch, validator, seen)
+            self.assertEqual(accepted, expected)
+            self.assertEqual(report["reason"].astype(str).tolist(), reasons)
+            self.assertEqual(report["status"].tolist(), ["accept" if not reason else "reject" for reason in reasons])
+            self.assertEqual(report["row"].tolist(), list(range(start + 1, start + len(batch) + 1)))
+
+    def test_benchmark_column(self):
+        self.check(make_order_column(20000, seed=1), 3000, prefixes=["51", "71"])
+
+    def test_odd_cells_across_batches(self):
+        rng = random.Random(7)
+        for seed in range(5):
+            values = make_order_column(2000, seed) + [rng.choice(ODD_CELLS) for _ in range(300)]
+            rng.shuffle(values)
+            with self.subTest(seed=seed):
+                self.check(values, 500, prefixes=["51", "71"])
+                self.check(values, 700)
+
+    def test_range_without_digits(self):
+        values = [5100000001, 99, 100, "250", 250.5, None, 5100000001]
+        self.check(values, 3, digits=None, min_value=100, max_value=10 ** 10)
+
+    def test_counts_add_up(self):
+        values = make_order_column(5000, seed=3)
+        validator = OrderValidator(prefixes=["51"])
+        validator.validate(values[:2500])
+        validator.validate(values[2500:])
+        self.assertEqual(sum(validator.counts.values()), len(values))
+
+
+if __name__ == '__main__':
+    unittest.main()
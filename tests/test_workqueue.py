@@ -0,0 +1,114 @@
+import time
+import unittest
+
+from helpers.openiapsim import SimOpenIAPClient
+from helpers.workqueue import ShardQueue, run_worker, PENDING, DONE
+
+COLLECTION = "shards"
+
+
+# Coordinator and workers of one job, each with its own client on a shared in-memory store
+class ShardQueueTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.store = SimOpenIAPClient().store
+        self.coordinator = self.queue("job1")
+        await self.coordinator.publish(range(5100000000, 5100000005), shard_size=2)
+
+    def queue(self, job_id="job1", lease_seconds=60):
+        return ShardQueue(SimOpenIAPClient(self.store), COLLECTION, job_id, lease_seconds=lease_seconds)
+
+    def expire(self, shard):
+        # The holder's robot died: its lease is past its expiry
+        for document in self.store[COLLECTION].values():
+            if document.get("shard_id") == shard.id:
+                document["expires"] = time.time() - 1
+
+    async def test_publish_splits_the_orders(self):
+        self.assertEqual(await self.coordinator.progress(), {PENDING: 3, "leased": 0, DONE: 0, "total": 3})
+        shards = sorted((document for document in self.store[COLLECTION].values()), key=lambda shard: shard["index"])
+        self.assertEqual([shard["orders"] for shard in shards],
+                         [[5100000000, 5100000001], [5100000002, 5100000003], [5100000004]])
+
+    async def test_a_leased_shard_is_not_claimed_twice(self):
+        claimed = [await self.queue().claim(f"robot{index}") for index in range(4)]
+        self.assertEqual(len({shard.id for shard in claimed[:3]}), 3)
+        self.assertIsNone(claimed[3])
+        self.assertEqual(await self.coordinator.progress(), {PENDING: 0, "leased": 3, DONE: 0, "total": 3})
+
+    async def test_expired_lease_is_reclaimed(self):
+        first, second = self.queue(), self.queue()
+        shard = await first.claim("robot1")
+        while await second.claim("robot2") is not None:
+            pass
+        self.assertTrue(await first.renew(shard, "robot1"))
+
+        self.expire(shard)
+        self.assertEqual((await self.coordinator.progress())[PENDING], 1)
+        reclaimed = await second.claim("robot2")
+        self.assertEqual((reclaimed.id, reclaimed.lease), (shard.id, 1))
+
+        # The previous holder finds out on its next renewal, and cannot overwrite the new holder's results
+        self.assertFalse(await first.renew(shard, "robot1"))
+        self.assertFalse(await first.complete(shard, "robot1", [{"ordem": 1, "status": True}]))
+        self.assertTrue(await second.complete(reclaimed, "robot2", [{"ordem": 1, "status": False}]))
+        self.assertEqual([result["status"] for result in await self.coordinator.results()], [False])
+
+    async def test_done_shard_is_not_claimed_again(self):
+        worker = self.queue()
+        shard = await worker.claim("robot1")
+        self.assertTrue(await worker.complete(shard, "robot1", []))
+        self.expire(shard)
+
+        claimed = []
+        while (other := await self.queue().claim("robot2")) is not None:
+            claimed.append(other.id)
+        self.assertNotIn(shard.id, claimed)
+        self.assertEqual(len(claimed), 2)
+
+    async def test_lease_ahead_of_the_clock_is_reported(self):
+        shard = await self.queue().claim("robot1")
+        for document in self.store[COLLECTION].values():
+            if document.get("shard_id") == shard.id:
+                document["expires"] = time.time() + 3600
+        with self.assertLogs(level="WARNING") as logs:
+            await self.queue().claim("robot2")
+        self.assertTrue(any("out of sync" in line for line in logs.output))
+
+    async def test_workers_process_every_order_once(self):
+        async def process(orders):
+            return [{"ordem": ordem, "status": True, "message": "ok", "session": "sap-1"} for ordem in orders]
+
+        results = [await run_worker(self.queue(), f"robot{index}", process, poll_interval=0.01) for index in range(2)]
+        self.assertEqual(sorted(result["ordem"] for worker in results for result in worker),
+                         list(range(5100000000, 5100000005)))
+        # Only the result fields are stored in the shard
+        self.assertEqual(set((await self.coordinator.results())[0]), {"ordem", "status", "message"})
+        self.assertTrue(await self.coordinator.wait(poll_interval=0.01, timeout=1))
+
+    async def test_worker_without_a_job_stays_on_the_job_it_joined(self):
+        other = self.queue("job2")
+        await other.publish([5100000010, 5100000011], shard_size=1)
+
+        async def process(orders):
+            return [{"ordem": ordem, "status": True} for ordem in orders]
+
+        worker = self.queue(job_id=None)
+        results = await run_worker(worker, "robot1", process, poll_interval=0.01)
+        joined = self.coordinator if worker.job_id == "job1" else other
+        left = other if joined is self.coordinator else self.coordinator
+        self.assertEqual(len(results), {"job1": 5, "job2": 2}[worker.job_id])
+        self.assertEqual((await joined.progress())[DONE], (await joined.progress())["total"])
+        self.assertEqual((await left.progress())[DONE], 0)
+
+    async def test_cleanup_removes_only_the_job(self):
+        other = self.queue("job2")
+        await other.publish([5100000010], shard_size=1)
+        await self.queue().claim("robot1")
+
+        self.assertTrue(await self.coordinator.cleanup())
+        self.assertEqual({document["job_id"] for document in self.store[COLLECTION].values()}, {"job2"})
+
+
+if __name__ == '__main__':
+    unittest.main()